@@ -0,0 +1,57 @@
+"""
+Measures the cost per call of logging a per-article event: through the plain logger, the sampled logger and with the
+level disabled. Records go through the queue handler of ``Logger.configure`` into a temporary log directory.
+
+Usage:
+    python benchmarks/logging_overhead.py --messages 200000 --every 50
+"""
+import argparse
+import logging
+from os.path import abspath, dirname, join
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+from utilities import Logger  # noqa: E402
+
+
+def measure(log_function, messages: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(messages):
+            log_function("Scraped article %s", i)
+        best = min(best, time.perf_counter() - start)
+    return best / messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", default=200000, type=int, help="The number of messages per measurement")
+    parser.add_argument("--every", default=50, type=int, help="Only every n-th message is emitted by the sampled logger")
+    parser.add_argument("--repeat", default=3, type=int, help="The number of measurements, the best is reported")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        Logger.configure("INFO", directory, levels={"benchmark.disabled": "WARNING"})
+        # Keep the terminal quiet, the file handler still writes every emitted record
+        for handler in Logger._listener.handlers:
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setLevel(logging.CRITICAL)
+        log = Logger.get_logger("benchmark")
+        cases = {
+            "plain": log.info,
+            f"sampled (every {args.every})": Logger.sampled(log, every=args.every).info,
+            "disabled level": Logger.get_logger("benchmark.disabled").info,
+        }
+        try:
+            for name, log_function in cases.items():
+                per_call = measure(log_function, args.messages, args.repeat)
+                print(f"logging {name}: {per_call * 1e6:.2f} µs per message")
+        finally:
+            Logger.shutdown()
+
+
+if __name__ == "__main__":
+    main()
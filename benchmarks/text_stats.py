@@ -0,0 +1,63 @@
+"""
+Measures the throughput of the text statistics stage on synthetic German articles.
+
+Usage:
+    python benchmarks/text_stats.py --articles 20000 --batch_size 1000
+"""
+import argparse
+from os.path import abspath, dirname, join
+import random
+import sys
+import time
+
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+from article import Article  # noqa: E402
+from text_stats import TextStatistics  # noqa: E402
+
+_words = (
+    "Die Bundesregierung hat am Dienstag beschlossen dass die Förderung für erneuerbare Energien im kommenden Jahr "
+    "um 2,5 Prozent steigen soll Kritiker halten das für zu wenig Der Minister verwies auf die angespannte Lage"
+).split()
+
+
+def make_articles(count: int, words: int, seed=0) -> list:
+    generator = random.Random(seed)
+    articles = []
+    for i in range(count):
+        sentences = []
+        remaining = words
+        while remaining > 0:
+            length = min(remaining, generator.randint(5, 25))
+            sentences.append(" ".join(generator.choice(_words) for _ in range(length)) + ".")
+            remaining -= length
+        articles.append(
+            Article(link=f"https://example.org/{i}", text=" ".join(sentences), nr_external_references=3)
+        )
+    return articles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", default=20000, type=int, help="The number of articles")
+    parser.add_argument("--words", default=600, type=int, help="The number of words per article")
+    parser.add_argument("--batch_size", default=1000, type=int, help="The number of articles per batch")
+    parser.add_argument("--repeat", default=3, type=int, help="The number of measurements, the best is reported")
+    args = parser.parse_args()
+    articles = make_articles(args.articles, args.words)
+    stage = TextStatistics()
+    stage.process(articles[: args.batch_size])
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for offset in range(0, len(articles), args.batch_size):
+            stage.process(articles[offset : offset + args.batch_size])
+        best = min(best, time.perf_counter() - start)
+    print(
+        f"text_stats: {len(articles)} articles of {args.words} words in {best:.3f}s, "
+        f"{len(articles) / best:.0f} articles/s (batch size {args.batch_size})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,130 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from threading import Condition
+from time import gmtime, strftime
+from typing import TYPE_CHECKING
 import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+from requests.adapters import HTTPAdapter
 
-# from tqdm.notebook import tqdm
-from utilities import Logger, Decorators
+from utilities import Logger, Decorators, Metrics
+from article import Article
+from page_metadata import extract_metadata, fields as page_metadata_fields
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, SoupStrainer
 
-log = Logger.log
+
+log = Logger.get_logger(__name__)
+article_log = Logger.sampled(log, every=50)
+
+
+def make_soup(content: bytes, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    """
+    Parses a downloaded HTML document into a BeautifulSoup object. The parser backend is imported on first use, which
+    keeps importing this module cheap for runs that never parse a page.
+
+    :param content: the raw HTML document
+    :type content: bytes
+    :param parse_only: an optional strainer restricting the tree to the matching elements and their children
+    :type parse_only: SoupStrainer
+    :return: the parsed document
+    :rtype: BeautifulSoup
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(content, "html.parser", parse_only=parse_only)
+
+
+def class_strainer(classes) -> SoupStrainer:
+    """
+    Creates a strainer which keeps only the elements having at least one of the given classes. Keywords consisting of
+    several classes, e.g. "ctn-PageFunctions_List js-sharebuttons", match elements having any of them.
+
+    :param classes: the class keywords of the elements to keep
+    :return: the strainer
+    :rtype: SoupStrainer
+    """
+    from bs4 import SoupStrainer
+
+    wanted = frozenset(c for keyword in classes for c in keyword.split())
+    return SoupStrainer(
+        class_=lambda value: value is not None and not wanted.isdisjoint(value.split())
+    )
+
+
+class BodyTooLarge(IOError):
+    """
+    Raised when a response body exceeds the ``max_body_size`` of the scraper.
+    """
+
+
+class ByteLimiter:
+    """
+    Limits the bytes of the responses which all threads of a scraper are downloading or parsing at a time. As the size
+    of a body is not known before it is read, a new request reserves the moving average of the body sizes seen so far
+    and waits until this reservation fits into ``max_bytes``; a request is always admitted if nothing is in flight.
+    Running downloads are never blocked, as threads holding parts of their bodies could otherwise wait for each other
+    forever; the limit can therefore be exceeded by bodies larger than the average.
+
+    :param max_bytes: the maximum number of bytes in flight
+    :param expected_size: the body size reserved per request until sizes have been seen
+    """
+
+    def __init__(self, max_bytes: int, expected_size=100000):
+        self.max_bytes = max_bytes
+        self.expected_size = expected_size
+        self.in_flight = 0
+        self._condition = Condition()
+
+    def _admissible(self, size: int) -> bool:
+        return self.in_flight == 0 or self.in_flight + size <= self.max_bytes
+
+    def wait(self) -> int:
+        """
+        Blocks until the expected body of a new request fits into the limit, and reserves it.
+
+        :return: the reserved number of bytes, to be released once the body has been read
+        :rtype: int
+        """
+        with self._condition:
+            size = int(self.expected_size)
+            if not self._admissible(size):
+                Metrics.increment("fetch.throttled")
+                self._condition.wait_for(lambda: self._admissible(size))
+            self.in_flight += size
+            return size
+
+    def observe(self, size: int) -> None:
+        """
+        Updates the expected body size with the size of a body read.
+        """
+        with self._condition:
+            self.expected_size = 0.8 * self.expected_size + 0.2 * size
+
+    def add(self, size: int) -> None:
+        with self._condition:
+            self.in_flight += size
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+    @contextmanager
+    def holding(self, size: int):
+        """
+        Counts ``size`` bytes as in flight while the block runs, e.g. while a downloaded body is parsed.
+        """
+        self.add(size)
+        try:
+            yield
+        finally:
+            self.release(size)
 
 
 class WebScraper:
-    def __init__(self, root_link, topic_class, article_class):
+    def __init__(self, root_link, topic_class, article_class, pool_size=10, timeout=30):
         self.root_link = root_link
         self.__topic_class = topic_class
         self.__article_class = article_class
@@ -21,6 +134,123 @@ class WebScraper:
         self.curr_article_link = None
         self.curr_article_all_links = None
         self.curr_raw_article = None
+        self.curr_raw_content = None
+        self.curr_failed_links = []
+        self.rate_limiter = None
+        self.discovery = None
+        self.budget = None
+        self.max_body_size = None
+        self.in_flight = None
+        self.chunk_size = 65536
+        self.topic_cache = None
+        self.selected_topics = None
+        self.excluded_topics = None
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, link: str, throttle=True) -> bytes:
+        """
+        Downloads a page over the connection pool of the scraper. It is safe to call from several threads. If a
+        ``rate_limiter`` is set, it is acquired before each request. If a ``budget`` is set, the request is recorded in
+        it.
+
+        The body is read as a stream in chunks of ``chunk_size`` bytes. A body larger than ``max_body_size`` is aborted
+        as soon as this is known, from its Content-Length header or while reading, with ``BodyTooLarge``. If a
+        ``ByteLimiter`` is set as ``in_flight``, the request waits while too many bytes are in flight, and the body
+        counts as in flight while it is read.
+
+        :param link: the hyperlink of the page
+        :type link: str
+        :param throttle: whether to wait while too many bytes are in flight. Requests needed to finish a body which is
+        already in flight, e.g. the further pages of an article, must not wait, as they would wait for themselves
+        :type throttle: bool
+        :return: the raw response body
+        :rtype: bytes
+        """
+        return self.fetch_response(link, throttle=throttle).content
+
+    def fetch_response(
+        self, link: str, headers: dict = None, throttle=True, until=None
+    ) -> requests.Response:
+        """
+        Downloads a page as ``fetch`` does, but returns the whole response, e.g. for conditional requests.
+
+        :param link: the hyperlink of the page
+        :type link: str
+        :param headers: additional request headers
+        :type headers: dict
+        :param throttle: whether to wait while too many bytes are in flight
+        :type throttle: bool
+        :param until: an optional function called with each chunk read. Once it returns True, the rest of the body is
+        not downloaded and the connection is closed; the content of the response is the prefix read so far
+        :type until: callable
+        :return: the response
+        :rtype: requests.Response
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        reserved = 0
+        if throttle and self.in_flight is not None:
+            reserved = self.in_flight.wait()
+        try:
+            response = self.session.get(
+                link, headers=headers, timeout=self.timeout, stream=True
+            )
+            with response:
+                response._content = self._read_body(response, link, reserved, until)
+                response._content_consumed = True
+        finally:
+            if reserved:
+                self.in_flight.release(reserved)
+        Metrics.increment("fetch.bytes", len(response.content))
+        if self.budget is not None:
+            self.budget.record(len(response.content))
+        return response
+
+    def _read_body(self, response: requests.Response, link: str, reserved=0, until=None) -> bytes:
+        limit = self.max_body_size
+        length = response.headers.get("Content-Length", "")
+        if limit is not None and length.isdigit() and int(length) > limit:
+            Metrics.increment("fetch.aborted")
+            raise BodyTooLarge(f'"{link}" has {length} bytes, more than {limit}')
+        # Bytes beyond the reservation of the request are counted as in flight as they arrive
+        chunks, size, charged = [], 0, 0
+        try:
+            for chunk in response.iter_content(self.chunk_size):
+                size += len(chunk)
+                if self.in_flight is not None and size - reserved > charged:
+                    self.in_flight.add(size - reserved - charged)
+                    charged = size - reserved
+                if limit is not None and size > limit:
+                    Metrics.increment("fetch.aborted")
+                    raise BodyTooLarge(f'"{link}" has more than {limit} bytes')
+                chunks.append(chunk)
+                if until is not None and until(chunk):
+                    break
+        finally:
+            if self.in_flight is not None:
+                self.in_flight.release(charged)
+                self.in_flight.observe(size)
+        return b"".join(chunks)
+
+    def holding(self, content: bytes):
+        """
+        :param content: a downloaded body
+        :type content: bytes
+        :return: a context manager counting the body as in flight, e.g. while it is parsed
+        """
+        if self.in_flight is None:
+            return nullcontext()
+        return self.in_flight.holding(len(content))
+
+    def close(self) -> None:
+        """
+        Closes the connection pool.
+        """
+        self.session.close()
 
     def get_topics(self, keep_with_base=True) -> WebScraper:
         """
@@ -34,6 +264,11 @@ class WebScraper:
             - Optionally keep only page references that contain the root directory link
             - at the end, it calls ``_write_topic_links_to_dict`` which creates a dictionary in which topic is
             the dictionary key and the topics hyperlink is the value
+            - if ``selected_topics`` is set, only these topics are kept; the topics in ``excluded_topics`` are dropped
+
+        Only the topic links of the root page are parsed. If a ``topic_cache`` is set (see ``topic_cache.TopicCache``),
+        the cached topics are used while they are fresh, and the root page is requested conditionally afterwards. An
+        error status of the root page raises an ``HTTPError``.
 
         :param keep_with_base: a flag which indicates if only hyperlinks, which have the root link inside are kept
         :type keep_with_base: bool
@@ -42,15 +277,36 @@ class WebScraper:
         :rtype: WebScraper
         """
         log.info("Retrieving all topics from webpage")
-        page = requests.get(self.root_link)
-        soup = BeautifulSoup(page.content, "html.parser")
-        html = soup.find_all("a", class_=f"{self.__topic_class}")
-        self.topics = [link.attrs["href"] for link in html if "href" in link.attrs]
-        if keep_with_base:
-            self.topics = [
-                article for article in self.topics if self.root_link in article
-            ]
-        self._write_topic_links_to_dict()
+        cache = self.topic_cache
+        self.topics = cache.fresh() if cache is not None else None
+        if self.topics is None:
+            response = self.fetch_response(
+                self.root_link, cache.validators() if cache is not None else None
+            )
+            if cache is not None and response.status_code == 304:
+                self.topics = cache.revalidated()
+            else:
+                response.raise_for_status()
+                soup = make_soup(
+                    response.content, parse_only=class_strainer([self.__topic_class])
+                )
+                html = soup.find_all("a", class_=f"{self.__topic_class}")
+                self.topics = [
+                    link.attrs["href"] for link in html if "href" in link.attrs
+                ]
+                if keep_with_base:
+                    self.topics = [
+                        article for article in self.topics if self.root_link in article
+                    ]
+                self._write_topic_links_to_dict()
+                if cache is not None:
+                    self.topics = cache.store(self.topics, response.headers)
+                elif not self.topics:
+                    log.warning("The root page lists no topics")
+        if self.selected_topics:
+            self.keep_topics(list(self.selected_topics))
+        if self.excluded_topics:
+            self.drop_topics(list(self.excluded_topics))
         return self
 
     def _write_topic_links_to_dict(self) -> WebScraper:
@@ -139,30 +395,64 @@ class WebScraper:
             - filter out all entries that have no hyperlink references
             - Optionally keep only page references that contain the root directory link
 
+        If a ``discovery`` backend is set (see ``discovery.FeedDiscovery``), the new links are taken from the feeds of
+        the topic instead and the topic page is only downloaded if the topic has no usable feed.
+
         :param keep_with_base: a flag which indicates if only hyperlinks, which have the root link inside are kept
         :type keep_with_base: bool
         :return: the object whose ``curr_article_all_links`` attribute now has all hyperlinks to
         articles for the ``curr_topic`` attribute
         :rtype: WebScraper
         """
-        log.info(f"Fetching all articles of topic {self.curr_topic}")
-        page = requests.get(self.curr_topic_link)
-        soup = BeautifulSoup(page.content, "html.parser")
-        html = soup.find_all("a", class_=f"{self.__article_class}")
-        self.curr_article_all_links = [
-            link.attrs["href"] for link in html if "href" in link.attrs
-        ]
-        if keep_with_base:
-            self.curr_article_all_links = [
-                article
-                for article in self.curr_article_all_links
-                if self.root_link in article
-            ]
-        log.info(
-            f"Successfully retrieved {len(self.curr_article_all_links)} different articles"
+        self.curr_article_all_links = self.fetch_article_links(
+            self.curr_topic, keep_with_base
         )
         return self
 
+    def fetch_article_links(self, topic: str, keep_with_base=True) -> list:
+        """
+        Retrieves the article links of a topic as ``get_articles_of_topic`` does, but without using the ``curr_*``
+        attributes, such that it can be called for several topics from several threads.
+
+        :param topic: the topic
+        :type topic: str
+        :param keep_with_base: a flag which indicates if only hyperlinks, which have the root link inside are kept
+        :type keep_with_base: bool
+        :return: the hyperlinks of the articles of the topic
+        :rtype: list
+        """
+        log.info(f"Fetching all articles of topic {topic}")
+        if self.discovery is not None:
+            links = self.discovery.links_of_topic(topic, self.topics)
+            if links is not None:
+                links = [
+                    link for link in links if not keep_with_base or self.root_link in link
+                ]
+                log.info(f"Discovered {len(links)} new articles of topic {topic} from the feeds")
+                return links
+            log.info(f"No feed for topic {topic}, using the topic page")
+        soup = make_soup(self.fetch(self.topics[topic]))
+        links = self.get_article_links(soup, keep_with_base)
+        log.info(f"Successfully retrieved {len(links)} different articles of topic {topic}")
+        return links
+
+    def get_article_links(self, soup: BeautifulSoup, keep_with_base=True) -> list:
+        """
+        Returns the hyperlinks of all article teasers on an overview page, e.g. a topic or archive page.
+
+        :param soup: the parsed overview page
+        :type soup: BeautifulSoup
+        :param keep_with_base: a flag which indicates if only hyperlinks, which have the root link inside are kept
+        :type keep_with_base: bool
+        :return: the hyperlinks of the articles
+        :rtype: list
+        """
+        html = soup.find_all("a", class_=f"{self.__article_class}")
+        links = [link.attrs["href"] for link in html if "href" in link.attrs]
+        if keep_with_base:
+            links = [article for article in links if self.root_link in article]
+        return links
+
     """
     def _get_articles(self, link, keep_with_base=True):
         page = requests.get(link)
@@ -181,26 +471,32 @@ class WebScraper:
         return self
     """
 
-    def download_current_article(self) -> WebScraper:
+    def download_current_article(self, parse=True) -> WebScraper:
         """
         Downloads the article whose hyperlink is currently set in the ``self.curr_article_link`` attribute
-        The raw article is written into the ``curr_raw_article`` attribute
+        The raw response bytes are written into the ``curr_raw_content`` attribute and, if ``parse`` is set, the parsed
+        article into the ``curr_raw_article`` attribute
 
+        :param parse: a flag indicating if the whole document shall be parsed into a BeautifulSoup object
+        :type parse: bool
         :return: the object with the article written into its `´curr_raw_article`` attribute
         :rtype: WebScraper
         """
         # log.info(f'Handling: "{self.curr_article_link}"')
-        page = requests.get(self.curr_article_link)
-        self.curr_raw_article = BeautifulSoup(page.content, "html.parser")
+        self.curr_raw_content = self.fetch(self.curr_article_link)
+        with self.holding(self.curr_raw_content):
+            self.curr_raw_article = make_soup(self.curr_raw_content) if parse else None
         return self
 
 
 class ResponseParser(WebScraper):
-    def __init__(self, root_link, topic_class, article_class, parser):
-        super().__init__(root_link, topic_class, article_class)
+    def __init__(self, root_link, topic_class, article_class, parser, pool_size=10, timeout=30):
+        super().__init__(root_link, topic_class, article_class, pool_size, timeout)
         self.parser = parser
 
-    def basic_parse(self) -> str:
+    def basic_parse(
+        self, article: Article = None, entities: list = None, soup: BeautifulSoup = None
+    ) -> Article:
         """
         A parser method to perform basic parsing. When we are talking about basic parsing, that means that the text is
         directly retrieved from the HTML document. The parser dictionary includes the necessary information for the
@@ -213,19 +509,29 @@ class ResponseParser(WebScraper):
             This is done by yielding another key with the corresponding attribute inside the object
             - "attribute": is only set if parse_attr is set to True. Indicates the attribute to parse in an already parsed text
 
-        :return: the parsed value
+        :param article: the article record the parsed values are written into. A new one is created if not provided
+        :type article: Article
+        :param entities: the entities of the parser dictionary to parse. All are parsed if not provided
+        :type entities: list
+        :param soup: the parsed page. Defaults to the ``curr_raw_article`` attribute
+        :type soup: BeautifulSoup
+        :return: the article holding the parsed values
+        :rtype: Article
         """
-        parsed_values = {}
+        article = article if article is not None else Article()
+        soup = soup if soup is not None else self.curr_raw_article
         for entity, key_words in self.parser.items():
-            value = self.curr_raw_article.find_all(
+            if entities is not None and entity not in entities:
+                continue
+            value = soup.find_all(
                 f'{key_words["id"]}', class_=f'{key_words["keyword"]}'
             )
             if value:
                 if not key_words["parse_attr"]:
-                    parsed_values[entity] = self.get_text(value)
+                    article.set(entity, self.get_text(value))
                 else:
-                    parsed_values[entity] = self.get_attr(value, key_words["attribute"])
-        return parsed_values
+                    article.set(entity, self.get_attr(value, key_words["attribute"]))
+        return article
 
     @staticmethod
     def get_text(result: BeautifulSoup) -> str:
@@ -263,64 +569,325 @@ class ResponseParser(WebScraper):
 
 
 class FAZ_Scraper(ResponseParser):
-    def __init__(self, root_link, topic_class, article_class, parser):
-        super().__init__(root_link, topic_class, article_class, parser)
+    text_class = "atc-TextParagraph"
+    paginator_class = "nvg-Paginator_Link"
+
+    def __init__(
+        self,
+        root_link,
+        topic_class,
+        article_class,
+        parser,
+        fast_path=True,
+        workers=8,
+        page_workers=4,
+        timeout=30,
+        topic_workers=4,
+    ):
+        super().__init__(
+            root_link,
+            topic_class,
+            article_class,
+            parser,
+            workers + page_workers + topic_workers,
+            timeout,
+        )
+        self.fast_path = fast_path
+        self.hash_store = None
+        self.workers = workers
+        self.page_workers = page_workers
+        self.topic_workers = topic_workers
+        self._article_pool = None
+        self._page_pool = None
+        self._topic_pool = None
+
+    def _pools(self) -> tuple:
+        """
+        :return: the thread pools downloading the articles and their further pages. They are separate, such that an
+            article waiting for its pages never blocks a page download
+        :rtype: tuple
+        """
+        if self._article_pool is None:
+            self._article_pool = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="article"
+            )
+            self._page_pool = ThreadPoolExecutor(
+                self.page_workers, thread_name_prefix="page"
+            )
+        return self._article_pool, self._page_pool
+
+    def close(self) -> None:
+        """
+        Shuts down the thread pools and closes the connection pool.
+        """
+        for pool in (self._article_pool, self._page_pool, self._topic_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._article_pool = self._page_pool = self._topic_pool = None
+        super().close()
 
-    def download_all_articles_from_curr_topic(self) -> list:
+    def iter_article_links(self, topics: list):
+        """
+        Fetches the article links of the given topics concurrently by ``topic_workers`` threads and yields each topic
+        with its links as soon as they arrived, such that the articles of the first topic can be downloaded while the
+        other topic pages are still being fetched. Topics whose links cannot be fetched are logged and left out.
+
+        :param topics: the topics
+        :type topics: list
+        :return: a generator of (topic, links) tuples in the order the topic pages arrived
+        """
+        if self._topic_pool is None:
+            self._topic_pool = ThreadPoolExecutor(
+                self.topic_workers, thread_name_prefix="topic"
+            )
+        futures = {
+            self._topic_pool.submit(self.fetch_article_links, topic): topic
+            for topic in topics
+        }
+        try:
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    log.error(
+                        f"Could not retrieve the articles of topic {futures[future]}. Reason: {future.exception()}"
+                    )
+                    continue
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def download_all_articles_from_curr_topic(self, on_article=None) -> list:
         """
         Downloads all articles in the ``curr_article_all_links``. It does so by executing the following steps: it
         first checks if the article list is non empty and proceeds if so. Returns an empty value if not. If it is not
-        empty, it iterates over all single articles and executes the following:
+        empty, the articles are downloaded concurrently by ``workers`` threads. For each article, ``scrape_article``
 
-            - set the current article attribute to the article in the iteration loop
-            - calls download_current_article which downloads the article whose link is in the current
-            article link attribute
-            - it calls the ``parse_faz_article`` method which parses the downloaded Beautifulsoup object.
-            - it also stores the hyperlink to the article in
-            - the final entry is written to a list
+            - downloads the article
+            - parses it into an ``Article`` record
+            - downloads the further pages of the article concurrently and merges their paragraphs into the record
 
-        At the end of the iteration, a list of all downloaded article and generated features is generated and returned
+        Articles which cannot be downloaded or parsed are logged, left out and listed in ``curr_failed_links``. At the
+        end, a list of all downloaded
+        articles, in the order of ``curr_article_all_links``, is returned. Pages skipped as unchanged by the
+        ``hash_store`` are left out as well
 
-        :return: a list of all articles from the current topic
+        :param on_article: an optional callback which is called, in the calling thread, with each article as soon as it
+        has been parsed, e.g. to record the progress of the run
+        :type on_article: callable
+        :return: a list of all articles (as ``Article`` records) from the current topic
         :rtype: list
         """
-        result_list = []
         log.info(f"Downloading all articles from topic {self.curr_topic}")
         if self.curr_article_all_links:
-            for article in tqdm(self.curr_article_all_links):
-                self.set_curr_article(article)
-                self.download_current_article()
-                self.parse_faz_article()
-                self.parsed_values["link"] = article
-                result_list.append(self.parsed_values)
-                # log.info(f'Successfully parsed article and added to result list')
-            return result_list
+            return self.download_articles(
+                [(link, self.curr_topic) for link in self.curr_article_all_links],
+                on_article,
+            )
         else:
+            self.curr_failed_links = []
             log.warning("The current article list is empty. Use the")
             return []
 
+    def download_articles(self, items: list, on_article=None) -> list:
+        """
+        Downloads the given articles concurrently, as ``download_all_articles_from_curr_topic`` does, but each with
+        its own topic. Articles which cannot be downloaded or parsed are logged, left out and listed in
+        ``curr_failed_links``.
+
+        :param items: the (link, topic) pairs of the articles
+        :type items: list
+        :param on_article: an optional callback which is called, in the calling thread, with each article as soon as it
+        has been parsed
+        :type on_article: callable
+        :return: the articles (as ``Article`` records) in the order of ``items``
+        :rtype: list
+        """
+        from tqdm import tqdm
+
+        self.curr_failed_links = []
+        article_pool, _ = self._pools()
+        futures = {
+            article_pool.submit(self.scrape_article, link, topic): link
+            for link, topic in items
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            if future.exception() is not None:
+                log.error(
+                    f'Could not download "{futures[future]}". Reason: {future.exception()}'
+                )
+                self.curr_failed_links.append(futures[future])
+            else:
+                article_log.info(f'Parsed article "{futures[future]}"')
+                if on_article is not None and future.result() is not None:
+                    on_article(future.result())
+        result_list = [
+            future.result()
+            for future in futures
+            if future.exception() is None and future.result() is not None
+        ]
+        if self.fast_path:
+            log.info(
+                f"The metadata fast path sufficed for {Metrics.get('metadata.fast_path')} of "
+                f"{Metrics.get('metadata.pages')} pages so far"
+            )
+        return result_list
+
     def parse_faz_article(self):
         """
         Parses the response object from the current article hyperlink. It does so by executing the following steps:
 
+            - metadata as the section, the link, the newspaper and the time of the crawl is set on a new ``Article`` record
+            - with the fast path, the headline, publication time and author are taken from the JSON-LD block and meta
+            tags of the raw response (see ``page_metadata``). Only the elements needed for the remaining entities and
+            the text are then parsed into a BeautifulSoup object
             - it calls ``basic_parse`` which handles all basic parsing elements (direct text parsing or parsing a text
-            by a given attribute. The returned value are written into the tmp ``base`` variable
-            - in a second step, it calls ``get_faz_text`` which retrieves FAZ specific features. The returned values
-            are written into the tmp ``advanced`` variable
-            - the both temporary variables are merged together
-            - metadata as the section, the link and the newspaper is added
+            by a given attribute) and writes them into the record
+            - in a second step, it calls ``get_faz_text`` which adds FAZ specific features to the same record
+
+        The record is held in the ``parsed_values`` attribute.
 
         :return:
         """
-        # log.info('Parsing current article')
-        base = self.basic_parse()
-        advanced = self.get_faz_text()
-        self.parsed_values = {**base, **advanced}
-        self.parsed_values["section"] = self.curr_topic
-        self.parsed_values["link"] = self.curr_article_link
-        self.parsed_values["newspaper"] = "faz"
+        self.parsed_values = self.parse_article(
+            self.curr_article_link,
+            self.curr_topic,
+            self.curr_raw_content,
+            self.curr_raw_article,
+        )
+
+    def scrape_article(self, link: str, topic: str) -> Article:
+        """
+        Downloads and parses a single article including all of its pages. Unlike ``download_current_article`` and
+        ``parse_faz_article``, it does not use the ``curr_*`` attributes and can be called from several threads.
+
+        Without the ``fast_path``, the first page is parsed as a whole. If a ``hash_store`` is set which skips
+        unchanged bodies, a page whose raw body did not change since the last crawl is not parsed.
+
+        :param link: the hyperlink of the article
+        :type link: str
+        :param topic: the topic the article was found in
+        :type topic: str
+        :return: the parsed article or None if the page did not change
+        :rtype: Article
+        """
+        content = self.fetch(link)
+        if (
+            self.hash_store is not None
+            and self.hash_store.skip_unchanged_bodies
+            and self.hash_store.body_unchanged(link, content)
+        ):
+            return None
+        with self.holding(content):
+            soup = None if self.fast_path else make_soup(content)
+            return self.parse_article(link, topic, content, soup)
+
+    def parse_article(
+        self, link: str, topic: str, content: bytes, soup: BeautifulSoup = None
+    ) -> Article:
+        """
+        Parses the first page of an article into an ``Article`` record and merges the further pages into it:
+
+            - metadata as the section, the link, the newspaper and the time of the crawl is set on a new ``Article`` record
+            - if no parsed page is provided, the fast path takes the headline, publication time and author from the
+            JSON-LD block and meta tags of the raw page (see ``page_metadata``). Only the elements needed for the
+            remaining entities, the text and the paginator are then parsed into a BeautifulSoup object
+            - ``basic_parse`` and ``get_faz_text`` write the features into the record
+            - the further pages linked by the paginator are downloaded concurrently, and their paragraphs and
+            external references are appended in page order. ``pages`` holds the number of pages merged
+
+        :param link: the hyperlink of the article
+        :type link: str
+        :param topic: the topic the article was found in
+        :type topic: str
+        :param content: the raw first page
+        :type content: bytes
+        :param soup: the first page parsed as a whole, if available
+        :type soup: BeautifulSoup
+        :return: the parsed article
+        :rtype: Article
+        """
+        article = Article(
+            section=topic,
+            link=link,
+            newspaper="faz",
+            crawled=strftime("%Y-%m-%dT%H:%M:%SZ", gmtime()),
+        )
+        entities = None
+        if soup is None:
+            entities = self._parse_metadata(article, content)
+            keywords = [self.parser[entity]["keyword"] for entity in entities]
+            soup = make_soup(
+                content,
+                parse_only=class_strainer(
+                    keywords + [self.text_class, self.paginator_class]
+                ),
+            )
+        self.basic_parse(article, entities, soup)
+        pages = [soup]
+        further_pages = self._get_page_links(soup, link)
+        if further_pages:
+            _, page_pool = self._pools()
+            futures = [page_pool.submit(self._fetch_page, page) for page in further_pages]
+            for page, future in zip(further_pages, futures):
+                try:
+                    pages.append(future.result())
+                except Exception as e:
+                    log.warning(f'Could not download page "{page}" of "{link}": {e}')
+            Metrics.increment("pages.further", len(pages) - 1)
+        self.get_faz_text(article, pages)
+        article.pages = len(pages)
+        article.content_hash = article.digest()
+        return article
+
+    def _fetch_page(self, link: str) -> BeautifulSoup:
+        return make_soup(
+            self.fetch(link, throttle=False),
+            parse_only=class_strainer([self.text_class]),
+        )
+
+    def _get_page_links(self, soup: BeautifulSoup, link: str) -> list:
+        """
+        Returns the links to the further pages of an article found in its paginator, in page order.
+
+        :param soup: the parsed first page
+        :type soup: BeautifulSoup
+        :param link: the hyperlink of the first page
+        :type link: str
+        :return: the hyperlinks of the further pages
+        :rtype: list
+        """
+        pages = []
+        for anchor in soup.find_all("a", class_=self.paginator_class):
+            href = anchor.attrs.get("href")
+            if href and href != link and self.root_link in href and href not in pages:
+                pages.append(href)
+        return pages
+
+    def _parse_metadata(self, article: Article, content: bytes) -> list:
+        """
+        Writes the metadata found by the fast path into the article and counts whether it sufficed.
+
+        :param article: the article record the metadata is written into
+        :type article: Article
+        :param content: the raw page
+        :type content: bytes
+        :return: the entities of the parser dictionary which are left to the DOM parser
+        :rtype: list
+        """
+        metadata = extract_metadata(content)
+        for field, value in metadata.items():
+            article.set(field, value)
+        missing = [entity for entity in self.parser if entity not in metadata]
+        fallbacks = [entity for entity in missing if entity in page_metadata_fields]
+        Metrics.increment("metadata.pages")
+        if fallbacks:
+            for entity in fallbacks:
+                Metrics.increment(f"metadata.dom_fallback.{entity}")
+        else:
+            Metrics.increment("metadata.fast_path")
+        return missing
 
-    def get_faz_text(self) -> dict:
+    def get_faz_text(self, article: Article = None, pages: list = None) -> Article:
         """
         Adds some more FAZ specific features to the parsed return value. The following additional features are added
 
@@ -329,16 +896,21 @@ class FAZ_Scraper(ResponseParser):
             - ``nr_external_references``: yields the number of external hyperlink references in the text section
             - ``text``: yields the article's text
 
-        :return: some additional features extracted from the response object
-        :rtype: dict
+        :param article: the article record the features are written into. A new one is created if not provided
+        :type article: Article
+        :param pages: the parsed pages of the article in page order. Defaults to the ``curr_raw_article`` attribute
+        :type pages: list
+        :return: the article holding the additional features extracted from the response object
+        :rtype: Article
         """
-        return_dict = {}
-        html = self.curr_raw_article.find_all("p", class_="atc-TextParagraph")
-        return_dict["paragraphs"] = len(html)
-        return_dict["external_references"] = self._get_ext_reference(html)
-        return_dict["nr_external_references"] = len(return_dict["external_references"])
-        return_dict["text"] = "".join([r.text for r in html])
-        return return_dict
+        article = article if article is not None else Article()
+        pages = pages if pages is not None else [self.curr_raw_article]
+        html = [p for page in pages for p in page.find_all("p", class_=self.text_class)]
+        article.paragraphs = len(html)
+        article.external_references = self._get_ext_reference(html)
+        article.nr_external_references = len(article.external_references)
+        article.text = "".join([r.text for r in html])
+        return article
 
     @staticmethod
     def _get_ext_reference(html: BeautifulSoup) -> list:
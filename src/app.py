@@ -1,58 +1,361 @@
-from Webscraper import FAZ_Scraper
-from utilities import Logger, Decorators, read_config
-from pymongo import MongoClient
+from utilities import Logger, Decorators, Metrics, read_config
 from pathlib import Path
 import argparse
-import json
-from tqdm import tqdm
-import argparse
-from time import gmtime, strftime
 
-log = Logger.log
-conf = read_config('config.yaml')if Path('config.yaml').exists() else read_config(Path(__file__).resolve().parent.parent.joinpath('config.yaml'))
+log = Logger.get_logger("app")
+
 
-faz_dic = conf['faz_dic']
-faz_base_parser = conf['faz_base_parser']
+def load_config():
+    return read_config('config.yaml') if Path('config.yaml').exists() else read_config(Path(__file__).resolve().parent.parent.joinpath('config.yaml'))
 
 
-scraper = FAZ_Scraper(root_link=faz_dic['root_link'],
-                      topic_class=faz_dic['topic_link'],
-                      article_class=faz_dic['article_link'],
-                      parser=faz_base_parser)
+def build_scraper(conf):
+    from Webscraper import FAZ_Scraper
+
+    faz_dic = conf['faz_dic']
+    scraper = FAZ_Scraper(root_link=faz_dic['root_link'],
+                          topic_class=faz_dic['topic_link'],
+                          article_class=faz_dic['article_link'],
+                          parser=conf['faz_base_parser'],
+                          fast_path=faz_dic.get('fast_path', True),
+                          workers=faz_dic.get('workers', 8),
+                          page_workers=faz_dic.get('page_workers', 4),
+                          timeout=faz_dic.get('timeout', 30),
+                          topic_workers=faz_dic.get('topic_workers', 4))
+    scraper.max_body_size = faz_dic.get('max_body_size')
+    if faz_dic.get('max_bytes_in_flight'):
+        from Webscraper import ByteLimiter
+        scraper.in_flight = ByteLimiter(faz_dic['max_bytes_in_flight'])
+    scraper.selected_topics = faz_dic.get('topics')
+    scraper.excluded_topics = faz_dic.get('drop_topics')
+    topic_cache_conf = dict(conf.get('topic_cache', {}))
+    if topic_cache_conf.pop('enabled', False):
+        from topic_cache import TopicCache
+        scraper.topic_cache = TopicCache(**topic_cache_conf)
+    discovery_conf = dict(conf.get('discovery', {}))
+    if discovery_conf.pop('enabled', False):
+        from discovery import FeedDiscovery
+        scraper.discovery = FeedDiscovery(scraper, **discovery_conf)
+    return scraper
 
 
 def convert_arg_str_to_bool(arg):
     return 1 if arg =="y" else 0
 
-@Decorators.run_time
-def run_scraper(write_json, write_mongo, host, port, collection, database):
-    log.info(f'Running the Web Scraper with the following arguments:\nWrite to JSON:{write_json}\nWrite to MongoDB:{write_mongo}\nHost:{host}\nPort:{port}'
-             f'\ncolletion:{collection}\ndatabase:{database}')
 
+def build_sinks(conf, write_json, write_mongo, write_parquet, write_archive, write_search, host, port, collection, database):
+    from sinks import JsonSink, MongoSink, ParquetSink, RotatingFileSink
+
+    sinks = []
+    if convert_arg_str_to_bool(write_json):
+        sinks.append(JsonSink())
     if convert_arg_str_to_bool(write_mongo):
-        client = MongoClient(host, port)
-        mongo_collection = client[collection]
-        mongo_db = mongo_collection.get_collection(database)
-    scraper = FAZ_Scraper(root_link=faz_dic['root_link'],
-                      topic_class=faz_dic['topic_link'],
-                      article_class=faz_dic['article_link'],
-                      parser=faz_base_parser)
-    scraper.get_topics()
-    for topic in tqdm(scraper.topics):
-        scraper.set_topic(topic).get_articles_of_topic()
-        results= scraper.download_all_articles_from_curr_topic()
-        if convert_arg_str_to_bool(write_json):
-            ts = strftime("%Y%m%d%H%M%S", gmtime())
-            outfile = f"{topic}_{ts}.json"
-            log.info(f'Writing data to "{outfile}"' )
-            with open(outfile, 'w') as fp:
-                json.dump(results, fp)
-        if convert_arg_str_to_bool(write_mongo):
-            try:
-                log.info(f'Writing a total of {len(results)} into db {mongo_db} for topic {scraper.curr_topic}')
-                mongo_db.insert_many(results)
-            except Exception as e:
-                log.error(e)
+        sinks.append(MongoSink(host, port, collection, database))
+    if convert_arg_str_to_bool(write_parquet):
+        sinks.append(ParquetSink(**conf.get('parquet', {})))
+    if convert_arg_str_to_bool(write_archive):
+        archive_conf = dict(conf.get('archive', {}))
+        if archive_conf.pop('index', False):
+            from archive_index import IndexedFileSink
+
+            sinks.append(IndexedFileSink(**archive_conf))
+        else:
+            sinks.append(RotatingFileSink(**archive_conf))
+    if convert_arg_str_to_bool(write_search):
+        from search_index import SearchIndexSink
+
+        sinks.append(SearchIndexSink(**conf.get('search_index', {})))
+    return sinks
+
+
+def build_stages(conf, near_duplicates, text_statistics, skip_unchanged="n"):
+    stages = []
+    if convert_arg_str_to_bool(skip_unchanged):
+        from hash_store import HashStore
+
+        stages.append(HashStore(**conf.get('content_hash', {})))
+    if convert_arg_str_to_bool(near_duplicates):
+        from dedup import NearDuplicateDetector
+
+        stages.append(NearDuplicateDetector(**conf.get('near_duplicates', {})))
+    if convert_arg_str_to_bool(text_statistics):
+        from text_stats import TextStatistics
+
+        stages.append(TextStatistics(**conf.get('text_statistics', {})))
+    return stages
+
+
+def build_refresher(conf, refresh):
+    if not convert_arg_str_to_bool(refresh):
+        return None
+    from refresh import RefreshScheduler
+
+    return RefreshScheduler(**conf.get('refresh', {}))
+
+
+def build_journal(conf):
+    journal_conf = dict(conf.get('journal', {}))
+    if not journal_conf.pop('enabled', True):
+        return None
+    from journal import RunJournal
+
+    return RunJournal(**journal_conf)
+
+
+def scrape_topic(scraper, topic, journal=None, state=None, budget=None, remaining_topics=1, links=None):
+    """
+    Scrapes all articles of a topic. With a journal, the planned links and each scraped article are recorded; when
+    resuming, the links planned by the last run are taken from its state and the links it wrote are skipped. With a
+    budget, only the articles allocated to the topic are scraped. The links of the topic are fetched unless they are
+    given.
+    """
+    scraper.set_topic(topic)
+    if state is not None and topic in state.plans:
+        links = state.plans[topic]
+    else:
+        if links is None:
+            links = scraper.get_articles_of_topic().curr_article_all_links
+        if budget is not None:
+            links = links[:budget.allocate(topic, len(links), remaining_topics)]
+        if journal is not None:
+            journal.plan(topic, links)
+    done = state.written_links(topic) if state is not None else set()
+    if done:
+        log.info(f'Resuming topic {topic} with {len(done)} of {len(links)} articles already written')
+    scraper.curr_article_all_links = [link for link in links if link not in done]
+    on_article = (lambda article: journal.article(topic, article)) if journal is not None else None
+    scraped = scraper.download_all_articles_from_curr_topic(on_article=on_article)
+    if budget is not None:
+        budget.record_articles(len(scraped))
+    return scraped
+
+
+def build_budget(conf, args):
+    budget_conf = dict(conf.get('budget', {}))
+    for key in ('max_requests', 'max_bytes', 'max_seconds', 'default_quota'):
+        if getattr(args, key) is not None:
+            budget_conf[key] = getattr(args, key)
+    if not any(budget_conf.get(key) for key in ('max_requests', 'max_bytes', 'max_seconds', 'default_quota', 'topic_quotas')):
+        return None
+    from budget import CrawlBudget
+
+    return CrawlBudget(**budget_conf)
+
+
+def build_frontier(conf):
+    frontier_conf = dict(conf.get('frontier', {}))
+    if not frontier_conf.pop('enabled', False):
+        return None, None
+    from frontier import Frontier
+
+    batch_size = frontier_conf.pop('batch_size', 32)
+    return Frontier(**frontier_conf), batch_size
+
+
+def write_topic(results, topic, stages=(), sinks=(), refresher=None):
+    from sinks import write_batch
+
+    results = write_batch(results, topic, stages, sinks)
+    if refresher is not None:
+        refresher.process(results)
+
+
+def consume_links(scraper, topic, links):
+    """
+    Tells the discovery backend which links of a topic were scraped and written, such that they are not returned again.
+    Links which failed to download stay pending.
+    """
+    if scraper.discovery is not None:
+        failed = set(scraper.curr_failed_links)
+        scraper.discovery.consumed(topic, [link for link in links if link not in failed])
+
+
+def iter_topic_links(scraper, state=None):
+    """
+    Yields each topic which is not written yet with its article links. The topics planned by a resumed run come first,
+    with None as links, as their links are taken from the journal. The section pages of all other topics are fetched
+    concurrently and each topic is yielded as soon as its page arrived.
+    """
+    topics = [topic for topic in scraper.topics if state is None or topic not in state.completed]
+    planned = [topic for topic in topics if state is not None and topic in state.plans]
+    for topic in planned:
+        yield topic, None
+    discovered = scraper.iter_article_links([topic for topic in topics if topic not in planned])
+    try:
+        yield from discovered
+    finally:
+        discovered.close()
+
+
+def plan_topic(scraper, frontier, topic, links, journal=None, state=None, budget=None):
+    """
+    Pushes the links of a topic into the frontier, with their position on the section page and, if known from the
+    feeds, their publication time. When resuming, the links planned by the last run are used (``links`` is None) and
+    the links it wrote are left out. With a budget, at most the quota of the topic is pushed.
+    """
+    if links is None:
+        links = state.plans[topic]
+    else:
+        if budget is not None and len(links) > budget.quota(topic):
+            links = links[:int(budget.quota(topic))]
+        if journal is not None:
+            journal.plan(topic, links)
+    done = state.written_links(topic) if state is not None else set()
+    published = scraper.discovery.published if scraper.discovery is not None else {}
+    for position, link in enumerate(links):
+        if link not in done:
+            frontier.push(link, topic, position, published.get(link))
+
+
+def scrape_frontier(scraper, frontier, batch_size, stages=(), sinks=(), refresher=None, journal=None, state=None, budget=None):
+    """
+    Scrapes the articles of all topics in the order of the frontier, ``batch_size`` articles at a time, until the
+    frontier or the budget is exhausted. The section pages are fetched concurrently; a batch is scraped whenever a
+    section page arrived, so downloads start with the first topic. The links of each batch are recorded as written in
+    the journal once the sinks wrote them, and a topic is recorded as completed once none of its articles is pending
+    any more.
+    """
+    from collections import OrderedDict
+    from math import ceil
+
+    on_article = (lambda article: journal.article(article.section, article)) if journal is not None else None
+
+    def run_batch():
+        size = batch_size
+        if budget is not None:
+            if budget.exhausted():
+                return False
+            size = min(size, ceil(budget.remaining_articles()))
+        batch = frontier.pop_batch(size)
+        results = scraper.download_articles(batch, on_article) if batch else []
+        if budget is not None:
+            budget.record_articles(len(results))
+        by_topic = OrderedDict((topic, []) for _, topic in batch)
+        for article in results:
+            by_topic[article.section].append(article)
+        for topic, articles in by_topic.items():
+            write_topic(articles, topic, stages, sinks, refresher)
+            consume_links(scraper, topic, [link for link, link_topic in batch if link_topic == topic])
+            if journal is not None:
+                journal.written(topic, [article.link for article in articles])
+                if not frontier.pending(topic):
+                    journal.completed(topic)
+        return True
+
+    discovered = iter_topic_links(scraper, state)
+    for topic, links in discovered:
+        plan_topic(scraper, frontier, topic, links, journal, state, budget)
+        if journal is not None and not frontier.pending(topic):
+            journal.completed(topic)
+        if not run_batch():
+            discovered.close()
+            return
+    while len(frontier) and run_batch():
+        pass
+
+
+@Decorators.run_time
+def run_scraper(scraper, sinks, stages=(), refresher=None, journal=None, resume=False, frontier=None, batch_size=32, budget=None):
+    log.info(f'Running the Web Scraper with the following outputs: {[type(sink).__name__ for sink in sinks]}')
+    from tqdm import tqdm
+
+    state = journal.load() if journal is not None and resume else None
+    if state is not None:
+        log.info(
+            f'Resuming the last run, {len(state.completed)} of {len(state.topics)} topics were already written, '
+            f'{state.unwritten()} articles which were scraped but not written are downloaded again'
+        )
+        scraper.topics = state.topics
+        journal.resume()
+    else:
+        if resume:
+            log.info('There is no unfinished run to resume, starting a new one')
+        scraper.get_topics()
+        if journal is not None:
+            journal.start(scraper.topics)
+    try:
+        if frontier is not None:
+            scrape_frontier(scraper, frontier, batch_size, stages, sinks, refresher, journal, state, budget)
+        else:
+            topics = [topic for topic in scraper.topics if state is None or topic not in state.completed]
+            discovered = iter_topic_links(scraper, state)
+            for position, (topic, links) in enumerate(tqdm(discovered, total=len(topics))):
+                if budget is not None and budget.exhausted():
+                    discovered.close()
+                    break
+                results = scrape_topic(scraper, topic, journal, state, budget, len(topics) - position, links)
+                write_topic(results, topic, stages, sinks, refresher)
+                consume_links(scraper, topic, scraper.curr_article_all_links + [article.link for article in results])
+                if journal is not None:
+                    journal.written(topic, [article.link for article in results])
+                    journal.completed(topic)
+        if refresher is not None:
+            while refresher.refresh_due(scraper, sinks) == refresher.batch_size:
+                pass
+        if journal is not None:
+            journal.finish()
+    finally:
+        if journal is not None:
+            journal.close()
+        if refresher is not None:
+            refresher.close()
+        for stage in stages:
+            stage.close()
+        for sink in sinks:
+            sink.close()
+        scraper.close()
+        Metrics.log_summary(log)
+
+
+def run_distributed(conf, role, scraper, sinks, stages=()):
+    from coordination import Coordinator, RateLimiter, Worker, build_work_queue
+
+    coordination = dict(conf.get('coordination', {}))
+    queue = build_work_queue(**coordination.get('queue', {}))
+    scraper.rate_limiter = RateLimiter(queue, coordination.get('rate', 5), coordination.get('burst', 10), coordination.get('block', 10))
+    if role == 'coordinator':
+        for sink in sinks:
+            sink.close()
+        Coordinator(scraper, queue, coordination.get('interval')).run()
+    else:
+        log.info(f'Running the Web Scraper as worker with the following outputs: {[type(sink).__name__ for sink in sinks]}')
+        Worker(scraper, queue, sinks, stages,
+               batch_size=coordination.get('batch_size', 20),
+               lease_seconds=coordination.get('lease_seconds', 300),
+               idle_wait=coordination.get('idle_wait', 10),
+               exit_when_empty=coordination.get('exit_when_empty', False)).run()
+
+
+def build_seen_filter(conf):
+    seen_conf = dict(conf.get('seen_filter', {}))
+    if not seen_conf.pop('enabled', False):
+        return None
+    from seen_filter import SeenFilter
+    return SeenFilter(**seen_conf)
+
+
+def run_backfill(conf, date_range, shard, scraper, sinks, stages=()):
+    from backfill import Backfill, make_shards, parse_date_range, parse_shard
+    from coordination import RateLimiter, build_work_queue
+
+    backfill = dict(conf.get('backfill', {}))
+    coordination = dict(conf.get('coordination', {}))
+    queue = build_work_queue(**coordination.get('queue', {}))
+    scraper.rate_limiter = RateLimiter(queue, coordination.get('rate', 5), coordination.get('burst', 10), coordination.get('block', 10))
+    shards = make_shards(*parse_date_range(date_range), backfill.pop('shard_days', 7), *parse_shard(shard))
+    log.info(f'Backfilling {len(shards)} shards of {date_range} with the following outputs: {[type(sink).__name__ for sink in sinks]}')
+    try:
+        Backfill(scraper, sinks, shards, stages=stages, seen_filter=build_seen_filter(conf), **backfill).run()
+    finally:
+        queue.close()
+
+
+def run_daemon(conf, scraper, sinks, stages=(), refresher=None):
+    from daemon import Daemon
+
+    log.info(f'Running the Web Scraper as daemon with the following outputs: {[type(sink).__name__ for sink in sinks]}')
+    Daemon(scraper, sinks, stages, refresher=refresher, seen_filter=build_seen_filter(conf), **conf.get('daemon', {})).run()
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Setup a Mongo database.')
@@ -72,6 +375,142 @@ if __name__ == '__main__':
         choices=["n","y"],
         help="A flag indicating if the result data shall be written into a MongoDB database. y if yes, else n"
     )
+    parser.add_argument(
+        "--write_parquet",
+        "-parquet",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the result data shall be written into partitioned Parquet/Arrow files (requires pyarrow). y if yes, else n"
+    )
+    parser.add_argument(
+        "--write_archive",
+        "-archive",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the result data shall be appended to compressed, rotating JSON lines files with a manifest. y if yes, else n"
+    )
+    parser.add_argument(
+        "--write_search",
+        "-search",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the articles shall be added to the local full-text index. y if yes, else n"
+    )
+    parser.add_argument(
+        "--near_duplicates",
+        "-dedup",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if articles shall be tagged with their near-duplicate cluster (see near_duplicates in config.yaml). y if yes, else n"
+    )
+    parser.add_argument(
+        "--text_statistics",
+        "-stats",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if word and sentence counts, readability and reference density shall be added to the articles. y if yes, else n"
+    )
+    parser.add_argument(
+        "--skip_unchanged",
+        "-skip",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if articles which did not change since they were last written shall be skipped (see content_hash in config.yaml). y if yes, else n"
+    )
+    parser.add_argument(
+        "--refresh",
+        "-refresh",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the comments and recommendations of recent articles shall be re-crawled and written as deltas (see refresh in config.yaml). y if yes, else n"
+    )
+    parser.add_argument(
+        "--resume",
+        "-resume",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the last run shall be continued where it stopped, as recorded in its journal (see journal in config.yaml). y if yes, else n"
+    )
+    parser.add_argument(
+        "--role",
+        "-role",
+        default="none",
+        type=str,
+        choices=["none","coordinator","worker"],
+        help="The role of this node in a crawl shared by several nodes (see coordination in config.yaml): the coordinator queues the article links, workers scrape them. none runs a standalone crawl"
+    )
+    parser.add_argument(
+        "--daemon",
+        "-daemon",
+        default="n",
+        type=str,
+        choices=["n","y"],
+        help="A flag indicating if the scraper shall keep running and poll each topic on an adaptive schedule (see daemon in config.yaml). y if yes, else n"
+    )
+    parser.add_argument(
+        "--backfill",
+        "-backfill",
+        default="",
+        type=str,
+        help="A date range as YYYY-mm-dd:YYYY-mm-dd whose archive pages shall be scraped instead of the current topic pages (see backfill in config.yaml)"
+    )
+    parser.add_argument(
+        "--shard",
+        "-shard",
+        default="0/1",
+        type=str,
+        help="The shards of the backfill date range this process works on as i/n: every n-th shard, starting with shard i"
+    )
+    parser.add_argument(
+        "--topics",
+        "-topics",
+        default="",
+        type=str,
+        help="A comma separated list of the topics to scrape, e.g. politik,wirtschaft. All topics if empty"
+    )
+    parser.add_argument(
+        "--drop_topics",
+        "-drop",
+        default="",
+        type=str,
+        help="A comma separated list of the topics not to scrape"
+    )
+    parser.add_argument(
+        "--default_quota",
+        "-quota",
+        default=None,
+        type=int,
+        help="The maximum number of articles scraped per topic (see budget in config.yaml for quotas per topic)"
+    )
+    parser.add_argument(
+        "--max_requests",
+        "-max_requests",
+        default=None,
+        type=int,
+        help="The maximum number of requests of the run"
+    )
+    parser.add_argument(
+        "--max_bytes",
+        "-max_bytes",
+        default=None,
+        type=int,
+        help="The maximum number of bytes downloaded by the run"
+    )
+    parser.add_argument(
+        "--max_seconds",
+        "-max_seconds",
+        default=None,
+        type=int,
+        help="The maximum run time in seconds, after which no further articles are scheduled"
+    )
     parser.add_argument(
         "--host",
         "-hst",
@@ -102,12 +541,38 @@ if __name__ == '__main__':
         help="If the file written to a MongoDB, specify the database here"
     )
     args = parser.parse_args()
-    run_scraper(
+    conf = load_config()
+    Logger.configure(**conf.get('logging', {}))
+    log.info(f'Running the Web Scraper with the following arguments:\nWrite to JSON:{args.write_json}\nWrite to MongoDB:{args.write_db}'
+             f'\nWrite to Parquet:{args.write_parquet}\nWrite to archive:{args.write_archive}\nWrite to search index:{args.write_search}\nHost:{args.host}\nPort:{args.port}\ncolletion:{args.collection}\ndatabase:{args.database}')
+    sinks = build_sinks(
+        conf,
         args.write_json,
         args.write_db,
+        args.write_parquet,
+        args.write_archive,
+        args.write_search,
         args.host,
         args.port,
         args.collection,
         args.database
     )
-    #write_json, write_mongo, host, port, collection, database
\ No newline at end of file
+    stages = build_stages(conf, args.near_duplicates, args.text_statistics, args.skip_unchanged)
+    refresher = build_refresher(conf, args.refresh)
+    scraper = build_scraper(conf)
+    if args.topics:
+        scraper.selected_topics = args.topics.split(',')
+    if args.drop_topics:
+        scraper.excluded_topics = args.drop_topics.split(',')
+    if convert_arg_str_to_bool(args.skip_unchanged):
+        scraper.hash_store = stages[0]
+    if args.backfill:
+        run_backfill(conf, args.backfill, args.shard, scraper, sinks, stages)
+    elif args.role != "none":
+        run_distributed(conf, args.role, scraper, sinks, stages)
+    elif convert_arg_str_to_bool(args.daemon):
+        run_daemon(conf, scraper, sinks, stages, refresher)
+    else:
+        frontier, batch_size = build_frontier(conf)
+        scraper.budget = build_budget(conf, args)
+        run_scraper(scraper, sinks, stages, refresher, build_journal(conf), convert_arg_str_to_bool(args.resume), frontier, batch_size, scraper.budget)
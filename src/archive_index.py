@@ -0,0 +1,503 @@
+"""
+This module provides random access to single articles in the file archive without reading the files as a whole.
+
+Next to every data file, a sidecar index ``{file}.idx`` is written. It holds one fixed size entry per record:
+
+    link hash (8 bytes) | block offset | block length | record offset | record length | publication day | section hash
+
+sorted by the link hash. The block is the compressed gzip member or zstd frame the record was written in (see
+``sinks.compress_block``), the record offset and length locate the JSON line inside the decompressed block. To look up
+an article, the index is memory mapped and binary searched, and only the one block holding the record is read from the
+memory mapped data file and decompressed. Range scans by date and section run over the same entries and use the manifest
+to skip files outside of the date range.
+
+To route a lookup to the files which may hold the article, the manifest entry of every indexed file holds a Bloom
+filter of its link hashes (``keys``, base64 encoded, about 1% false positives). Only the files whose filter matches are
+opened; at most ``max_open`` files are kept mapped. If several files hold an article, the record with the newest
+``crawled`` time is returned, then the one in the most recently modified file.
+
+Indexes are written by ``IndexedFileSink`` and by the compaction job for the daily partitions. While a file of
+``IndexedFileSink`` is open, the entries of every written block are appended, unsorted, to ``{file}.open.idx``, such
+that its articles can be looked up before the file is rotated; this live index is searched linearly.
+
+Usage:
+    python src/archive_index.py lookup https://www.faz.net/aktuell/... --dir archive --dir daily
+    python src/archive_index.py scan --start 2020-04-01 --end 2020-04-07 --section politik --dir daily
+"""
+from __future__ import annotations
+import argparse
+from base64 import b64decode, b64encode
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date
+from hashlib import blake2b
+import json
+import math
+import mmap
+from os import listdir, remove, replace
+from os.path import exists, getmtime, getsize, isdir, join
+import struct
+from zlib import crc32
+
+from sinks import (
+    Manifest,
+    RotatingFileSink,
+    compression_of,
+    decompress_block,
+    record_date,
+)
+from utilities import Logger
+
+log = Logger.get_logger(__name__)
+
+_entry = struct.Struct("<8sQIIIII")
+_filter_hashes = 7
+_filter_bits_per_key = 10
+
+
+def link_hash(link: str) -> bytes:
+    """
+    :param link: the link of an article
+    :type link: str
+    :return: the 8 byte hash of the link used as key in the index
+    :rtype: bytes
+    """
+    return blake2b((link or "").encode("utf-8"), digest_size=8).digest()
+
+
+def section_hash(section: str) -> int:
+    return crc32((section or "").encode("utf-8"))
+
+
+def _filter_positions(key: bytes, bits: int):
+    first, second = struct.unpack("<II", key)
+    second |= 1
+    for i in range(_filter_hashes):
+        yield (first + i * second) % bits
+
+
+def key_filter(keys: list) -> str:
+    """
+    Builds the Bloom filter of the link hashes of a file, as stored in its manifest entry.
+
+    :param keys: the link hashes, see ``link_hash``
+    :type keys: list
+    :return: the bit array, base64 encoded
+    :rtype: str
+    """
+    bits = max(64, math.ceil(len(keys) * _filter_bits_per_key / 8) * 8)
+    array = bytearray(bits // 8)
+    for key in keys:
+        for position in _filter_positions(key, bits):
+            array[position >> 3] |= 1 << (position & 7)
+    return b64encode(bytes(array)).decode("ascii")
+
+
+def filter_contains(array: bytes, key: bytes) -> bool:
+    """
+    :param array: the decoded bit array of a ``key_filter``
+    :type array: bytes
+    :param key: a link hash
+    :type key: bytes
+    :return: whether the file may hold the key
+    :rtype: bool
+    """
+    bits = len(array) * 8
+    return all(
+        array[position >> 3] & (1 << (position & 7))
+        for position in _filter_positions(key, bits)
+    )
+
+
+class OffsetIndexWriter:
+    """
+    Collects the index entries of one data file and writes them, sorted by link hash, into the sidecar index.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def add(
+        self,
+        link: str,
+        day: str,
+        section: str,
+        block_offset: int,
+        block_length: int,
+        record_offset: int,
+        record_length: int,
+    ) -> None:
+        self.entries.append(
+            _entry.pack(
+                link_hash(link),
+                block_offset,
+                block_length,
+                record_offset,
+                record_length,
+                date.fromisoformat(day).toordinal(),
+                section_hash(section),
+            )
+        )
+
+    def add_block(self, block_offset: int, block_length: int, records, lines) -> None:
+        """
+        Adds the entries of all records written in one block.
+
+        :param block_offset: the position of the block in the data file
+        :param block_length: the length of the block
+        :param records: the records (``Article`` objects or dictionaries) of the block
+        :param lines: the encoded JSON line of each record
+        """
+        record_offset = 0
+        for record, line in zip(records, lines):
+            if isinstance(record, dict):
+                link, section = record.get("link"), record.get("section")
+            else:
+                link, section = record.link, record.section
+            self.add(
+                link,
+                record_date(record),
+                section,
+                block_offset,
+                block_length,
+                record_offset,
+                len(line),
+            )
+            record_offset += len(line)
+
+    def write(self, data_path: str) -> str:
+        """
+        Writes the sidecar index of ``data_path`` atomically.
+
+        :param data_path: the path of the data file
+        :type data_path: str
+        :return: the Bloom filter of the link hashes for the manifest, see ``key_filter``
+        :rtype: str
+        """
+        tmp = f"{data_path}.idx.tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(b"".join(sorted(self.entries)))
+        replace(tmp, f"{data_path}.idx")
+        keys = key_filter([entry[:8] for entry in self.entries])
+        self.entries = []
+        return keys
+
+
+class IndexedFileSink(RotatingFileSink):
+    """
+    A ``RotatingFileSink`` which writes a sidecar index for every file it closes and a live index of the file it is
+    writing. It takes the same arguments.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._index = OffsetIndexWriter()
+        self._live = None
+        self._keys = None
+        super().__init__(*args, **kwargs)
+
+    def _block_written(self, offset, length, articles, lines) -> None:
+        written = len(self._index.entries)
+        self._index.add_block(offset, length, articles, lines)
+        # The block must be readable before its entries are
+        self._file.flush()
+        if self._live is None:
+            self._live = open(f"{self.path}.open.idx", "ab")
+        self._live.write(b"".join(self._index.entries[written:]))
+        self._live.flush()
+
+    def rotate(self) -> None:
+        if self._file is not None:
+            self._keys = self._index.write(self.path)
+        super().rotate()
+        if self._live is not None:
+            self._live.close()
+            self._live = None
+            remove(f"{self.path}.open.idx")
+
+    def _manifest_entry(self, size: int) -> dict:
+        entry = super()._manifest_entry(size)
+        entry["keys"] = self._keys
+        return entry
+
+
+class _IndexedFile:
+    """
+    A data file together with its memory mapped sidecar index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.live = path.endswith(".open")
+        self.compression = compression_of(path)
+        self._index = self._map(f"{path}.idx")
+        self._data = None
+        self.size = len(self._index) // _entry.size if self._index else 0
+        self._keys = _Keys(self)
+        self._block = (None, None)
+        self.modified = getmtime(path) if exists(path) else 0.0
+
+    @staticmethod
+    def _map(path):
+        if not exists(path) or not getsize(path):
+            return None
+        with open(path, "rb") as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entry(self, position: int) -> tuple:
+        return _entry.unpack_from(self._index, position * _entry.size)
+
+    def find(self, key: bytes) -> list:
+        if self.live:
+            # the live index is unsorted
+            return [
+                entry
+                for entry in map(self.entry, range(self.size))
+                if entry[0] == key
+            ]
+        position = bisect_left(self._keys, key)
+        entries = []
+        while position < self.size:
+            entry = self.entry(position)
+            if entry[0] != key:
+                break
+            entries.append(entry)
+            position += 1
+        return entries
+
+    def read(self, entry: tuple) -> dict:
+        _, block_offset, block_length, record_offset, record_length = entry[:5]
+        if self._data is None:
+            self._data = self._map(self.path)
+            if self._data is None:
+                # a live file which was rotated since its index was mapped
+                raise FileNotFoundError(f'"{self.path}" is missing or empty')
+        if self._block[0] != block_offset:
+            raw = self._data[block_offset : block_offset + block_length]
+            self._block = (block_offset, decompress_block(raw, self.compression))
+        line = self._block[1][record_offset : record_offset + record_length]
+        return json.loads(line)
+
+    def close(self) -> None:
+        for mapped in (self._index, self._data):
+            if mapped is not None:
+                mapped.close()
+
+
+class _Keys:
+    """
+    A read-only sequence view on the link hashes of an index, used for the binary search.
+    """
+
+    def __init__(self, indexed_file):
+        self.file = indexed_file
+
+    def __len__(self):
+        return self.file.size
+
+    def __getitem__(self, position):
+        return self.file._index[
+            position * _entry.size : position * _entry.size + 8
+        ]
+
+
+class ArchiveIndex:
+    """
+    Looks up and scans articles in the indexed files of one or more archive directories.
+
+    Example:
+        1 index = ArchiveIndex(["archive", "daily"])
+        2 article = index.get("https://www.faz.net/aktuell/...")
+        3 for article in index.scan(start="2020-04-01", end="2020-04-07", section="politik"):
+        4     ...
+
+    :param directories: the archive directories
+    :param max_open: the number of indexed files kept memory mapped
+    """
+
+    def __init__(self, directories, max_open=64):
+        self.directories = [d for d in directories if isdir(d)]
+        self.max_open = max_open
+        self._files = OrderedDict()
+        self._listings = {}
+        self._manifests = {}
+        self._filters = {}
+
+    def _listing(self, directory) -> tuple:
+        """
+        :return: the names of the indexed files and of the live files of a directory, cached until it changes
+        :rtype: tuple
+        """
+        modified = getmtime(directory)
+        cached = self._listings.get(directory)
+        if cached is None or cached[0] != modified:
+            names = [name[: -len(".idx")] for name in listdir(directory) if name.endswith(".idx")]
+            cached = self._listings[directory] = (
+                modified,
+                sorted(name for name in names if not name.endswith(".open")),
+                sorted(name for name in names if name.endswith(".open")),
+            )
+        return cached[1], cached[2]
+
+    def _manifest(self, directory) -> dict:
+        path = join(directory, Manifest.file_name)
+        modified = getmtime(path) if exists(path) else None
+        cached = self._manifests.get(directory)
+        if cached is None or cached[0] != modified:
+            cached = self._manifests[directory] = (modified, Manifest(directory).load())
+        return cached[1]
+
+    def _data_files(self, directory, start=None, end=None) -> list:
+        names, _ = self._listing(directory)
+        if start or end:
+            selected = set(Manifest(directory).select(start, end))
+            names = [name for name in names if name in selected]
+        return [join(directory, name) for name in names]
+
+    def _candidates(self, directory, key: bytes) -> list:
+        """
+        :return: the indexed files of a directory whose key filter may hold the key. Files without a filter in the
+            manifest are always candidates
+        :rtype: list
+        """
+        names, _ = self._listing(directory)
+        manifest = self._manifest(directory)
+        candidates = []
+        for name in names:
+            keys = manifest.get(name, {}).get("keys")
+            if keys is not None:
+                array = self._filters.get(keys)
+                if array is None:
+                    array = self._filters[keys] = b64decode(keys)
+                if not filter_contains(array, key):
+                    continue
+            candidates.append(join(directory, name))
+        return candidates
+
+    def _open(self, path) -> _IndexedFile:
+        indexed = self._files.pop(path, None)
+        if indexed is not None and indexed.modified != getmtime(path):
+            # replaced by the compaction job
+            indexed.close()
+            indexed = None
+        if indexed is None:
+            indexed = _IndexedFile(path)
+        self._files[path] = indexed
+        while len(self._files) > self.max_open:
+            self._files.popitem(last=False)[1].close()
+        return indexed
+
+    def get(self, link: str) -> dict:
+        """
+        Returns the most recently crawled record of an article, including the files which are still being written.
+
+        :param link: the link of the article
+        :type link: str
+        :return: the record or None if the article is not in the archive
+        :rtype: dict
+        """
+        key = link_hash(link)
+        found, newest = None, None
+        for directory in self.directories:
+            _, live = self._listing(directory)
+            paths = [(path, False) for path in self._candidates(directory, key)]
+            paths += [(join(directory, name), True) for name in live]
+            for path, is_live in paths:
+                try:
+                    # live files grow, they are mapped for this lookup only
+                    indexed = _IndexedFile(path) if is_live else self._open(path)
+                except OSError as e:
+                    log.warning(f'Could not open "{path}": {e}')
+                    continue
+                try:
+                    for entry in indexed.find(key):
+                        try:
+                            record = indexed.read(entry)
+                        except (OSError, ValueError, EOFError) as e:
+                            log.warning(f'Could not read an entry of "{path}": {e}')
+                            continue
+                        version = (
+                            record.get("crawled") or "",
+                            indexed.modified,
+                            entry[1],
+                            entry[3],
+                        )
+                        if record.get("link") == link and (newest is None or version > newest):
+                            found, newest = record, version
+                finally:
+                    if is_live:
+                        indexed.close()
+        return found
+
+    def scan(self, start: str = None, end: str = None, section: str = None):
+        """
+        Yields all records published between ``start`` and ``end`` (inclusive, YYYY-MM-DD) in the given section.
+
+        :param start: the first date of interest
+        :type start: str
+        :param end: the last date of interest
+        :type end: str
+        :param section: the section of interest
+        :type section: str
+        :return: a generator of records
+        """
+        first = date.fromisoformat(start).toordinal() if start else 0
+        last = date.fromisoformat(end).toordinal() if end else 2 ** 32 - 1
+        wanted_section = section_hash(section) if section else None
+        for directory in self.directories:
+            _, live = self._listing(directory)
+            paths = [(path, False) for path in self._data_files(directory, start, end)]
+            paths += [(join(directory, name), True) for name in live]
+            for path, is_live in paths:
+                try:
+                    indexed = _IndexedFile(path) if is_live else self._open(path)
+                except OSError as e:
+                    log.warning(f'Could not open "{path}": {e}')
+                    continue
+                try:
+                    entries = [
+                        indexed.entry(position) for position in range(indexed.size)
+                    ]
+                    entries = [
+                        entry
+                        for entry in entries
+                        if first <= entry[5] <= last
+                        and (wanted_section is None or entry[6] == wanted_section)
+                    ]
+                    for entry in sorted(entries, key=lambda e: (e[1], e[3])):
+                        record = indexed.read(entry)
+                        if section is None or record.get("section") == section:
+                            yield record
+                finally:
+                    if is_live:
+                        indexed.close()
+
+    def close(self) -> None:
+        for indexed in self._files.values():
+            indexed.close()
+        self._files = OrderedDict()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Look up single articles or scan date ranges in the indexed archive."
+    )
+    parser.add_argument("command", choices=["lookup", "scan"])
+    parser.add_argument("link", nargs="?", help="The link of the article to look up")
+    parser.add_argument(
+        "--dir",
+        "-d",
+        action="append",
+        help="An archive directory holding indexed files. Can be given several times",
+    )
+    parser.add_argument("--start", help="The first publication date (YYYY-MM-DD) of a scan")
+    parser.add_argument("--end", help="The last publication date (YYYY-MM-DD) of a scan")
+    parser.add_argument("--section", help="Only scan articles of this section")
+    args = parser.parse_args()
+    index = ArchiveIndex(args.dir or ["archive", "daily"])
+    if args.command == "lookup":
+        record = index.get(args.link)
+        print(json.dumps(record, ensure_ascii=False) if record else "Not found")
+    else:
+        for record in index.scan(args.start, args.end, args.section):
+            print(json.dumps(record, ensure_ascii=False))
+    index.close()
@@ -0,0 +1,224 @@
+"""
+This module provides the record type in which a parsed article is held.
+
+An ``Article`` uses ``__slots__`` instead of a per-instance dictionary and interns values which repeat across many
+records (the section, the newspaper, authors and external references), such that holding a large number of articles in
+memory, e.g. for deduplication or batch writes, stays cheap. The record can be converted to a dictionary, a JSON
+string or a BSON document for the different outputs.
+"""
+from __future__ import annotations
+from datetime import datetime
+from hashlib import blake2b
+import json
+import re
+from sys import intern
+
+_faz_time = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})\D+(\d{2}):(\d{2})")
+
+
+def parse_time(value) -> datetime:
+    """
+    Parses the publication time of an article. Both the text shown on the page (e.g. "08.04.2020-16:00") and ISO 8601
+    timestamps are understood.
+
+    :param value: the time as found on the page
+    :type value: str
+    :return: the publication time or None if it cannot be parsed
+    :rtype: datetime
+    """
+    if not value or not isinstance(value, str):
+        return None
+    match = _faz_time.search(value)
+    if match:
+        day, month, year, hour, minute = map(int, match.groups())
+        return datetime(year, month, day, hour, minute)
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def parse_count(value) -> int:
+    """
+    Converts a counter such as the number of comments or recommendations to an integer.
+
+    :param value: the counter as found on the page
+    :return: the counter or None if it is not a single number
+    :rtype: int
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _normalise(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [_normalise(item) for item in value]
+    return value
+
+
+class Article:
+    """
+    A single parsed article. The fields are filled directly by the parsers in ``Webscraper``. Fields found by the
+    configured base parser which are not known to this class are kept in the ``extra`` dictionary.
+
+    Example:
+        1 article = Article(link="https://www.faz.net/...", section="politik", newspaper="faz")
+        2 article.headline = "..."
+        3 article.to_json()
+    """
+
+    __slots__ = (
+        "time",
+        "headline",
+        "headline_emphasis",
+        "author",
+        "comments",
+        "recommendation",
+        "paragraphs",
+        "pages",
+        "external_references",
+        "nr_external_references",
+        "text",
+        "section",
+        "link",
+        "newspaper",
+        "cluster_id",
+        "word_count",
+        "sentence_count",
+        "mean_sentence_length",
+        "max_sentence_length",
+        "readability",
+        "reference_density",
+        "content_hash",
+        "crawled",
+        "extra",
+    )
+    _interned = frozenset(("section", "newspaper", "author", "headline_emphasis"))
+    # the extracted fields the content hash is computed over. The engagement counters change after publication and
+    # are re-crawled separately, derived fields are recomputed from these
+    _hashed = (
+        "link",
+        "section",
+        "time",
+        "headline",
+        "headline_emphasis",
+        "author",
+        "paragraphs",
+        "pages",
+        "external_references",
+        "text",
+    )
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            object.__setattr__(self, field, None)
+        for field, value in fields.items():
+            self.set(field, value)
+
+    def __setattr__(self, field, value):
+        if field in self._interned and isinstance(value, str):
+            value = intern(value)
+        elif field == "external_references" and value:
+            value = [intern(ref) if isinstance(ref, str) else ref for ref in value]
+        object.__setattr__(self, field, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Article):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        # Equal articles have the same link. The link must not be changed while the article is in a set or dict
+        return hash(self.link)
+
+    def __repr__(self):
+        return f"Article(link={self.link!r}, section={self.section!r})"
+
+    def set(self, field: str, value) -> Article:
+        """
+        Sets a field of the article. Fields which are not part of the record are written into ``extra``.
+
+        :param field: the name of the field
+        :type field: str
+        :param value: the value of the field
+        :return: the article itself
+        :rtype: Article
+        """
+        if field in self.__slots__ and field != "extra":
+            setattr(self, field, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+        return self
+
+    @classmethod
+    def from_dict(cls, record: dict) -> Article:
+        """
+        Creates an article from a dictionary as returned by ``to_dict``.
+
+        :param record: the dictionary holding the article fields
+        :type record: dict
+        :return: the article
+        :rtype: Article
+        """
+        article = cls()
+        for field, value in record.items():
+            if field != "_id":
+                article.set(field, value)
+        return article
+
+    def to_dict(self) -> dict:
+        """
+        Converts the article to a dictionary. Fields which were not found on the page are left out, as before.
+
+        :return: the article as dictionary
+        :rtype: dict
+        """
+        record = {}
+        for field in self.__slots__[:-1]:
+            value = getattr(self, field)
+            if value is not None:
+                record[field] = value
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    def digest(self) -> str:
+        """
+        Computes a stable hash of the normalised extracted fields: whitespace is collapsed, and the engagement
+        counters as well as derived fields (statistics, clusters) are left out. Two crawls of an unchanged article
+        therefore yield the same hash.
+
+        :return: the hash as hexadecimal string
+        :rtype: str
+        """
+        values = [_normalise(getattr(self, field)) for field in self._hashed]
+        encoded = json.dumps(values, ensure_ascii=False, default=str).encode("utf-8")
+        return blake2b(encoded, digest_size=16).hexdigest()
+
+    def to_json(self) -> str:
+        """
+        Converts the article to a JSON string.
+
+        :return: the JSON representation of the article
+        :rtype: str
+        """
+        return json.dumps(self.to_dict())
+
+    def to_bson(self) -> bytes:
+        """
+        Converts the article to a BSON document which can be inserted into MongoDB without further conversion, e.g.
+        via ``bson.raw_bson.RawBSONDocument``. ``bson`` ships with pymongo and is imported on first use.
+
+        :return: the BSON encoded article
+        :rtype: bytes
+        """
+        import bson
+
+        return bson.encode(self.to_dict())
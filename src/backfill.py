@@ -0,0 +1,427 @@
+"""
+This module backfills the history of the newspaper by walking its date based archive pages.
+
+The requested date range is split into shards of ``shard_days`` consecutive days. Shards are assigned to processes or
+nodes statically: the process started with ``-shard i/n`` works on every n-th shard, starting at shard i, so n
+processes share a range without talking to each other. Each shard records its progress - the day and archive page
+written last, the days which failed and the article links whose download failed - in its own small JSON file in
+``progress_dir``. A shard which was interrupted continues after the last written archive page and retries its failed
+days and links (each link up to ``max_attempts`` times); finished shards are skipped.
+
+For each day, the archive page is built from the ``archive_page`` template and followed through its paginator; only
+paginator links to further pages of the same day are followed. The article links of every archive page are scraped,
+processed and written exactly as in a live crawl: by the scraper's ``download_all_articles_from_curr_topic``, the
+stages and the sinks. The topic of an article is taken from its link.
+As in a distributed crawl, all shards take their requests from one global rate limit (see ``coordination``). With a
+``SeenFilter`` (see ``seen_filter``), links which were written before, e.g. as they are listed on several days, are
+not scraped again.
+
+The ``archive_page`` template may use the placeholders ``{date}`` (a ``datetime.date``, e.g. ``{date:%Y-%m-%d}``),
+``{year}``, ``{month}``, ``{day}`` and ``{month_name}`` (the German name of the month in lowercase ASCII).
+
+Usage:
+    python src/app.py -backfill 2019-01-01:2019-12-31 -shard 0/4 -archive y
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from datetime import date, timedelta
+import json
+from os import makedirs, replace
+from os.path import exists, join
+import signal
+from threading import Event
+from urllib.parse import urljoin, urlsplit
+
+from sinks import write_batch
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+month_names = (
+    "januar",
+    "februar",
+    "maerz",
+    "april",
+    "mai",
+    "juni",
+    "juli",
+    "august",
+    "september",
+    "oktober",
+    "november",
+    "dezember",
+)
+
+
+class Shard:
+    """
+    A range of consecutive days of the archive.
+
+    :param first: the first day
+    :param last: the last day, inclusive
+    """
+
+    __slots__ = ("first", "last")
+
+    def __init__(self, first: date, last: date):
+        self.first = first
+        self.last = last
+
+    @property
+    def name(self) -> str:
+        return f"{self.first.isoformat()}_{self.last.isoformat()}"
+
+    def days(self):
+        day = self.first
+        while day <= self.last:
+            yield day
+            day += timedelta(days=1)
+
+
+def parse_date_range(value: str) -> tuple:
+    """
+    :param value: a date range as "YYYY-mm-dd:YYYY-mm-dd"
+    :type value: str
+    :return: the first and the last day
+    :rtype: tuple
+    """
+    first, _, last = value.partition(":")
+    first, last = date.fromisoformat(first), date.fromisoformat(last or first)
+    if last < first:
+        raise ValueError(f"The date range {value} ends before it starts")
+    return first, last
+
+
+def parse_shard(value: str) -> tuple:
+    """
+    :param value: the shard assignment of this process as "i/n"
+    :type value: str
+    :return: the index and the number of processes
+    :rtype: tuple
+    """
+    index, _, count = value.partition("/")
+    index, count = int(index), int(count or 1)
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard assignment {value}, expected i/n with 0 <= i < n")
+    return index, count
+
+
+def make_shards(first: date, last: date, shard_days=7, index=0, count=1) -> list:
+    """
+    Splits a date range into shards and returns the shards assigned to one of ``count`` processes.
+
+    :param first: the first day of the range
+    :type first: date
+    :param last: the last day of the range, inclusive
+    :type last: date
+    :param shard_days: the number of days per shard
+    :type shard_days: int
+    :param index: the index of the process
+    :type index: int
+    :param count: the number of processes sharing the range
+    :type count: int
+    :return: the shards of the process
+    :rtype: list
+    """
+    shards = []
+    start = first
+    while start <= last:
+        end = min(start + timedelta(days=shard_days - 1), last)
+        shards.append(Shard(start, end))
+        start = end + timedelta(days=1)
+    return shards[index::count]
+
+
+def topic_of_link(link: str, root_link: str) -> str:
+    """
+    Derives the topic of an article from its link, e.g. "politik" for "https://www.faz.net/aktuell/politik/inland/...".
+
+    :param link: the hyperlink of the article
+    :type link: str
+    :param root_link: the root link of the newspaper
+    :type root_link: str
+    :return: the topic
+    :rtype: str
+    """
+    parts = [part for part in link.replace(root_link, "", 1).split("/") if part]
+    if parts and parts[0] == "aktuell":
+        parts = parts[1:]
+    return parts[0] if len(parts) > 1 else "archive"
+
+
+class ShardProgress:
+    """
+    The progress of a shard, stored as JSON file.
+
+    :param path: the JSON file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.day = None
+        self.page = 0
+        self.articles = 0
+        self.failed = set()
+        self.failed_links = {}
+        self.done = False
+        if exists(path):
+            with open(path, "r") as fp:
+                state = json.load(fp)
+            self.day = state["day"] and date.fromisoformat(state["day"])
+            self.page = state["page"]
+            self.articles = state["articles"]
+            self.failed = {date.fromisoformat(day) for day in state["failed"]}
+            self.failed_links = state.get("failed_links", {})
+            self.done = state["done"]
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(
+                {
+                    "day": self.day and self.day.isoformat(),
+                    "page": self.page,
+                    "articles": self.articles,
+                    "failed": sorted(day.isoformat() for day in self.failed),
+                    "failed_links": self.failed_links,
+                    "done": self.done,
+                },
+                fp,
+            )
+        replace(tmp, self.path)
+
+    def written(self, day: date, page: int, articles: int, failed_links=()) -> None:
+        """
+        Records that an archive page of a day was written and the links of it which failed. Retrying a failed day
+        does not move the position back.
+        """
+        if self.day is None or (day, page) > (self.day, self.page):
+            self.day, self.page = day, page
+        self.articles += articles
+        for link in failed_links:
+            # a link listed on several pages counts as one attempt
+            self.failed_links.setdefault(link, 1)
+        self.save()
+
+
+class Backfill:
+    """
+    Scrapes the archive pages of the shards assigned to this process and writes their articles into the sinks.
+
+    :param scraper: the ``FAZ_Scraper`` to scrape with
+    :param sinks: the sinks the articles are written into
+    :param shards: the shards of this process, see ``make_shards``
+    :param archive_page: the template of the link of the archive page of a day
+    :param progress_dir: the directory holding the progress file of each shard
+    :param paginator_class: the class of the links to the further archive pages of a day. The scraper's
+        ``paginator_class`` if None
+    :param max_pages: the maximum number of archive pages read per day
+    :param stages: the stages applied to the articles of each archive page before the sinks
+    :param seen_filter: an optional ``SeenFilter`` of the links written before, which are skipped
+    :param max_attempts: the number of attempts after which a failed article link is given up
+    """
+
+    def __init__(
+        self,
+        scraper,
+        sinks,
+        shards,
+        archive_page,
+        progress_dir="backfill",
+        paginator_class=None,
+        max_pages=50,
+        stages=(),
+        seen_filter=None,
+        max_attempts=3,
+    ):
+        self.scraper = scraper
+        self.sinks = list(sinks)
+        self.stages = list(stages)
+        self.shards = list(shards)
+        self.archive_page = archive_page
+        self.progress_dir = progress_dir
+        self.paginator_class = paginator_class or getattr(
+            scraper, "paginator_class", None
+        )
+        self.max_pages = max_pages
+        self.seen_filter = seen_filter
+        self.max_attempts = max_attempts
+        self._stopped = Event()
+        makedirs(progress_dir, exist_ok=True)
+
+    def stop(self, *args) -> None:
+        """
+        Asks the backfill to stop after the current archive page. Used as signal handler.
+        """
+        log.info("Stopping the backfill")
+        self._stopped.set()
+
+    def archive_link(self, day: date) -> str:
+        return self.archive_page.format(
+            date=day,
+            year=day.year,
+            month=day.month,
+            day=day.day,
+            month_name=month_names[day.month - 1],
+        )
+
+    def _on_day(self, link: str, day_link: str) -> bool:
+        """
+        :return: whether a paginator link leads to a further archive page of the day of ``day_link``: it lies under the
+            root link and has the path of the day, or a path below it
+        :rtype: bool
+        """
+        if not link.startswith(self.scraper.root_link):
+            return False
+        path, day_path = urlsplit(link), urlsplit(day_link)
+        if path.netloc != day_path.netloc:
+            return False
+        return path.path == day_path.path or (
+            day_path.path.endswith("/") and path.path.startswith(day_path.path)
+        )
+
+    def _archive_pages(self, day: date):
+        """
+        Yields the page number, link and parsed document of every archive page of a day, following its paginator.
+        """
+        from Webscraper import make_soup
+
+        day_link = link = self.archive_link(day)
+        queue, seen = [link], {link}
+        page = 0
+        while queue and page < self.max_pages and not self._stopped.is_set():
+            link = queue.pop(0)
+            page += 1
+            soup = make_soup(self.scraper.fetch(link))
+            if self.paginator_class:
+                for anchor in soup.find_all("a", class_=self.paginator_class):
+                    href = anchor.attrs.get("href")
+                    if not href:
+                        continue
+                    href = urljoin(link, href)
+                    if href not in seen and self._on_day(href, day_link):
+                        seen.add(href)
+                        queue.append(href)
+            yield page, link, soup
+
+    def _write(self, links: list) -> tuple:
+        """
+        Scrapes and writes the articles of the links which were not written before.
+
+        :return: the number of written articles and the links which failed
+        :rtype: tuple
+        """
+        if self.seen_filter is not None:
+            links = self.seen_filter.filter_new(links)
+        by_topic = OrderedDict()
+        for link in links:
+            by_topic.setdefault(topic_of_link(link, self.scraper.root_link), []).append(link)
+        written, failed_links = 0, []
+        for topic, topic_links in by_topic.items():
+            self.scraper.curr_topic = topic
+            self.scraper.curr_article_all_links = topic_links
+            results = self.scraper.download_all_articles_from_curr_topic()
+            failed = set(self.scraper.curr_failed_links)
+            results = write_batch(results, topic, self.stages, self.sinks)
+            written += len(results)
+            failed_links += [link for link in topic_links if link in failed]
+            if self.seen_filter is not None:
+                self.seen_filter.add([link for link in topic_links if link not in failed])
+        return written, failed_links
+
+    def _retry_failed_links(self, progress: ShardProgress) -> None:
+        """
+        Scrapes the links of a shard which failed before again. Links which failed ``max_attempts`` times are given up.
+        """
+        exhausted = [link for link, attempts in progress.failed_links.items() if attempts >= self.max_attempts]
+        for link in exhausted:
+            log.warning(f'Giving up "{link}" after {self.max_attempts} attempts')
+            del progress.failed_links[link]
+        Metrics.increment("backfill.abandoned_links", len(exhausted))
+        links = list(progress.failed_links)
+        if not links:
+            progress.save()
+            return
+        log.info(f"Retrying {len(links)} failed links")
+        written, failed = self._write(links)
+        failed = set(failed)
+        for link in links:
+            if link in failed:
+                progress.failed_links[link] += 1
+            else:
+                del progress.failed_links[link]
+        progress.articles += written
+        progress.save()
+        Metrics.increment("backfill.articles", written)
+
+    def run_shard(self, shard: Shard) -> None:
+        """
+        Scrapes the archive pages of a shard, continuing after the last page recorded in its progress file.
+
+        :param shard: the shard
+        :type shard: Shard
+        """
+        progress = ShardProgress(join(self.progress_dir, f"{shard.name}.json"))
+        if progress.done:
+            log.info(f"Shard {shard.name} is already done")
+            return
+        log.info(f"Backfilling shard {shard.name}")
+        if progress.failed_links:
+            self._retry_failed_links(progress)
+        for day in shard.days():
+            if progress.day is not None and day < progress.day and day not in progress.failed:
+                continue
+            try:
+                for page, link, soup in self._archive_pages(day):
+                    if day == progress.day and page <= progress.page:
+                        continue
+                    written, failed_links = self._write(self.scraper.get_article_links(soup))
+                    progress.written(day, page, written, failed_links)
+                    Metrics.increment("backfill.pages")
+                    Metrics.increment("backfill.articles", written)
+                    log.info(f"Wrote {written} articles of archive page {link}")
+            except Exception as e:
+                log.error(f"Could not backfill {day.isoformat()}. Reason: {e}")
+                Metrics.increment("backfill.failed_days")
+                progress.failed.add(day)
+                progress.save()
+                continue
+            if self._stopped.is_set():
+                return
+            if day in progress.failed:
+                progress.failed.discard(day)
+                progress.save()
+        if progress.failed or progress.failed_links:
+            log.warning(
+                f"Shard {shard.name} has {len(progress.failed)} failed days and {len(progress.failed_links)} failed "
+                f"links, they are retried on the next run"
+            )
+            return
+        progress.done = True
+        progress.save()
+        log.info(f"Shard {shard.name} is done: {progress.articles} articles")
+
+    def run(self) -> None:
+        """
+        Runs all shards of this process until they are done or SIGTERM or SIGINT is received, then closes all stages,
+        sinks and the scraper.
+        """
+        handlers = {
+            sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            for shard in self.shards:
+                if self._stopped.is_set():
+                    break
+                self.run_shard(shard)
+        finally:
+            for stage in self.stages:
+                stage.close()
+            for sink in self.sinks:
+                sink.close()
+            if self.seen_filter is not None:
+                self.seen_filter.close()
+            self.scraper.close()
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+            Metrics.log_summary(log)
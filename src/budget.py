@@ -0,0 +1,160 @@
+"""
+This module caps the work of a run, such that a cron run stays inside its slot even if the newspaper suddenly lists
+many new articles.
+
+A ``CrawlBudget`` limits a run by
+ - the maximum number of requests (``max_requests``)
+ - the maximum number of downloaded bytes (``max_bytes``)
+ - the wall-clock time (``max_seconds``)
+ - the number of articles per topic (``topic_quotas``, ``default_quota``)
+
+The scraper records every request and its size in the budget (see ``WebScraper.fetch``). Before a topic is scraped,
+``allocate`` splits what is left of the budget across the topics still to come: the remaining requests, bytes and
+seconds are converted into a number of articles with the averages measured so far - e.g. the requests per article,
+which include the further pages of an article - and shared equally by the remaining topics. A topic which needs less
+than its share leaves the rest to the following topics. Once the budget is exhausted, no further topic or batch is
+scheduled; the articles already downloaded are written as usual.
+
+Example:
+    1 budget = CrawlBudget(max_requests=2000, max_seconds=900, default_quota=50)
+    2 limit = budget.allocate("politik", len(links), remaining_topics=5)
+"""
+from __future__ import annotations
+import math
+from threading import Lock
+import time
+
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+
+class CrawlBudget:
+    """
+    The budget of a single run. It can be used from several threads.
+
+    :param max_requests: the maximum number of requests of the run, unlimited if None
+    :param max_bytes: the maximum number of downloaded bytes of the run, unlimited if None
+    :param max_seconds: the maximum run time in seconds, unlimited if None
+    :param topic_quotas: the maximum number of articles per topic
+    :param default_quota: the maximum number of articles of the topics missing in ``topic_quotas``, unlimited if None
+    :param requests_per_article: the number of requests per article assumed until it has been measured
+    :param bytes_per_article: the number of bytes per article assumed until it has been measured
+    :param seconds_per_article: the number of seconds per article assumed until it has been measured
+    """
+
+    def __init__(
+        self,
+        max_requests=None,
+        max_bytes=None,
+        max_seconds=None,
+        topic_quotas=None,
+        default_quota=None,
+        requests_per_article=1.5,
+        bytes_per_article=200000,
+        seconds_per_article=0.5,
+    ):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.topic_quotas = dict(topic_quotas or {})
+        self.default_quota = default_quota
+        self._assumed = {
+            "requests": requests_per_article,
+            "bytes": bytes_per_article,
+            "seconds": seconds_per_article,
+        }
+        self.requests = 0
+        self.bytes = 0
+        self.articles = 0
+        self.started = time.monotonic()
+        self._lock = Lock()
+        self._logged = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def record(self, size: int) -> None:
+        """
+        Records a request.
+
+        :param size: the size of the response in bytes
+        :type size: int
+        """
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+
+    def record_articles(self, count: int) -> None:
+        """
+        Records downloaded articles, which refines the averages per article.
+        """
+        with self._lock:
+            self.articles += count
+
+    def _per_article(self, name: str, used: float) -> float:
+        if self.articles:
+            return max(used / self.articles, 1e-9)
+        return self._assumed[name]
+
+    def remaining_articles(self) -> float:
+        """
+        :return: the number of articles the rest of the budget is estimated to suffice for
+        :rtype: float
+        """
+        limits = [float("inf")]
+        for name, maximum, used in (
+            ("requests", self.max_requests, self.requests),
+            ("bytes", self.max_bytes, self.bytes),
+            ("seconds", self.max_seconds, self.elapsed),
+        ):
+            if maximum is not None:
+                limits.append(max(maximum - used, 0) / self._per_article(name, used))
+        return min(limits)
+
+    def exhausted(self) -> bool:
+        """
+        :return: whether the budget is used up and no further work shall be scheduled
+        :rtype: bool
+        """
+        exhausted = self.remaining_articles() < 1
+        if exhausted and not self._logged:
+            self._logged = True
+            Metrics.increment("budget.exhausted")
+            log.warning(
+                f"The crawl budget is exhausted after {self.requests} requests, {self.bytes / 1e6:.1f} MB and "
+                f"{self.elapsed:.0f}s, no further articles are scheduled"
+            )
+        return exhausted
+
+    def quota(self, topic: str) -> float:
+        """
+        :return: the maximum number of articles of a topic
+        :rtype: float
+        """
+        quota = self.topic_quotas.get(topic, self.default_quota)
+        return float("inf") if quota is None else quota
+
+    def allocate(self, topic: str, pending: int, remaining_topics=1) -> int:
+        """
+        Returns the number of articles a topic may scrape: at most its quota and an equal share of the rest of the
+        budget among the topics still to come.
+
+        :param topic: the topic
+        :type topic: str
+        :param pending: the number of articles listed for the topic
+        :type pending: int
+        :param remaining_topics: the number of topics still to come, including this one
+        :type remaining_topics: int
+        :return: the number of articles to scrape
+        :rtype: int
+        """
+        share = self.remaining_articles() / max(remaining_topics, 1)
+        if share != float("inf"):
+            share = math.ceil(share)
+        limit = int(min(pending, self.quota(topic), share))
+        if limit < pending:
+            Metrics.increment("budget.skipped_articles", pending - limit)
+            log.info(f"Budget: scraping {limit} of {pending} articles of topic {topic}")
+        return limit
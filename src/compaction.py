@@ -0,0 +1,358 @@
+"""
+This module merges the many small output files written by the scraper into one compressed file per publication day and
+enforces a retention window on the merged files.
+
+The following files are compacted:
+ - ``{topic}_{YYYYmmddHHMMSS}_{pid}_{n}.json`` files written by ``JsonSink``, and ``{topic}_{YYYYmmddHHMMSS}.json``
+   files of older versions
+ - closed ``{prefix}_{YYYYmmddHHMMSS}_{pid}_{n}.jsonl[.gz|.zst]`` files written by ``RotatingFileSink``
+
+The merged partitions are named ``{YYYY-MM-DD}.jsonl.gz`` and are deduplicated by ``link``: of several records of a
+link, the one with the newest ``crawled`` time is kept, and among records without one the one read last, i.e. from the
+newest source. Sources are read in the order of the timestamp in their name, then of their modification time. Records
+without a publication date are put into the day their source was created. The days are merged one after the other. A first pass over the sources finds the days each source holds;
+every day is then merged from the existing partition and the sources holding it in two streamed passes, the first
+choosing the record to keep per link and the second writing them. Only one partition file is open at a time and only
+the link hashes of the day being merged are kept in memory.
+
+Compaction can run while a crawl is active: files which are still being written (``.open`` files and files modified
+within the last ``min_age`` seconds) are skipped, merged partitions are written to a temporary file and swapped in
+atomically, and source files are only deleted after the partitions they were merged into have been replaced. If the job
+dies in between, the next run merges the remaining sources again and the duplicates are dropped. A lock file makes sure
+that only one compaction runs at a time.
+
+Usage:
+    python src/compaction.py --source . --source archive --target daily --retention 365
+"""
+from __future__ import annotations
+import argparse
+from datetime import datetime
+import json
+from os import getpid, listdir, makedirs, remove, replace
+from os.path import basename, dirname, exists, getmtime, getsize, isdir, join
+import re
+import time
+
+from archive_index import OffsetIndexWriter, link_hash
+from sinks import Manifest, compress_block, iter_records, record_date
+from utilities import Date_Filterer, Decorators, FileLock, Logger
+
+log = Logger.get_logger(__name__)
+
+_source_name = re.compile(
+    r"^.+_\d{14}(_\d+_\d+)?\.json$|^.+_\d{14}_\d+_\d+\.jsonl(\.gz|\.zst)?$"
+)
+_partition_name = re.compile(r"^\d{4}-\d{2}-\d{2}\.jsonl(\.gz|\.zst)?$")
+_timestamp = re.compile(r"_(\d{14})(?!\d)")
+
+
+def _source_order(path: str) -> tuple:
+    """
+    :return: the sort key of a source file: the time of its creation as found in its name, then its modification time
+    :rtype: tuple
+    """
+    timestamp = _timestamp.search(basename(path))
+    return timestamp.group(1) if timestamp else "", getmtime(path), path
+
+
+def _source_date(path: str) -> str:
+    """
+    :return: the date assigned to the records of a source file without a publication date: the day the file was
+        created, as found in its name, or else the day it was last modified
+    :rtype: str
+    """
+    return Date_Filterer.extract_date_from_name(path) or datetime.utcfromtimestamp(getmtime(path)).date().isoformat()
+
+
+def is_article_file(name: str) -> bool:
+    """
+    :param name: the name of a file
+    :type name: str
+    :return: whether the file holds articles: a closed output file of ``JsonSink`` or ``RotatingFileSink``, or a daily
+        partition. The manifest, index and lock files are not
+    :rtype: bool
+    """
+    if name == Manifest.file_name:
+        return False
+    return bool(_source_name.match(name) or _partition_name.match(name))
+
+
+class _PartitionWriter:
+    """
+    Streams the records of one day into a temporary file. The records are compressed in blocks of ``block_size``
+    bytes, such that memory usage does not depend on the size of the day. The offset index of the partition is
+    written alongside.
+    """
+
+    def __init__(self, path, date, compression, level, block_size):
+        self.path = path
+        self.date = date
+        self.tmp = f"{path}.{getpid()}.tmp"
+        self.compression = compression
+        self.level = level
+        self.block_size = block_size
+        self.records = 0
+        self.size = 0
+        self.keys = None
+        self.topics = set()
+        self._buffer = []
+        self._records = []
+        self._buffered = 0
+        self.index = OffsetIndexWriter()
+        self._file = open(self.tmp, "wb")
+
+    def add(self, record: dict) -> None:
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        self._buffer.append(line)
+        self._records.append(
+            {
+                "link": record.get("link"),
+                "section": record.get("section"),
+                "time": record_date(record, self.date),
+            }
+        )
+        self._buffered += len(line)
+        self.records += 1
+        self.topics.add(record.get("section") or "unknown")
+        if self._buffered >= self.block_size:
+            self._write_block()
+
+    def _write_block(self) -> None:
+        if self._buffer:
+            block = compress_block(b"".join(self._buffer), self.compression, self.level)
+            offset = self._file.tell()
+            self._file.write(block)
+            self.index.add_block(offset, len(block), self._records, self._buffer)
+            self._buffer, self._records, self._buffered = [], [], 0
+
+    def commit(self) -> int:
+        self._write_block()
+        self._file.close()
+        replace(self.tmp, self.path)
+        self.keys = self.index.write(self.path)
+        self.size = getsize(self.path)
+        return self.size
+
+    def abort(self) -> None:
+        self._file.close()
+        if exists(self.tmp):
+            remove(self.tmp)
+
+
+class Compactor:
+    """
+    Merges the output files found in ``sources`` into daily partitions in ``target`` and deletes partitions which are
+    older than ``retention_days``.
+
+    :param sources: the directories holding the files written by the scraper
+    :param target: the directory the daily partitions are written into
+    :param compression: the compression of the partitions, "gzip" or "zstd"
+    :param level: the compression level
+    :param retention_days: partitions published more than this number of days ago are deleted. None keeps everything
+    :param min_age: files modified within the last ``min_age`` seconds are not compacted yet
+    :param block_size: the number of uncompressed bytes compressed at once
+    """
+
+    _suffixes = {"gzip": ".gz", "zstd": ".zst"}
+
+    def __init__(
+        self,
+        sources=(".",),
+        target="daily",
+        compression="gzip",
+        level=9,
+        retention_days=None,
+        min_age=3600,
+        block_size=1024 ** 2,
+    ):
+        assert compression in self._suffixes
+        self.sources = list(sources)
+        self.target = target
+        self.compression = compression
+        self.level = level
+        self.retention_days = retention_days
+        self.min_age = min_age
+        self.block_size = block_size
+        self.manifest = Manifest(target)
+        if not isdir(target):
+            makedirs(target)
+
+    def partition_path(self, date: str) -> str:
+        return join(self.target, f"{date}.jsonl{self._suffixes[self.compression]}")
+
+    def find_sources(self) -> list:
+        """
+        :return: the files which are ready to be compacted, oldest first
+        :rtype: list
+        """
+        now = time.time()
+        files = []
+        for directory in self.sources:
+            if not isdir(directory):
+                continue
+            for name in listdir(directory):
+                path = join(directory, name)
+                if _source_name.match(name) and now - getmtime(path) >= self.min_age:
+                    files.append(path)
+        return sorted(files, key=_source_order)
+
+    @Decorators.run_time
+    def run(self) -> None:
+        """
+        Runs the compaction and afterwards enforces the retention window. Returns immediately if another compaction
+        holds the lock.
+        """
+        lock = FileLock(join(self.target, "compaction.lock"), blocking=False)
+        if not lock.acquire():
+            log.warning("Another compaction is running, skipping this one")
+            return
+        try:
+            self.compact()
+            if self.retention_days is not None:
+                self.enforce_retention()
+        finally:
+            lock.release()
+
+    def compact(self) -> None:
+        sources = self.find_sources()
+        if not sources:
+            log.info("No files to compact")
+            return
+        log.info(f"Compacting {len(sources)} files into {self.target}")
+        # Records without a publication date are put into the day of their source, which must not change between passes
+        fallbacks = {source: _source_date(source) for source in sources}
+        sources_of = {}
+        for source in sources:
+            for record in iter_records(source):
+                sources_of.setdefault(record_date(record, fallbacks[source]), {})[source] = None
+        entries = {}
+        records = duplicates = 0
+        for date in sorted(sources_of):
+            writer, read = self._compact_day(date, list(sources_of[date]), fallbacks)
+            entry = Manifest.entry(writer.records, writer.size, date, date, writer.topics, self.compression)
+            entry["keys"] = writer.keys
+            entries[basename(writer.path)] = entry
+            records += writer.records
+            duplicates += read - writer.records
+        self.manifest.update(entries)
+        self._remove_sources(sources)
+        log.info(
+            f"Merged {len(sources)} files into {len(entries)} daily partitions holding {records} records, dropped "
+            f"{duplicates} duplicates"
+        )
+
+    def _compact_day(self, date: str, sources: list, fallbacks: dict) -> tuple:
+        """
+        Merges the records of one day from its existing partition and the given sources into a new partition, keeping
+        the newest record of each link. ``fallbacks`` holds the date of the undated records of each source.
+
+        :return: the committed ``_PartitionWriter`` and the number of records read
+        :rtype: tuple
+        """
+        path = self.partition_path(date)
+        inputs = ([path] if exists(path) else []) + sources
+
+        def records():
+            sequence = 0
+            for source in inputs:
+                for record in iter_records(source):
+                    if source == path or record_date(record, fallbacks[source]) == date:
+                        yield sequence, record
+                        sequence += 1
+
+        newest = {}
+        read = 0
+        for sequence, record in records():
+            key = link_hash(record.get("link"))
+            version = (record.get("crawled") or "", sequence)
+            if key not in newest or version > newest[key]:
+                newest[key] = version
+            read += 1
+        writer = _PartitionWriter(path, date, self.compression, self.level, self.block_size)
+        try:
+            for sequence, record in records():
+                if newest[link_hash(record.get("link"))][1] == sequence:
+                    writer.add(record)
+        except Exception:
+            writer.abort()
+            raise
+        writer.commit()
+        return writer, read
+
+    def _remove_sources(self, sources: list) -> None:
+        removed = {}
+        for source in sources:
+            remove(source)
+            if exists(f"{source}.idx"):
+                remove(f"{source}.idx")
+            removed.setdefault(dirname(source) or ".", []).append(basename(source))
+        for directory, names in removed.items():
+            if exists(join(directory, Manifest.file_name)):
+                Manifest(directory).update(removed=names)
+
+    def enforce_retention(self) -> None:
+        """
+        Deletes the daily partitions which are at least ``retention_days`` older than today.
+        """
+        today = datetime.utcnow().date().isoformat()
+        partitions = [
+            name
+            for name in listdir(self.target)
+            if name.endswith((".jsonl.gz", ".jsonl.zst"))
+        ]
+        expired = Date_Filterer(
+            partitions, self.retention_days, reference_date=today
+        ).get_final_files()
+        for name in expired:
+            remove(join(self.target, name))
+            if exists(join(self.target, f"{name}.idx")):
+                remove(join(self.target, f"{name}.idx"))
+        if expired:
+            self.manifest.update(removed=expired)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge the scraper output into daily, deduplicated and compressed partitions."
+    )
+    parser.add_argument(
+        "--source",
+        "-s",
+        action="append",
+        help="A directory holding output files of the scraper. Can be given several times",
+    )
+    parser.add_argument(
+        "--target", "-t", default="daily", help="The directory of the daily partitions"
+    )
+    parser.add_argument(
+        "--compression",
+        default="gzip",
+        choices=["gzip", "zstd"],
+        help="The compression of the daily partitions",
+    )
+    parser.add_argument(
+        "--level", default=9, type=int, help="The compression level"
+    )
+    parser.add_argument(
+        "--retention",
+        "-r",
+        default=None,
+        type=int,
+        help="Delete partitions published more than this number of days ago",
+    )
+    parser.add_argument(
+        "--min_age",
+        default=3600,
+        type=int,
+        help="Skip files modified within this number of seconds, as they may still be written",
+    )
+    args = parser.parse_args()
+    Logger.configure()
+    Compactor(
+        sources=args.source or ["."],
+        target=args.target,
+        compression=args.compression,
+        level=args.level,
+        retention_days=args.retention,
+        min_age=args.min_age,
+    ).run()
@@ -0,0 +1,622 @@
+"""
+This module shares a crawl between several nodes.
+
+One node runs the ``Coordinator``: it retrieves the topics and the article links of every topic and pushes them into a
+shared work queue. Any number of nodes run a ``Worker``: each leases a batch of links, scrapes them, writes the articles
+into its own sinks and acknowledges the links. A lease expires after ``lease_seconds``; links of a worker which died
+are then leased by another one. Links which failed ``max_attempts`` times are marked as failed. Links are only queued
+once, so a link scraped by any node is never scraped again.
+
+The work queue is pluggable. Two backends are provided:
+ - ``SqliteWorkQueue``: an embedded SQLite database for several processes on one machine, e.g. for testing
+ - ``MongoWorkQueue``: a MongoDB collection shared by several machines. pymongo is imported when it is created. The
+   token bucket is updated with an aggregation pipeline, which requires MongoDB 4.2 or later
+
+Both backends also hold the state of a global token bucket: every download of every node first takes a token (see
+``RateLimiter``), such that the crawl as a whole never exceeds ``rate`` requests per second. The tokens are taken from
+the shared bucket in blocks of up to ``block`` tokens and spent locally, so a node talks to the queue once per block
+of requests rather than once per request. Adding a node therefore adds its throughput until the global rate limit is
+reached.
+
+Usage:
+    python src/app.py -role coordinator
+    python src/app.py -role worker -archive y
+    python src/coordination.py status
+"""
+from __future__ import annotations
+import argparse
+from collections import OrderedDict
+from os import getpid
+from pathlib import Path
+import signal
+from socket import gethostname
+import sqlite3
+from threading import Event, Lock
+import time
+from uuid import uuid4
+
+from sinks import write_batch
+from utilities import Logger, Metrics, read_config
+
+log = Logger.get_logger(__name__)
+
+
+class WorkQueue:
+    """
+    The interface of a work queue backend. Items are pairs of article link and topic.
+    """
+
+    def push(self, items: list) -> int:
+        """
+        Queues the links which have never been queued before.
+
+        :param items: the (link, topic) pairs
+        :type items: list
+        :return: the number of newly queued links
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def lease(self, worker: str, size: int, lease_seconds: float) -> list:
+        """
+        Leases up to ``size`` queued links, or links whose lease has expired, to a worker. Links which were already
+        leased ``max_attempts`` times are left to be marked as failed by ``requeue_expired``.
+
+        :param worker: the name of the worker
+        :type worker: str
+        :param size: the maximum number of links
+        :type size: int
+        :param lease_seconds: the number of seconds after which the lease expires
+        :type lease_seconds: float
+        :return: the leased (link, topic) pairs
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def ack(self, worker: str, done: list, failed: list = ()) -> None:
+        """
+        Acknowledges leased links. Failed links are queued again until they failed ``max_attempts`` times.
+
+        :param worker: the name of the worker
+        :type worker: str
+        :param done: the links which were scraped
+        :type done: list
+        :param failed: the links which could not be scraped
+        :type failed: list
+        """
+        raise NotImplementedError
+
+    def requeue_expired(self) -> int:
+        """
+        Queues the links whose lease has expired again.
+
+        :return: the number of links queued again
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """
+        :return: the number of links per state
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def take_tokens(self, rate: float, burst: float, count: int) -> tuple:
+        """
+        Takes up to ``count`` whole tokens from the global token bucket.
+
+        :param rate: the number of tokens added per second
+        :type rate: float
+        :param burst: the maximum number of tokens in the bucket
+        :type burst: float
+        :param count: the maximum number of tokens to take
+        :type count: int
+        :return: the number of tokens taken and, if none was taken, the number of seconds until ``count`` tokens are
+            available
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    A work queue in a SQLite database, which can be shared by several processes on one machine.
+
+    :param path: the SQLite database
+    :param max_attempts: the number of attempts after which a link is marked as failed
+    """
+
+    def __init__(self, path="crawl_queue.db", max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = Lock()
+        self.db = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS work (link TEXT PRIMARY KEY, topic TEXT, state TEXT, worker TEXT, "
+            "lease_until REAL, attempts INTEGER, added REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS work_state ON work (state, added)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+
+    def _transaction(self, statements):
+        """
+        Runs a function on the connection in an immediate (write locked) transaction.
+        """
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.db)
+                self.db.execute("COMMIT")
+                return result
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def push(self, items: list) -> int:
+        now = time.time()
+
+        def statements(db):
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO work VALUES (?, ?, 'queued', NULL, NULL, 0, ?)",
+                [(link, topic, now) for link, topic in items],
+            )
+            return db.total_changes - before
+
+        return self._transaction(statements)
+
+    def lease(self, worker: str, size: int, lease_seconds: float) -> list:
+        now = time.time()
+
+        def statements(db):
+            rows = db.execute(
+                "SELECT link, topic FROM work WHERE (state = 'queued' OR (state = 'leased' AND lease_until < ?)) "
+                "AND attempts < ? ORDER BY added LIMIT ?",
+                (now, self.max_attempts, size),
+            ).fetchall()
+            db.executemany(
+                "UPDATE work SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE link = ?",
+                [(worker, now + lease_seconds, link) for link, _ in rows],
+            )
+            return rows
+
+        return self._transaction(statements)
+
+    def ack(self, worker: str, done: list, failed: list = ()) -> None:
+        def statements(db):
+            db.executemany(
+                "UPDATE work SET state = 'done', lease_until = NULL WHERE link = ? AND worker = ?",
+                [(link, worker) for link in done],
+            )
+            db.executemany(
+                "UPDATE work SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "lease_until = NULL WHERE link = ? AND worker = ?",
+                [(self.max_attempts, link, worker) for link in failed],
+            )
+
+        self._transaction(statements)
+
+    def requeue_expired(self) -> int:
+        def statements(db):
+            before = db.total_changes
+            db.execute(
+                "UPDATE work SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "lease_until = NULL WHERE state = 'leased' AND lease_until < ?",
+                (self.max_attempts, time.time()),
+            )
+            return db.total_changes - before
+
+        return self._transaction(statements)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.db.execute("SELECT state, COUNT(*) FROM work GROUP BY state").fetchall()
+            )
+
+    def take_tokens(self, rate: float, burst: float, count: int) -> tuple:
+        now = time.time()
+
+        def statements(db):
+            row = db.execute("SELECT tokens, updated FROM bucket WHERE id = 0").fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            taken = min(count, int(tokens))
+            tokens -= taken
+            db.execute(
+                "INSERT OR REPLACE INTO bucket VALUES (0, ?, ?)", (tokens, max(now, updated))
+            )
+            return taken, 0.0 if taken else (count - tokens) / rate
+
+        return self._transaction(statements)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class MongoWorkQueue(WorkQueue):
+    """
+    A work queue in a MongoDB collection, which can be shared by several machines. The token bucket is held in a
+    document of a second collection ``{collection}_bucket``.
+
+    :param host: the host of the MongoDB
+    :param port: the port of the MongoDB
+    :param database: the database
+    :param collection: the collection holding the links
+    :param max_attempts: the number of attempts after which a link is marked as failed
+    """
+
+    def __init__(
+        self, host="localhost", port=27017, database="db", collection="crawl_queue", max_attempts=3
+    ):
+        from pymongo import ASCENDING, MongoClient
+
+        self.client = MongoClient(host, port)
+        self.work = self.client[database][collection]
+        self.bucket = self.client[database][f"{collection}_bucket"]
+        self.work.create_index([("state", ASCENDING), ("added", ASCENDING)])
+        self.max_attempts = max_attempts
+
+    def push(self, items: list) -> int:
+        from pymongo.errors import BulkWriteError
+
+        if not items:
+            return 0
+        now = time.time()
+        documents = [
+            {
+                "_id": link,
+                "topic": topic,
+                "state": "queued",
+                "worker": None,
+                "lease_until": None,
+                "attempts": 0,
+                "added": now,
+            }
+            for link, topic in items
+        ]
+        try:
+            return len(self.work.insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            return e.details["nInserted"]
+
+    def _leasable(self, now):
+        return {
+            "$or": [
+                {"state": "queued"},
+                {"state": "leased", "lease_until": {"$lt": now}},
+            ],
+            "attempts": {"$lt": self.max_attempts},
+        }
+
+    def lease(self, worker: str, size: int, lease_seconds: float) -> list:
+        now = time.time()
+        candidates = [
+            document["_id"]
+            for document in self.work.find(self._leasable(now), {"_id": 1})
+            .sort("added", 1)
+            .limit(size)
+        ]
+        if not candidates:
+            return []
+        token = uuid4().hex
+        self.work.update_many(
+            {"_id": {"$in": candidates}, **self._leasable(now)},
+            {
+                "$set": {
+                    "state": "leased",
+                    "worker": worker,
+                    "token": token,
+                    "lease_until": now + lease_seconds,
+                },
+                "$inc": {"attempts": 1},
+            },
+        )
+        return [
+            (document["_id"], document["topic"])
+            for document in self.work.find({"token": token}, {"topic": 1})
+        ]
+
+    def ack(self, worker: str, done: list, failed: list = ()) -> None:
+        if done:
+            self.work.update_many(
+                {"_id": {"$in": list(done)}, "worker": worker},
+                {"$set": {"state": "done", "lease_until": None}},
+            )
+        if failed:
+            failed = {"_id": {"$in": list(failed)}, "worker": worker}
+            self.work.update_many(
+                {**failed, "attempts": {"$gte": self.max_attempts}},
+                {"$set": {"state": "failed", "lease_until": None}},
+            )
+            self.work.update_many(
+                {**failed, "state": "leased"},
+                {"$set": {"state": "queued", "lease_until": None}},
+            )
+
+    def requeue_expired(self) -> int:
+        expired = {"state": "leased", "lease_until": {"$lt": time.time()}}
+        failed = self.work.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"state": "failed", "lease_until": None}},
+        )
+        queued = self.work.update_many(
+            expired, {"$set": {"state": "queued", "lease_until": None}}
+        )
+        return failed.modified_count + queued.modified_count
+
+    def stats(self) -> dict:
+        return {
+            group["_id"]: group["count"]
+            for group in self.work.aggregate(
+                [{"$group": {"_id": "$state", "count": {"$sum": 1}}}]
+            )
+        }
+
+    def take_tokens(self, rate: float, burst: float, count: int) -> tuple:
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = time.time()
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated", now]}]}]}
+        # The bucket is refilled and the tokens are taken in one atomic update on the server
+        update = [
+            {
+                "$set": {
+                    "tokens": {
+                        "$min": [
+                            burst,
+                            {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]},
+                        ]
+                    },
+                    "updated": {"$max": [{"$ifNull": ["$updated", now]}, now]},
+                }
+            },
+            {"$set": {"taken": {"$min": [count, {"$floor": "$tokens"}]}}},
+            {"$set": {"tokens": {"$subtract": ["$tokens", "$taken"]}}},
+        ]
+        while True:
+            try:
+                bucket = self.bucket.find_one_and_update(
+                    {"_id": 0}, update, upsert=True, return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                # another node created the bucket at the same time, the update now finds it
+                continue
+        taken = int(bucket["taken"])
+        return taken, 0.0 if taken else (count - bucket["tokens"]) / rate
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class RateLimiter:
+    """
+    Limits the requests of all nodes sharing a work queue to ``rate`` requests per second, with bursts of up to
+    ``burst`` requests. It can be set as ``rate_limiter`` of a scraper. Tokens are taken from the shared bucket in
+    blocks of up to ``block`` tokens; the tokens of a block which are not spent within ``block / rate`` seconds are
+    dropped, such that an idle node cannot hoard them.
+
+    :param queue: the work queue holding the token bucket
+    :param rate: the number of requests per second
+    :param burst: the number of requests which may be sent at once
+    :param block: the maximum number of tokens taken from the queue at once
+    """
+
+    def __init__(self, queue: WorkQueue, rate=5.0, burst=10.0, block=20):
+        self.queue = queue
+        self.rate = rate
+        self.burst = burst
+        self.block = max(1, min(block, int(burst)))
+        self._tokens = 0
+        self._expires = 0.0
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request may be sent.
+        """
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                if self._tokens and now < self._expires:
+                    self._tokens -= 1
+                    return
+                taken, wait = self.queue.take_tokens(self.rate, self.burst, self.block)
+                if taken:
+                    Metrics.increment("rate_limiter.blocks")
+                    self._tokens, self._expires = taken - 1, now + self.block / self.rate
+                    return
+                Metrics.increment("rate_limiter.waits")
+                time.sleep(wait)
+
+
+def build_work_queue(backend="sqlite", **kwargs) -> WorkQueue:
+    """
+    :param backend: "sqlite" or "mongo"
+    :type backend: str
+    :param kwargs: the arguments of the backend
+    :return: the work queue
+    :rtype: WorkQueue
+    """
+    backends = {"sqlite": SqliteWorkQueue, "mongo": MongoWorkQueue}
+    if backend not in backends:
+        raise ValueError(f"Unknown work queue backend {backend}, choose one of {list(backends)}")
+    return backends[backend](**kwargs)
+
+
+class _Stoppable:
+    def __init__(self):
+        self._stopped = Event()
+
+    def stop(self, *args) -> None:
+        log.info(f"Stopping the {type(self).__name__.lower()}")
+        self._stopped.set()
+
+    def _run_with_signals(self, loop) -> None:
+        handlers = {
+            sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            loop()
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+
+
+class Coordinator(_Stoppable):
+    """
+    Builds the work list: retrieves the topics and their article links and pushes them into the work queue.
+
+    :param scraper: the ``FAZ_Scraper`` retrieving the topics and links
+    :param queue: the work queue
+    :param interval: the number of seconds between two passes over all topics. A single pass is made if None
+    """
+
+    def __init__(self, scraper, queue: WorkQueue, interval=None):
+        super().__init__()
+        self.scraper = scraper
+        self.queue = queue
+        self.interval = interval
+
+    def run_once(self) -> int:
+        """
+        Pushes the links of all topics into the queue.
+
+        :return: the number of newly queued links
+        :rtype: int
+        """
+        self.scraper.get_topics()
+        queued = 0
+        for topic in self.scraper.topics:
+            try:
+                links = self.scraper.set_topic(topic).get_articles_of_topic().curr_article_all_links
+            except Exception as e:
+                log.error(f"Could not retrieve the articles of topic {topic}. Reason: {e}")
+                continue
+            queued += self.queue.push([(link, topic) for link in links])
+        requeued = self.queue.requeue_expired()
+        log.info(
+            f"Queued {queued} new links, {requeued} expired leases were queued again. Queue: {self.queue.stats()}"
+        )
+        return queued
+
+    def run(self) -> None:
+        def loop():
+            while not self._stopped.is_set():
+                self.run_once()
+                if self.interval is None:
+                    break
+                self._stopped.wait(self.interval)
+
+        try:
+            self._run_with_signals(loop)
+        finally:
+            self.scraper.close()
+            self.queue.close()
+
+
+class Worker(_Stoppable):
+    """
+    Leases batches of links from the work queue, scrapes them, passes the articles through the stages into the sinks
+    and acknowledges the links.
+
+    :param scraper: the ``FAZ_Scraper`` scraping the articles
+    :param queue: the work queue
+    :param sinks: the sinks the articles are written into
+    :param stages: the stages applied to each batch of articles before the sinks
+    :param batch_size: the number of links leased at once
+    :param lease_seconds: the number of seconds after which a lease expires
+    :param idle_wait: the number of seconds to wait when the queue is empty
+    :param exit_when_empty: stop as soon as the queue is empty instead of waiting for new links
+    """
+
+    def __init__(
+        self,
+        scraper,
+        queue: WorkQueue,
+        sinks,
+        stages=(),
+        batch_size=20,
+        lease_seconds=300,
+        idle_wait=10,
+        exit_when_empty=False,
+    ):
+        super().__init__()
+        self.scraper = scraper
+        self.queue = queue
+        self.sinks = list(sinks)
+        self.stages = list(stages)
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.idle_wait = idle_wait
+        self.exit_when_empty = exit_when_empty
+        self.name = f"{gethostname()}-{getpid()}"
+
+    def run_batch(self) -> int:
+        """
+        Leases, scrapes, writes and acknowledges one batch of links.
+
+        :return: the number of leased links
+        :rtype: int
+        """
+        items = self.queue.lease(self.name, self.batch_size, self.lease_seconds)
+        by_topic = OrderedDict()
+        for link, topic in items:
+            by_topic.setdefault(topic, []).append(link)
+        for topic, links in by_topic.items():
+            self.scraper.curr_topic = topic
+            self.scraper.curr_article_all_links = links
+            results = self.scraper.download_all_articles_from_curr_topic()
+            failed = self.scraper.curr_failed_links
+            write_batch(results, topic, self.stages, self.sinks)
+            self.queue.ack(
+                self.name, [link for link in links if link not in failed], failed
+            )
+            Metrics.increment("worker.articles", len(links) - len(failed))
+        return len(items)
+
+    def run(self) -> None:
+        def loop():
+            while not self._stopped.is_set():
+                if not self.run_batch():
+                    if self.exit_when_empty:
+                        break
+                    self._stopped.wait(self.idle_wait)
+
+        try:
+            self._run_with_signals(loop)
+        finally:
+            for stage in self.stages:
+                stage.close()
+            for sink in self.sinks:
+                sink.close()
+            self.scraper.close()
+            self.queue.close()
+            Metrics.log_summary(log)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the shared work queue of a distributed crawl.")
+    parser.add_argument("command", choices=["status", "requeue"])
+    args = parser.parse_args()
+    conf_path = Path("config.yaml")
+    if not conf_path.exists():
+        conf_path = Path(__file__).resolve().parent.parent.joinpath("config.yaml")
+    conf = dict(read_config(conf_path).get("coordination", {}))
+    queue = build_work_queue(**conf.get("queue", {}))
+    if args.command == "requeue":
+        print(f"Queued {queue.requeue_expired()} expired leases again")
+    print(queue.stats())
+    queue.close()
@@ -0,0 +1,320 @@
+"""
+This module runs the scraper as a long-running daemon instead of one full run per cron invocation.
+
+The daemon keeps one scraper - and with it one connection pool and its thread pools - alive and polls the overview page
+of every topic on its own schedule. Only links which have not been seen before are downloaded. The poll interval of a
+topic adapts to the rate at which new links appear in it: the rate is estimated as exponentially weighted moving
+average of new links per second, and the topic is polled about once per expected new article, bounded by
+``min_interval`` and ``max_interval``. Busy sections are therefore polled every few seconds, idle ones rarely. The
+list of topics is refreshed every ``topic_refresh`` seconds.
+
+The links written so far are remembered in memory, bounded by ``max_seen``; links whose download failed are retried on
+the next poll. With a ``SeenFilter`` (see ``seen_filter``),
+they are remembered on disk instead, without a bound and across restarts.
+
+If a ``RefreshScheduler`` is given, the new articles are registered with it and the due refreshes of their engagement
+fields run every ``refresh_interval`` seconds (see ``refresh``).
+
+On SIGTERM or SIGINT the daemon finishes the current poll, closes all stages and sinks - which writes their buffered
+data - and exits.
+
+Usage:
+    python src/app.py -daemon y -archive y
+"""
+from __future__ import annotations
+from collections import OrderedDict
+import heapq
+import signal
+from threading import Event
+import time
+
+from sinks import write_batch
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+
+class TopicSchedule:
+    """
+    The adaptive poll schedule of a single topic.
+
+    :param topic: the name of the topic
+    :param link: the hyperlink of the topic's overview page
+    :param interval: the initial poll interval in seconds
+    :param min_interval: the shortest poll interval in seconds
+    :param max_interval: the longest poll interval in seconds
+    :param smoothing: the weight of the latest poll in the moving average of the rate of new links
+    """
+
+    __slots__ = (
+        "topic",
+        "link",
+        "interval",
+        "min_interval",
+        "max_interval",
+        "smoothing",
+        "rate",
+        "last_poll",
+        "next_poll",
+    )
+
+    def __init__(
+        self, topic, link, interval=300, min_interval=15, max_interval=1800, smoothing=0.3
+    ):
+        self.topic = topic
+        self.link = link
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.rate = None
+        self.last_poll = None
+        self.next_poll = time.monotonic()
+
+    def update(self, new_links: int, now: float) -> float:
+        """
+        Updates the rate of new links after a poll and schedules the next poll. The first poll of a topic only sets
+        the baseline, as all of its links are new.
+
+        :param new_links: the number of new links found by the poll
+        :type new_links: int
+        :param now: the monotonic time of the poll
+        :type now: float
+        :return: the new poll interval in seconds
+        :rtype: float
+        """
+        if self.last_poll is not None:
+            rate = new_links / max(now - self.last_poll, 1e-3)
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate = self.smoothing * rate + (1 - self.smoothing) * self.rate
+            interval = 1 / self.rate if self.rate > 0 else self.max_interval
+            self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.last_poll = now
+        self.next_poll = now + self.interval
+        return self.interval
+
+    def backoff(self, now: float) -> None:
+        """
+        Schedules the next poll after a failed one.
+        """
+        self.interval = min(self.interval * 2, self.max_interval)
+        self.next_poll = now + self.interval
+
+
+class Daemon:
+    """
+    Polls the topics of a scraper continuously and passes new articles through the stages into the sinks.
+
+    :param scraper: the ``FAZ_Scraper`` to poll with
+    :param sinks: the sinks the articles are written into
+    :param stages: the stages applied to each batch of articles before the sinks
+    :param initial_interval: the poll interval of a topic until its rate of new links is known
+    :param min_interval: the shortest poll interval of a topic in seconds
+    :param max_interval: the longest poll interval of a topic in seconds
+    :param smoothing: the weight of the latest poll in the moving average of the rate of new links
+    :param topic_refresh: the number of seconds after which the list of topics is refreshed
+    :param flush_interval: the number of seconds after which the sinks and the stages defining ``flush`` are flushed
+    :param max_seen: the number of links remembered to detect new articles
+    :param refresher: an optional ``RefreshScheduler`` re-crawling the engagement fields of the new articles
+    :param refresh_interval: the number of seconds between two runs of the due refreshes
+    :param seen_filter: an optional ``SeenFilter`` remembering the seen links instead of the in-memory ``seen``
+    """
+
+    def __init__(
+        self,
+        scraper,
+        sinks,
+        stages=(),
+        initial_interval=300,
+        min_interval=15,
+        max_interval=1800,
+        smoothing=0.3,
+        topic_refresh=3600,
+        flush_interval=300,
+        max_seen=200000,
+        refresher=None,
+        refresh_interval=300,
+        seen_filter=None,
+    ):
+        self.scraper = scraper
+        self.sinks = list(sinks)
+        self.stages = list(stages)
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.topic_refresh = topic_refresh
+        self.flush_interval = flush_interval
+        self.max_seen = max_seen
+        self.refresher = refresher
+        self.refresh_interval = refresh_interval
+        self.seen_filter = seen_filter
+        self.schedules = {}
+        self.seen = OrderedDict()
+        self._queue = []
+        self._stopped = Event()
+
+    def stop(self, *args) -> None:
+        """
+        Asks the daemon to stop after the current poll. Used as signal handler.
+        """
+        log.info("Stopping the daemon")
+        self._stopped.set()
+
+    def refresh_topics(self) -> None:
+        """
+        Retrieves the topics of the newspaper. New topics are scheduled immediately, removed ones are dropped.
+        """
+        self.scraper.get_topics()
+        for topic, link in self.scraper.topics.items():
+            if topic not in self.schedules:
+                schedule = TopicSchedule(
+                    topic,
+                    link,
+                    self.initial_interval,
+                    self.min_interval,
+                    self.max_interval,
+                    self.smoothing,
+                )
+                self.schedules[topic] = schedule
+                heapq.heappush(self._queue, (schedule.next_poll, topic))
+            else:
+                self.schedules[topic].link = link
+        removed = set(self.schedules) - set(self.scraper.topics)
+        for topic in removed:
+            log.info(f"Topic {topic} is no longer listed, stopped polling it")
+            del self.schedules[topic]
+        if removed:
+            # A topic which is listed again later must not be polled by two queue entries
+            self._queue = [entry for entry in self._queue if entry[1] not in removed]
+            heapq.heapify(self._queue)
+        log.info(f"Polling {len(self.schedules)} topics")
+
+    def _new_links(self, links: list) -> list:
+        if self.seen_filter is not None:
+            return self.seen_filter.filter_new(links)
+        return [link for link in links if link not in self.seen]
+
+    def _remember(self, links: list) -> None:
+        """
+        Marks links as seen. Only links whose articles were written are remembered, such that failed downloads are
+        retried on the next poll.
+        """
+        if self.seen_filter is not None:
+            self.seen_filter.add(links)
+            return
+        for link in links:
+            self.seen[link] = None
+        while len(self.seen) > self.max_seen:
+            self.seen.popitem(last=False)
+
+    def poll(self, schedule: TopicSchedule) -> int:
+        """
+        Polls the overview page of a topic and downloads, processes and writes its new articles.
+
+        :param schedule: the schedule of the topic
+        :type schedule: TopicSchedule
+        :return: the number of new links
+        :rtype: int
+        """
+        scraper = self.scraper
+        scraper.set_topic(schedule.topic).get_articles_of_topic()
+        links = scraper.curr_article_all_links
+        new = self._new_links(links)
+        failed = set()
+        if new:
+            scraper.curr_article_all_links = new
+            results = scraper.download_all_articles_from_curr_topic()
+            failed = set(scraper.curr_failed_links)
+            results = write_batch(results, schedule.topic, self.stages, self.sinks)
+            self._remember([link for link in new if link not in failed])
+            if self.refresher is not None:
+                self.refresher.process(results)
+            Metrics.increment("daemon.articles", len(results))
+        if scraper.discovery is not None:
+            scraper.discovery.consumed(
+                schedule.topic, [link for link in links if link not in failed]
+            )
+        Metrics.increment("daemon.polls")
+        return len(new)
+
+    def run(self) -> None:
+        """
+        Polls the topics until SIGTERM or SIGINT is received, then closes all stages, sinks and the scraper.
+        """
+        handlers = {
+            sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        last_refresh = last_flush = last_recrawl = time.monotonic()
+        try:
+            self.refresh_topics()
+            while not self._stopped.is_set():
+                now = time.monotonic()
+                if now - last_refresh >= self.topic_refresh:
+                    self._refresh_safely()
+                    last_refresh = now
+                if (
+                    self.refresher is not None
+                    and now - last_recrawl >= self.refresh_interval
+                ):
+                    self._recrawl_safely()
+                    last_recrawl = now
+                if now - last_flush >= self.flush_interval:
+                    for sink in self.sinks:
+                        sink.flush()
+                    for stage in self.stages:
+                        flush = getattr(stage, "flush", None)
+                        if flush is not None:
+                            flush()
+                    last_flush = now
+                if not self._queue:
+                    self._stopped.wait(self.min_interval)
+                    continue
+                due, topic = self._queue[0]
+                if due > now:
+                    self._stopped.wait(min(due - now, self.min_interval))
+                    continue
+                heapq.heappop(self._queue)
+                schedule = self.schedules.get(topic)
+                if schedule is None:
+                    continue
+                try:
+                    new_links = self.poll(schedule)
+                    interval = schedule.update(new_links, time.monotonic())
+                    log.info(
+                        f"Topic {topic}: {new_links} new articles, next poll in {interval:.0f}s"
+                    )
+                except Exception as e:
+                    schedule.backoff(time.monotonic())
+                    log.error(f"Could not poll topic {topic}. Reason: {e}")
+                heapq.heappush(self._queue, (schedule.next_poll, topic))
+        finally:
+            self.close()
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+
+    def _refresh_safely(self) -> None:
+        try:
+            self.refresh_topics()
+        except Exception as e:
+            log.error(f"Could not refresh the topics. Reason: {e}")
+
+    def _recrawl_safely(self) -> None:
+        try:
+            self.refresher.refresh_due(self.scraper, self.sinks)
+        except Exception as e:
+            log.error(f"Could not refresh the engagement fields. Reason: {e}")
+
+    def close(self) -> None:
+        if self.refresher is not None:
+            self.refresher.close()
+        if self.seen_filter is not None:
+            self.seen_filter.close()
+        for stage in self.stages:
+            stage.close()
+        for sink in self.sinks:
+            sink.close()
+        self.scraper.close()
+        Metrics.log_summary(log)
@@ -0,0 +1,257 @@
+"""
+This module detects near-duplicate articles, e.g. agency pieces republished with minor edits or live tickers which
+change every few minutes.
+
+For every article, a 64 bit SimHash fingerprint is computed over the shingles (word trigrams) of its text. Two texts
+are considered near-duplicates if their fingerprints differ in at most ``max_distance`` bits. Fingerprints are looked
+up in a locality sensitive hashing (LSH) index: the fingerprint is split into ``max_distance + 1`` bands, and by the
+pigeonhole principle two fingerprints within the distance share at least one band exactly. A lookup therefore only
+compares against the few fingerprints found in the same band buckets.
+
+Each article is tagged with the id of its cluster (opened by the first article seen with this text), and pure
+duplicates - articles whose normalised text equals the one of an already seen article under a different link - can
+optionally be dropped before they reach the sinks. Like the hashes of ``HashStore``, the fingerprints of a batch are
+only added to the index once all sinks have written it (see ``committed`` and ``sinks.write_batch``), so an article
+which was never stored does not make a later copy of it a duplicate. Within a batch, articles are compared with the
+ones before them as well.
+"""
+from __future__ import annotations
+from array import array
+from hashlib import blake2b
+from os import replace
+from os.path import exists
+import re
+
+from utilities import Logger
+
+log = Logger.get_logger(__name__)
+
+_word = re.compile(r"\w+", re.UNICODE)
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(
+        blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def simhash(text: str, shingle_size=3) -> int:
+    """
+    Computes the 64 bit SimHash fingerprint of a text over its word shingles.
+
+    :param text: the text
+    :type text: str
+    :param shingle_size: the number of words per shingle
+    :type shingle_size: int
+    :return: the fingerprint
+    :rtype: int
+    """
+    words = _word.findall((text or "").lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [
+            " ".join(words[i : i + shingle_size])
+            for i in range(len(words) - shingle_size + 1)
+        ]
+    bits = [format(_hash64(shingle), "064b") for shingle in shingles]
+    threshold = len(bits) / 2
+    fingerprint = 0
+    for column in zip(*bits):
+        fingerprint = (fingerprint << 1) | (column.count("1") > threshold)
+    return fingerprint
+
+
+class NearDuplicateDetector:
+    """
+    A pipeline stage which tags articles with their near-duplicate cluster and optionally drops pure duplicates.
+    The fingerprints, clusters, text digests and link hashes are kept in arrays of 64 bit integers, one item per
+    fingerprint, and can be persisted to ``path``, such that clusters are stable across runs. Each band table is a
+    dictionary mapping a band key to the list of items holding it.
+
+    :param max_distance: the maximum number of differing bits of two near-duplicate fingerprints
+    :param skip_duplicates: drop articles whose text has been seen before under another link
+    :param path: an optional file the fingerprints are loaded from and saved to
+    """
+
+    def __init__(self, max_distance=3, skip_duplicates=False, path=None):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_width = 64 // self.bands
+        self.skip_duplicates = skip_duplicates
+        self.path = path
+        self.fingerprints = array("Q")
+        self.clusters = array("q")
+        self.links = array("Q")
+        self.texts = array("Q")
+        self._tables = [{} for _ in range(self.bands)]
+        self._next_cluster = 0
+        self._pending = {}
+        self.skipped = 0
+        self._saved = 0
+        if path and exists(path):
+            self.load()
+
+    def _band_keys(self, fingerprint: int) -> list:
+        mask = (1 << self.band_width) - 1
+        return [
+            (fingerprint >> (band * self.band_width)) & mask
+            for band in range(self.bands)
+        ]
+
+    def find(self, fingerprint: int) -> tuple:
+        """
+        Returns the closest known fingerprint within ``max_distance`` bits.
+
+        :param fingerprint: the fingerprint to look up
+        :type fingerprint: int
+        :return: a tuple of the item and its distance, or (None, None) if there is no near-duplicate
+        :rtype: tuple
+        """
+        best, best_distance = None, self.max_distance + 1
+        for table, key in zip(self._tables, self._band_keys(fingerprint)):
+            for candidate in table.get(key, ()):
+                distance = bin(self.fingerprints[candidate] ^ fingerprint).count("1")
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return (best, best_distance) if best is not None else (None, None)
+
+    def add(
+        self, fingerprint: int, link_hash: int, text_hash: int, cluster: int = None
+    ) -> int:
+        """
+        Adds a fingerprint to the index.
+
+        :param fingerprint: the fingerprint
+        :type fingerprint: int
+        :param link_hash: the 64 bit hash of the article's link
+        :type link_hash: int
+        :param text_hash: the 64 bit hash of the article's normalised text
+        :type text_hash: int
+        :param cluster: the cluster of the fingerprint. A new cluster is opened if None
+        :type cluster: int
+        :return: the cluster id
+        :rtype: int
+        """
+        item = len(self.fingerprints)
+        if cluster is None:
+            cluster = self._next_cluster
+        self._next_cluster = max(self._next_cluster, cluster + 1)
+        self.fingerprints.append(fingerprint)
+        self.clusters.append(cluster)
+        self.links.append(link_hash)
+        self.texts.append(text_hash)
+        for table, key in zip(self._tables, self._band_keys(fingerprint)):
+            table.setdefault(key, []).append(item)
+        return cluster
+
+    def _find_in_batch(self, fingerprint: int, batch: list) -> tuple:
+        best, best_distance = None, self.max_distance + 1
+        for entry in batch:
+            distance = bin(entry[0] ^ fingerprint).count("1")
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        return best, best_distance
+
+    def process(self, articles: list) -> list:
+        """
+        Tags each article with its ``cluster_id``; articles without text are passed on untagged. If
+        ``skip_duplicates`` is set, articles whose normalised text equals the one of an already seen article with a
+        different link are removed from the batch. The fingerprints are added by ``committed`` once the articles
+        have been written.
+
+        :param articles: the parsed articles
+        :type articles: list
+        :return: the articles to pass on to the sinks
+        :rtype: list
+        """
+        # The fingerprints of a batch which was not written are dropped with the next one
+        self._pending = {}
+        batch = []
+        kept = []
+        for article in articles:
+            normalised = " ".join(_word.findall((article.text or "").lower()))
+            if not normalised:
+                # Articles without text (e.g. paywalled or video pages) would all end up in one cluster
+                kept.append(article)
+                continue
+            fingerprint = simhash(normalised)
+            link = _hash64(article.link or "")
+            text = _hash64(normalised)
+            match, distance = self._find_in_batch(fingerprint, batch)
+            item, item_distance = self.find(fingerprint)
+            if item is not None and item_distance <= distance:
+                match = (
+                    self.fingerprints[item], self.links[item], self.texts[item], self.clusters[item]
+                )
+            if match is None:
+                cluster = self._next_cluster
+                self._next_cluster += 1
+            else:
+                cluster = match[3]
+                if match[2] == text and self.skip_duplicates and match[1] != link:
+                    self.skipped += 1
+                    continue
+            article.cluster_id = cluster
+            if match is None or match[2] != text:
+                entry = (fingerprint, link, text, cluster)
+                batch.append(entry)
+                self._pending[article.link] = entry
+            kept.append(article)
+        return kept
+
+    def committed(self, articles: list) -> None:
+        """
+        Adds the fingerprints of articles which were written into all sinks.
+
+        :param articles: the written articles
+        :type articles: list
+        """
+        for article in articles:
+            entry = self._pending.pop(article.link, None)
+            if entry is not None:
+                self.add(*entry)
+
+    def save(self) -> None:
+        """
+        Saves the fingerprints, clusters, link and text hashes to ``path``.
+        """
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(len(self.fingerprints).to_bytes(8, "little"))
+            self.fingerprints.tofile(fp)
+            self.clusters.tofile(fp)
+            self.links.tofile(fp)
+            self.texts.tofile(fp)
+        replace(tmp, self.path)
+        self._saved = len(self.fingerprints)
+        log.info(f'Saved {len(self.fingerprints)} fingerprints to "{self.path}"')
+
+    def load(self) -> None:
+        with open(self.path, "rb") as fp:
+            size = int.from_bytes(fp.read(8), "little")
+            fingerprints, clusters = array("Q"), array("q")
+            links, texts = array("Q"), array("Q")
+            for column in (fingerprints, clusters, links, texts):
+                column.fromfile(fp, size)
+        for fingerprint, cluster, link, text in zip(
+            fingerprints, clusters, links, texts
+        ):
+            self.add(fingerprint, link, text, cluster)
+        self._saved = len(self.fingerprints)
+        log.info(f'Loaded {size} fingerprints from "{self.path}"')
+
+    def flush(self) -> None:
+        """
+        Saves the fingerprints if new ones were added since the last save, such that a crash loses at most the
+        fingerprints of one flush interval.
+        """
+        if len(self.fingerprints) > self._saved:
+            self.save()
+
+    def close(self) -> None:
+        if self.skipped:
+            log.info(f"Skipped {self.skipped} duplicate articles")
+        self.save()
@@ -0,0 +1,303 @@
+"""
+This module discovers new article links from the RSS feeds and XML sitemaps of the newspaper instead of downloading and
+parsing the HTML section pages.
+
+Feeds and sitemaps are downloaded by the scraper's ``fetch_response`` - so they count against its rate limit, crawl
+budget and ``max_body_size`` - with conditional requests (``If-None-Match`` / ``If-Modified-Since``), such that an
+unchanged feed costs a single ``304 Not Modified`` response. They are parsed incrementally with ``iterparse``: every
+entry is handed on and cleared as soon as it has been read, no document tree is built. Per feed, the newest publication
+time seen so far is kept; only entries published after it are returned. Entries without a publication time are
+returned once per link.
+
+New entries are kept as pending links of their topic until the scraper reports them as written with ``consumed``. A
+topic's pending links are returned by every call of ``links_of_topic``, so links which were cut by the crawl budget or
+lost in a crash are returned again by the next run. At most ``max_pending`` links are kept per topic. The state of the
+feeds and the pending links are stored in a small JSON file, so they survive restarts.
+
+The feed of a topic is found by filling the topic into the ``feed`` template, e.g.
+``https://www.faz.net/rss/aktuell/{topic}/``. The sitemaps are fetched at most every ``sitemap_interval`` seconds and
+their entries are assigned to the topic whose link is a prefix of the article link. If the feed of a topic is missing
+or broken, ``links_of_topic`` returns None and the scraper falls back to the HTML section page. The publication times
+of the links returned recently are kept in ``published``, e.g. to order them in a ``Frontier``. All methods can be
+called from several threads.
+
+RSS 2.0, Atom and sitemap (including Google News sitemap) documents are understood.
+"""
+from __future__ import annotations
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import json
+from io import BytesIO
+from os import replace
+from os.path import exists
+from threading import Lock
+import time
+import xml.etree.ElementTree as ElementTree
+
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+_entry_tags = frozenset(("item", "entry", "url"))
+_link_tags = frozenset(("link", "loc"))
+_date_tags = frozenset(("pubDate", "published", "updated", "lastmod", "publication_date"))
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_feed_time(value: str) -> float:
+    """
+    Parses the time of a feed entry, either RFC 822 (RSS) or ISO 8601 (Atom, sitemaps).
+
+    :param value: the time as found in the feed
+    :type value: str
+    :return: the time as POSIX timestamp or None if it cannot be parsed
+    :rtype: float
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def iter_entries(stream):
+    """
+    Incrementally parses a feed or sitemap and yields the link and publication time of each entry.
+
+    :param stream: a binary file-like object, e.g. the raw stream of a response
+    :return: a generator of (link, timestamp) tuples. The timestamp is None if the entry has none
+    """
+    entry = None
+    for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+        tag = _local_name(element.tag)
+        if event == "start":
+            if tag in _entry_tags:
+                entry = {}
+            continue
+        if entry is None:
+            continue
+        if tag in _link_tags and "link" not in entry:
+            entry["link"] = (element.get("href") or element.text or "").strip()
+        elif tag in _date_tags and "time" not in entry:
+            entry["time"] = parse_feed_time(element.text)
+        elif tag in _entry_tags:
+            if entry.get("link"):
+                yield entry["link"], entry.get("time")
+            entry = None
+            element.clear()
+
+
+class FeedDiscovery:
+    """
+    Discovers the new article links of each topic from its RSS feed and the sitemaps.
+
+    :param scraper: the ``WebScraper`` whose ``fetch_response`` downloads the feeds and sitemaps
+    :param feed: the template of the feed link of a topic, holding a ``{topic}`` placeholder. No feeds are used if None
+    :param sitemaps: the links of the sitemaps listing new articles
+    :param state_path: the JSON file the state of the feeds and the pending links are stored in
+    :param sitemap_interval: the number of seconds after which the sitemaps are fetched again
+    :param max_pending: the maximum number of pending links per topic. The oldest are dropped
+    :param max_undated: the number of links of entries without publication time remembered, to return them only once
+    :param max_published: the number of publication times kept in ``published``
+    """
+
+    def __init__(
+        self,
+        scraper,
+        feed=None,
+        sitemaps=(),
+        state_path="discovery.json",
+        sitemap_interval=900,
+        max_pending=1000,
+        max_undated=10000,
+        max_published=100000,
+    ):
+        self.scraper = scraper
+        self.feed = feed
+        self.sitemaps = list(sitemaps or [])
+        self.state_path = state_path
+        self.sitemap_interval = sitemap_interval
+        self.max_pending = max_pending
+        self.max_undated = max_undated
+        self.max_published = max_published
+        self.feeds = {}
+        self.pending = {}
+        self.undated = {}
+        self.published = {}
+        self._sitemaps_fetched = None
+        self._lock = Lock()
+        self._state_lock = Lock()
+        if state_path and exists(state_path):
+            with open(state_path, "r") as fp:
+                state = json.load(fp)
+            self.feeds = state["feeds"]
+            self.pending = state["pending"]
+            self.undated = dict.fromkeys(state["undated"])
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(
+                {"feeds": self.feeds, "pending": self.pending, "undated": list(self.undated)},
+                fp,
+            )
+        replace(tmp, self.state_path)
+
+    def fetch(self, url: str) -> tuple:
+        """
+        Downloads a feed or sitemap if it changed and returns the entries published since the last fetch, without
+        storing anything. The new state of the feed is passed to ``_accept`` together with the entries.
+
+        :param url: the link of the feed or sitemap
+        :type url: str
+        :return: the (link, timestamp) tuples of the new entries and the new state of the feed, which is None if it did
+            not change. The entries are None if the feed is missing or cannot be parsed
+        :rtype: tuple
+        """
+        state = self.feeds.get(url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        try:
+            response = self.scraper.fetch_response(url, headers=headers)
+            if response.status_code == 304:
+                Metrics.increment("discovery.not_modified")
+                return [], None
+            if response.status_code != 200:
+                log.warning(f'Feed "{url}" returned status {response.status_code}')
+                return None, None
+            newest = state.get("newest") or 0
+            entries, latest = [], newest
+            for link, published in iter_entries(BytesIO(response.content)):
+                if published is None or published > newest:
+                    entries.append((link, published))
+                if published is not None and published > latest:
+                    latest = published
+        except (OSError, ElementTree.ParseError) as e:
+            log.warning(f'Could not read feed "{url}": {e}')
+            return None, None
+        return entries, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "newest": latest,
+            "fetched": time.time(),
+        }
+
+    def _accept(self, url: str, state: dict, entries: dict) -> None:
+        """
+        Adds new entries to the pending links of their topics and stores them together with the new state of the feed.
+
+        :param url: the link of the feed or sitemap
+        :param state: the new state of the feed, None if it did not change
+        :param entries: a dictionary mapping topics to their new (link, timestamp) tuples
+        """
+        added = 0
+        with self._state_lock:
+            if state is not None:
+                self.feeds[url] = state
+            for topic, topic_entries in entries.items():
+                pending = self.pending.setdefault(topic, {})
+                for link, published in topic_entries:
+                    if link in pending:
+                        continue
+                    if published is None:
+                        if link in self.undated:
+                            continue
+                        self.undated[link] = None
+                    pending[link] = published
+                    added += 1
+                while len(pending) > self.max_pending:
+                    del pending[next(iter(pending))]
+                    Metrics.increment("discovery.dropped")
+            while len(self.undated) > self.max_undated:
+                del self.undated[next(iter(self.undated))]
+            if state is not None or added:
+                self._save()
+        Metrics.increment("discovery.entries", added)
+
+    def _fetch_sitemaps(self, topics: dict) -> None:
+        """
+        Fetches the sitemaps and assigns their new links to the topics whose link is a prefix of the article link.
+        """
+        prefixes = sorted(
+            ((link, topic) for topic, link in topics.items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        for sitemap in self.sitemaps:
+            entries, state = self.fetch(sitemap)
+            assigned = {}
+            for link, published in entries or []:
+                for prefix, topic in prefixes:
+                    if link.startswith(prefix):
+                        assigned.setdefault(topic, []).append((link, published))
+                        break
+            self._accept(sitemap, state, assigned)
+        self._sitemaps_fetched = time.monotonic()
+
+    def links_of_topic(self, topic: str, topics: dict) -> list:
+        """
+        Returns the pending links of a topic, including the new links from its feed and the sitemaps.
+
+        :param topic: the topic
+        :type topic: str
+        :param topics: all topics and their links, used to assign the sitemap entries
+        :type topics: dict
+        :return: the pending links, or None if the topic has no usable feed and the HTML section page must be used
+        :rtype: list
+        """
+        with self._lock:
+            if self.sitemaps and (
+                self._sitemaps_fetched is None
+                or time.monotonic() - self._sitemaps_fetched >= self.sitemap_interval
+            ):
+                self._fetch_sitemaps(topics)
+        if self.feed:
+            url = self.feed.format(topic=topic)
+            entries, state = self.fetch(url)
+            if entries is None:
+                Metrics.increment("discovery.fallbacks")
+                return None
+            self._accept(url, state, {topic: entries})
+        elif not self.sitemaps:
+            return None
+        with self._state_lock:
+            pending = self.pending.get(topic, {})
+            self.published.update(pending)
+            while len(self.published) > self.max_published:
+                del self.published[next(iter(self.published))]
+            return list(pending)
+
+    def consumed(self, topic: str, links: list) -> None:
+        """
+        Removes links which were scraped and written from the pending links of a topic.
+
+        :param topic: the topic
+        :type topic: str
+        :param links: the links
+        :type links: list
+        """
+        with self._state_lock:
+            pending = self.pending.get(topic)
+            if not pending:
+                return
+            removed = [link for link in links if link in pending]
+            for link in removed:
+                del pending[link]
+            if removed:
+                self._save()
@@ -0,0 +1,222 @@
+"""
+This module orders the pending article links of a run, such that the freshest and most important articles are fetched
+first and no topic starves the others.
+
+Within a topic, links are ordered by a priority in seconds: the publication time of the article - from its feed entry
+or from a date in its link - minus ``position_penalty`` seconds per position on the section page. Links without a known
+publication time are treated as ``default_age`` seconds old.
+
+Topics are interleaved by stride scheduling: every topic has a virtual time which advances by 1 / weight with each link
+taken from it, and the next link is always taken from the topic with the lowest virtual time. A topic with weight 2
+therefore gets twice the share of a topic with weight 1, and every topic gets its share however many links it has. A
+topic which runs empty and gets new links later starts at the current virtual time, instead of catching up on its
+unused share.
+
+Links pushed with ``push_urgent`` are taken before all others. Every push of a link gets a new sequence number, which
+is stored with the pending link and with its queue entry; entries whose number is no longer the one of the pending
+link, e.g. as the link was moved to the front or taken and pushed again, are skipped. Pushing and taking a link costs
+O(log n) in the number of links of its topic plus O(log t) in the number of topics.
+
+Example:
+    1 frontier = Frontier(weights={"politik": 2})
+    2 frontier.push(link, "politik", position=0)
+    3 for link, topic in frontier.pop_batch(32): ...
+"""
+from __future__ import annotations
+from collections import deque
+import heapq
+from itertools import count
+import re
+import time
+
+from utilities import Logger
+
+log = Logger.get_logger(__name__)
+
+_link_date = re.compile(r"/(20\d{2}|19\d{2})[/-](\d{1,2})[/-](\d{1,2})(?:/|-|\.html)")
+
+
+def link_time(link: str) -> float:
+    """
+    Reads the publication date of an article from its link, e.g. ".../2020/03/01/..." or "...-2020-03-01.html".
+
+    :param link: the hyperlink of the article
+    :type link: str
+    :return: the date as POSIX timestamp or None if the link holds no date
+    :rtype: float
+    """
+    match = _link_date.search(link)
+    if match is None:
+        return None
+    try:
+        return time.mktime(tuple(int(g) for g in match.groups()) + (0, 0, 0, 0, 0, -1))
+    except (OverflowError, ValueError):
+        return None
+
+
+class Frontier:
+    """
+    A priority queue of pending article links, interleaving the topics by their weights.
+
+    :param weights: the weight of each topic
+    :param default_weight: the weight of the topics missing in ``weights``
+    :param position_penalty: the number of seconds a link loses in priority per position on the section page
+    :param default_age: the age in seconds assumed for links without a publication time
+    """
+
+    def __init__(
+        self, weights=None, default_weight=1.0, position_penalty=600, default_age=86400
+    ):
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.position_penalty = position_penalty
+        self.default_age = default_age
+        self._links = {}
+        self._topics = []
+        self._virtual_time = {}
+        self._now = 0.0
+        self._urgent = deque()
+        self._pending = {}
+        self._counts = {}
+        self._sequence = count()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, link: str) -> bool:
+        return link in self._pending
+
+    def pending(self, topic: str) -> int:
+        """
+        :return: the number of pending links of a topic
+        :rtype: int
+        """
+        return self._counts.get(topic, 0)
+
+    def priority(self, link: str, position=0, published=None) -> float:
+        """
+        :param link: the hyperlink of the article
+        :type link: str
+        :param position: the position of the link on its section page
+        :type position: int
+        :param published: the publication time of the article as POSIX timestamp, if known
+        :type published: float
+        :return: the priority of the link, higher is fetched earlier
+        :rtype: float
+        """
+        if published is None:
+            published = link_time(link)
+        if published is None:
+            published = time.time() - self.default_age
+        return published - position * self.position_penalty
+
+    def _track(self, link: str, topic: str) -> int:
+        """
+        :return: the sequence number of the push, or None if the link is already pending
+        :rtype: int
+        """
+        if link in self._pending:
+            return None
+        sequence = next(self._sequence)
+        self._pending[link] = (topic, sequence)
+        self._counts[topic] = self._counts.get(topic, 0) + 1
+        return sequence
+
+    def _untrack(self, link: str) -> str:
+        topic, _ = self._pending.pop(link)
+        self._counts[topic] -= 1
+        return topic
+
+    def _is_current(self, link: str, sequence: int) -> bool:
+        pending = self._pending.get(link)
+        return pending is not None and pending[1] == sequence
+
+    def push(self, link: str, topic: str, position=0, published=None) -> None:
+        """
+        Adds a link to the frontier. Links which are already pending are ignored.
+
+        :param link: the hyperlink of the article
+        :type link: str
+        :param topic: the topic of the article
+        :type topic: str
+        :param position: the position of the link on its section page
+        :type position: int
+        :param published: the publication time of the article as POSIX timestamp, if known
+        :type published: float
+        """
+        sequence = self._track(link, topic)
+        if sequence is None:
+            return
+        heap = self._links.get(topic)
+        if not heap:
+            heap = self._links[topic] = []
+            start = max(self._virtual_time.get(topic, 0.0), self._now)
+            self._virtual_time[topic] = start
+            heapq.heappush(self._topics, (start, next(self._sequence), topic))
+        heapq.heappush(heap, (-self.priority(link, position, published), sequence, link))
+
+    def push_urgent(self, link: str, topic: str) -> None:
+        """
+        Adds a link which is taken before all other links. A pending link is moved to the front.
+
+        :param link: the hyperlink of the article
+        :type link: str
+        :param topic: the topic of the article
+        :type topic: str
+        """
+        sequence = self._track(link, topic)
+        if sequence is None:
+            # The entry in the queue of its topic becomes stale
+            sequence = next(self._sequence)
+            self._pending[link] = (self._pending[link][0], sequence)
+        self._urgent.append((link, sequence))
+
+    def pop(self) -> tuple:
+        """
+        Takes the next link.
+
+        :return: the link and its topic, or None if the frontier is empty
+        :rtype: tuple
+        """
+        while self._urgent:
+            link, sequence = self._urgent.popleft()
+            if self._is_current(link, sequence):
+                return link, self._untrack(link)
+        while self._topics:
+            virtual_time, order, topic = self._topics[0]
+            heap = self._links[topic]
+            _, sequence, link = heapq.heappop(heap) if heap else (None, None, None)
+            if not heap:
+                heapq.heappop(self._topics)
+                del self._links[topic]
+            if link is None or not self._is_current(link, sequence):
+                # Taken as urgent link or pushed again since
+                continue
+            self._now = virtual_time
+            self._virtual_time[topic] = virtual_time + 1 / self.weights.get(
+                topic, self.default_weight
+            )
+            if heap:
+                heapq.heapreplace(
+                    self._topics, (self._virtual_time[topic], order, topic)
+                )
+            self._untrack(link)
+            return link, topic
+        return None
+
+    def pop_batch(self, size: int) -> list:
+        """
+        Takes up to ``size`` links.
+
+        :param size: the maximum number of links
+        :type size: int
+        :return: the (link, topic) pairs in the order they were taken
+        :rtype: list
+        """
+        batch = []
+        while len(batch) < size:
+            item = self.pop()
+            if item is None:
+                break
+            batch.append(item)
+        return batch
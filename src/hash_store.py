@@ -0,0 +1,145 @@
+"""
+This module keeps the hashes of the articles written so far, such that unchanged articles are not written again on
+repeated crawls.
+
+Two hashes are stored per link:
+ - the content hash (``Article.digest``) of the normalised extracted fields. As a stage of the scraper, ``HashStore``
+   drops every article whose content hash equals the stored one, so none of the sinks rewrites it
+ - the hash of the raw response body. If ``skip_unchanged_bodies`` is set, the scraper asks the store before parsing a
+   page and skips it entirely if the body is byte-for-byte the one seen before
+
+The hashes of a new or changed article are only stored once all sinks have written it (see ``committed`` and
+``sinks.write_batch``). An article which failed to parse or to be written, or was lost in a crash, is therefore not
+taken as unchanged by the next crawl.
+
+Example:
+    1 store = HashStore("hashes.db")
+    2 changed = store.process(articles)
+    3 store.committed(changed)
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from hashlib import blake2b
+import sqlite3
+from threading import Lock
+import time
+
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+
+def body_hash(content: bytes) -> str:
+    """
+    :param content: the raw response body
+    :type content: bytes
+    :return: the hash of the body
+    :rtype: str
+    """
+    return blake2b(content or b"", digest_size=16).hexdigest()
+
+
+class HashStore:
+    """
+    A SQLite backed store of the content and body hash of every article. It can be used from several threads.
+
+    :param path: the SQLite database
+    :param skip_unchanged_bodies: whether pages whose raw body did not change shall not be parsed again
+    :param max_pending: the number of body hashes kept until their article is written. The oldest are dropped
+    """
+
+    def __init__(self, path="hashes.db", skip_unchanged_bodies=False, max_pending=100000):
+        self.path = path
+        self.skip_unchanged_bodies = skip_unchanged_bodies
+        self.max_pending = max_pending
+        self._bodies = OrderedDict()
+        self._lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (link TEXT PRIMARY KEY, content_hash TEXT, body_hash TEXT, "
+            "updated REAL)"
+        )
+        self.db.commit()
+        self.unchanged = 0
+
+    def body_unchanged(self, link: str, content: bytes) -> bool:
+        """
+        Compares the raw body of a page with the one seen before. The hash of a changed body is kept until the
+        article has been written, see ``committed``.
+
+        :param link: the hyperlink of the page
+        :type link: str
+        :param content: the raw response body
+        :type content: bytes
+        :return: True if the body is unchanged and the page does not need to be parsed again
+        :rtype: bool
+        """
+        digest = body_hash(content)
+        with self._lock:
+            row = self.db.execute(
+                "SELECT body_hash FROM hashes WHERE link = ?", (link,)
+            ).fetchone()
+            if row is not None and row[0] == digest:
+                Metrics.increment("hash_store.body_unchanged")
+                return True
+            self._bodies[link] = digest
+            self._bodies.move_to_end(link)
+            while len(self._bodies) > self.max_pending:
+                self._bodies.popitem(last=False)
+        return False
+
+    def process(self, articles: list) -> list:
+        """
+        Drops the articles whose content hash equals the stored one. The hashes of the others are stored by
+        ``committed`` once they have been written.
+
+        :param articles: the parsed articles
+        :type articles: list
+        :return: the new and changed articles
+        :rtype: list
+        """
+        changed = []
+        bodies = []
+        with self._lock:
+            for article in articles:
+                if article.content_hash is None:
+                    article.content_hash = article.digest()
+                row = self.db.execute(
+                    "SELECT content_hash FROM hashes WHERE link = ?", (article.link,)
+                ).fetchone()
+                if row is None or row[0] != article.content_hash:
+                    changed.append(article)
+                elif article.link in self._bodies:
+                    # the stored content is current, only its body changed
+                    bodies.append((self._bodies.pop(article.link), article.link))
+            self.db.executemany("UPDATE hashes SET body_hash = ? WHERE link = ?", bodies)
+            self.db.commit()
+        skipped = len(articles) - len(changed)
+        self.unchanged += skipped
+        Metrics.increment("hash_store.unchanged", skipped)
+        return changed
+
+    def committed(self, articles: list) -> None:
+        """
+        Stores the content and body hashes of articles which were written into all sinks.
+
+        :param articles: the written articles
+        :type articles: list
+        """
+        now = time.time()
+        with self._lock:
+            rows = [
+                (article.link, article.content_hash, self._bodies.pop(article.link, None), now)
+                for article in articles
+            ]
+            self.db.executemany(
+                "INSERT INTO hashes (link, content_hash, body_hash, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(link) DO UPDATE SET content_hash = excluded.content_hash, "
+                "body_hash = coalesce(excluded.body_hash, body_hash), updated = excluded.updated",
+                rows,
+            )
+            self.db.commit()
+
+    def close(self) -> None:
+        log.info(f"Skipped {self.unchanged} unchanged articles")
+        self.db.close()
@@ -0,0 +1,165 @@
+"""
+This module records the progress of a run in a journal, such that a run which died halfway can be resumed without
+fetching finished work again.
+
+The journal is a JSON lines file holding one event per line:
+ - ``{"event": "run", "started": ..., "topics": {...}}``: a run started with these topics
+ - ``{"event": "plan", "topic": ..., "links": [...]}``: the article links planned for a topic
+ - ``{"event": "article", "topic": ..., "link": ..., "digest": ...}``: an article was scraped. Only its link and content
+   hash are kept, the article itself reaches the outputs through ``sinks.write_batch``
+ - ``{"event": "written", "topic": ..., "links": [...]}``: the articles of these links were written to the sinks
+ - ``{"event": "completed", "topic": ...}``: all articles of a topic were written to the sinks
+ - ``{"event": "finished"}``: the run completed
+
+A resumed run skips the completed topics and, within the other topics, the links which were written. Articles which
+were scraped but not written when the run died are downloaded again.
+
+Events are appended and handed to the operating system immediately, so they survive the process dying; the file is
+synced to disk whenever articles were written. A truncated last line, e.g. after a power loss, is ignored. Each new run
+starts a new journal; ``-resume y`` continues the run recorded in the journal instead.
+"""
+from __future__ import annotations
+from datetime import datetime
+import json
+from os import fsync
+from os.path import exists
+
+from article import Article
+from utilities import Logger
+
+log = Logger.get_logger(__name__)
+
+
+class JournalState:
+    """
+    The progress of a run as read from the journal.
+    """
+
+    def __init__(self):
+        self.topics = None
+        self.plans = {}
+        self.scraped = {}
+        self.written = {}
+        self.completed = set()
+        self.finished = False
+
+    def written_links(self, topic: str) -> set:
+        """
+        :param topic: the topic
+        :type topic: str
+        :return: the links of the topic whose articles were written to the sinks
+        :rtype: set
+        """
+        return self.written.get(topic, set())
+
+    def unwritten(self) -> int:
+        """
+        :return: the number of articles which were scraped but not written to the sinks
+        :rtype: int
+        """
+        return sum(len(set(links) - self.written_links(topic)) for topic, links in self.scraped.items())
+
+
+class RunJournal:
+    """
+    Appends the progress of a run to the journal file and reads it back for resuming.
+
+    :param path: the journal file
+    """
+
+    def __init__(self, path="journal.jsonl"):
+        self.path = path
+        self._file = None
+
+    def load(self) -> JournalState:
+        """
+        Reads the journal of the last run.
+
+        :return: the state of the last run, or None if there is no unfinished run to resume
+        :rtype: JournalState
+        """
+        if not exists(self.path):
+            return None
+        state = JournalState()
+        with open(self.path, "r") as fp:
+            for line in fp:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    log.warning(f'Ignoring a truncated line in "{self.path}"')
+                    continue
+                kind = event.get("event")
+                if kind == "run":
+                    state.topics = event["topics"]
+                elif kind == "plan":
+                    state.plans[event["topic"]] = event["links"]
+                elif kind == "article":
+                    state.scraped.setdefault(event["topic"], {})[event["link"]] = event["digest"]
+                elif kind == "written":
+                    state.written.setdefault(event["topic"], set()).update(event["links"])
+                elif kind == "completed":
+                    state.completed.add(event["topic"])
+                elif kind == "finished":
+                    state.finished = True
+        if state.topics is None or state.finished:
+            return None
+        return state
+
+    def _append(self, event: dict) -> None:
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def start(self, topics: dict) -> None:
+        """
+        Starts a new journal for a run over the given topics.
+        """
+        self._file = open(self.path, "w")
+        self._append(
+            {
+                "event": "run",
+                "started": datetime.utcnow().isoformat(timespec="seconds"),
+                "topics": topics,
+            }
+        )
+
+    def resume(self) -> None:
+        """
+        Continues the journal of the last run.
+        """
+        self._file = open(self.path, "a")
+
+    def plan(self, topic: str, links: list) -> None:
+        self._append({"event": "plan", "topic": topic, "links": links})
+
+    def article(self, topic: str, article: Article) -> None:
+        self._append(
+            {
+                "event": "article",
+                "topic": topic,
+                "link": article.link,
+                "digest": article.content_hash or article.digest(),
+            }
+        )
+
+    def written(self, topic: str, links: list) -> None:
+        """
+        Records that the articles of the given links were written to the sinks.
+        """
+        self._append({"event": "written", "topic": topic, "links": links})
+        fsync(self._file.fileno())
+
+    def completed(self, topic: str) -> None:
+        """
+        Records that all articles of a topic were written to the sinks.
+        """
+        self._append({"event": "completed", "topic": topic})
+
+    def finish(self) -> None:
+        self._append({"event": "finished"})
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
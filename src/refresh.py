@@ -0,0 +1,263 @@
+"""
+This module re-crawls the volatile engagement fields of recently published articles - the number of comments and
+recommendations - on a decaying schedule and writes only their changes.
+
+Every scraped article is registered in a small SQLite database. It is refreshed ``schedule[0]`` seconds after its
+publication (or after it was first seen, if the publication time is unknown), then after ``schedule[1]`` seconds and so
+on; after the last step it is no longer tracked. Publication times shown on the page without a UTC offset are local times
+of Europe/Berlin. A refresh downloads the page with the scraper - through its rate limit, budget and size limits - but
+only until the ``data-comment-value`` and ``data-empfehlen-value`` attributes have been found: each chunk is searched,
+together with the end of the previous one, with a regular expression on the raw bytes, and then the connection is
+closed - no DOM is built and the rest of the page is not downloaded. If a value changed, a delta holding
+the link, the time of the refresh and the changed fields is passed to ``write_deltas`` of the sinks, instead of
+rewriting the whole article.
+
+A refresh which fails is retried after ``retry_delay`` seconds, doubled with every further failure, without advancing
+the schedule. After ``max_failures`` failures in a row the step is given up and the article waits for its next step.
+The schedule is only advanced once the deltas were written into all sinks.
+
+Refreshes run at the end of every run of ``app.py`` and periodically in daemon mode, if enabled with ``-refresh y``.
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import re
+import sqlite3
+import time
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
+
+from article import parse_count, parse_time
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+_engagement = re.compile(rb"data-(comment|empfehlen)-value\s*=\s*[\"'](\d*)[\"']")
+_fields = {b"comment": "comments", b"empfehlen": "recommendation"}
+# The number of bytes of the previous chunk searched again, such that an attribute split between two chunks is found
+_overlap = 256
+_berlin = ZoneInfo("Europe/Berlin")
+
+
+def extract_engagement(content: bytes, values: dict = None) -> dict:
+    """
+    :param content: the raw page or a part of it
+    :type content: bytes
+    :param values: the values found in the previous parts of the page, which are kept
+    :type values: dict
+    :return: the number of comments and recommendations found
+    :rtype: dict
+    """
+    values = {} if values is None else values
+    for match in _engagement.finditer(content):
+        field = _fields[match.group(1)]
+        if field not in values and match.group(2):
+            values[field] = int(match.group(2))
+    return values
+
+
+def fetch_engagement(scraper, link: str, max_bytes=2 * 1024 ** 2) -> dict:
+    """
+    Downloads a page until both engagement fields have been found and closes the connection afterwards.
+
+    :param scraper: the scraper to download with, see ``WebScraper.fetch_response``
+    :param link: the hyperlink of the article
+    :type link: str
+    :param max_bytes: the number of bytes after which the search is given up
+    :return: the number of comments and recommendations found
+    :rtype: dict
+    """
+    values = {}
+    state = {"tail": b"", "size": 0}
+
+    def found(chunk: bytes) -> bool:
+        window = state["tail"] + chunk
+        extract_engagement(window, values)
+        state["tail"] = window[-_overlap:]
+        state["size"] += len(chunk)
+        return len(values) == len(_fields) or state["size"] >= max_bytes
+
+    response = scraper.fetch_response(link, until=found)
+    response.raise_for_status()
+    Metrics.increment("refresh.bytes", state["size"])
+    return values
+
+
+class RefreshScheduler:
+    """
+    Tracks the articles to refresh and performs the due refreshes.
+
+    :param path: the SQLite database holding the tracked articles
+    :param schedule: the ages in seconds, counted from the publication, at which an article is refreshed
+    :param workers: the number of pages downloaded concurrently
+    :param batch_size: the maximum number of articles refreshed per call of ``refresh_due``
+    :param retry_delay: the number of seconds after which a failed refresh is retried the first time
+    :param max_failures: the number of failures in a row after which a step of the schedule is given up
+    """
+
+    def __init__(
+        self,
+        path="refresh.db",
+        schedule=(3600, 21600, 86400, 259200),
+        workers=8,
+        batch_size=500,
+        retry_delay=300,
+        max_failures=5,
+    ):
+        self.path = path
+        self.schedule = sorted(schedule)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_failures = max_failures
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS articles (link TEXT PRIMARY KEY, published REAL, step INTEGER, "
+            "due REAL, comments INTEGER, recommendation INTEGER, failures INTEGER DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS articles_due ON articles (due)")
+        self.db.commit()
+
+    def process(self, articles: list) -> list:
+        """
+        Registers the articles for refreshing. Articles which are already tracked keep their schedule. Used as a
+        stage of the scraper, it returns the articles unchanged.
+
+        :param articles: the parsed articles
+        :type articles: list
+        :return: the same articles
+        :rtype: list
+        """
+        now = time.time()
+        rows = []
+        for article in articles:
+            published = parse_time(article.time)
+            if published is not None and published.tzinfo is None:
+                published = published.replace(tzinfo=_berlin)
+            published = published.timestamp() if published else now
+            step = self._next_step(published, 0, now)
+            if step is not None and article.link:
+                rows.append(
+                    (
+                        article.link,
+                        published,
+                        step,
+                        published + self.schedule[step],
+                        parse_count(article.comments),
+                        parse_count(article.recommendation),
+                    )
+                )
+        self.db.executemany(
+            "INSERT OR IGNORE INTO articles (link, published, step, due, comments, recommendation) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.db.commit()
+        return articles
+
+    def _next_step(self, published: float, step: int, now: float) -> int:
+        """
+        :return: the first step from ``step`` on which lies in the future, or None if the schedule is exhausted
+        """
+        while step < len(self.schedule) and published + self.schedule[step] <= now:
+            step += 1
+        return step if step < len(self.schedule) else None
+
+    def refresh_due(self, scraper, sinks) -> int:
+        """
+        Refreshes the articles which are due, writes the changed fields as deltas into the sinks and schedules the
+        next refresh of each article. Articles whose page could not be fetched keep their step and are retried later.
+        If a sink fails, no schedule is changed and the error is raised.
+
+        :param scraper: the scraper to download with
+        :param sinks: the sinks the deltas are written into
+        :type sinks: list
+        :return: the number of articles due
+        :rtype: int
+        """
+        now = time.time()
+        rows = self.db.execute(
+            "SELECT link, published, step, comments, recommendation, failures FROM articles WHERE due <= ? "
+            "ORDER BY due LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        if not rows:
+            return 0
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="refresh") as pool:
+            futures = [
+                pool.submit(fetch_engagement, scraper, row[0]) for row in rows
+            ]
+        refreshed = datetime.utcnow().isoformat(timespec="seconds")
+        deltas = []
+        failed = 0
+        try:
+            for (link, published, step, comments, recommendation, failures), future in zip(rows, futures):
+                try:
+                    values = future.result()
+                except Exception as e:
+                    log.warning(f'Could not refresh "{link}": {e}')
+                    values = None
+                if values is None:
+                    failed += 1
+                    self._failed(link, published, step, failures, now, comments, recommendation)
+                    continue
+                delta = {
+                    field: value
+                    for field, value in values.items()
+                    if value != {"comments": comments, "recommendation": recommendation}[field]
+                }
+                if delta:
+                    deltas.append({"link": link, "refreshed": refreshed, **delta})
+                self._advance(
+                    link,
+                    published,
+                    step + 1,
+                    now,
+                    values.get("comments", comments),
+                    values.get("recommendation", recommendation),
+                )
+            if deltas:
+                for sink in sinks:
+                    sink.write_deltas(deltas)
+        except BaseException:
+            self.db.rollback()
+            raise
+        self.db.commit()
+        Metrics.increment("refresh.articles", len(rows) - failed)
+        Metrics.increment("refresh.failed", failed)
+        Metrics.increment("refresh.deltas", len(deltas))
+        log.info(f"Refreshed {len(rows) - failed} articles, {len(deltas)} of them changed, {failed} failed")
+        return len(rows)
+
+    def _advance(self, link, published, step, now, comments, recommendation) -> None:
+        """
+        Schedules the next refresh of an article from ``step`` on, or stops tracking it if the schedule is exhausted.
+        """
+        next_step = self._next_step(published, step, now)
+        if next_step is None:
+            self.db.execute("DELETE FROM articles WHERE link = ?", (link,))
+        else:
+            self.db.execute(
+                "UPDATE articles SET step = ?, due = ?, comments = ?, recommendation = ?, failures = 0 WHERE link = ?",
+                (next_step, published + self.schedule[next_step], comments, recommendation, link),
+            )
+
+    def _failed(self, link, published, step, failures, now, comments, recommendation) -> None:
+        """
+        Retries a failed refresh with exponential backoff, or gives up its step after ``max_failures`` failures.
+        """
+        failures += 1
+        if failures >= self.max_failures:
+            log.warning(f'Giving up refresh {step + 1} of "{link}" after {failures} failures')
+            self._advance(link, published, step + 1, now, comments, recommendation)
+            return
+        self.db.execute(
+            "UPDATE articles SET due = ?, failures = ? WHERE link = ?",
+            (now + self.retry_delay * 2 ** (failures - 1), failures, link),
+        )
+
+    def close(self) -> None:
+        self.db.close()
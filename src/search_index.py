@@ -0,0 +1,650 @@
+"""
+This module provides a local full-text index over the scraped articles, stored in a single SQLite file.
+
+The headline, the text and the external references of each article are tokenised with a German aware analyser (case
+folding, umlaut and ß folding, stop word removal and light suffix stemming). The position of a term is its position
+among all words, stop words included, so a phrase only matches words which are adjacent in the text. The fields are
+separated by a gap of ``field_gap`` positions, such that a phrase never matches across the end of the headline and the
+start of the text. The index is built incrementally out of immutable segments: every commit writes one new segment
+holding the postings of the articles added since the last commit, such that new articles are searchable within
+milliseconds and nothing has to be rebuilt. Once a term is spread over more than ``max_segments`` segments, its postings
+are merged into one, so the number of segments read per term stays bounded. ``optimize`` merges all segments.
+
+Postings are stored per term and segment as a compressed byte string: for every document the delta to the previous
+document id, the term frequency, the length of the document and the delta encoded positions are written as variable
+length integers. Positions are prefixed by their byte length, so that they are only decoded for phrase queries. A
+replaced article gets a new document id; the old id is recorded as deleted, its postings are skipped by queries and
+dropped when the term is merged. Every segment also stores its number of documents, from which the document frequency
+of a term is summed up without decoding its postings; like in Lucene, it still counts deleted documents until the term
+is merged. The segment counter, the number of documents and their total length are kept in a ``meta`` table.
+
+Document ids grow with every commit, so the segments of a term read in their order form one stream sorted by document
+id. The terms of phrases are intersected on these streams while they are decoded, starting with the rarest term: the
+other streams only skip ahead to its next document, and positions are only decoded for the documents in all of them.
+Queries are ranked with BM25, computed from the postings alone. Only the best ``limit`` documents are taken from a heap
+and looked up in the documents table. Words in double quotes form a phrase which must occur in the document, and results
+can be filtered by section and publication date.
+
+Usage:
+    python src/search_index.py add archive/*.jsonl.gz
+    python src/search_index.py query 'corona "robert koch institut"' --section politik --start 2020-04-01
+"""
+from __future__ import annotations
+import argparse
+from datetime import date
+import heapq
+import math
+import re
+import sqlite3
+
+from sinks import Sink, iter_records, record_date
+from utilities import Decorators, Logger
+
+log = Logger.get_logger(__name__)
+
+_word = re.compile(r"\w+", re.UNICODE)
+_folding = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_suffixes = ("ern", "em", "er", "en", "es", "nd", "e", "s", "n")
+stop_words = frozenset(
+    """
+    aber alle allem allen aller alles als also am an ander andere anderem anderen anderer anderes auch auf aus bei beim
+    bereits bin bis bist da damit dann das dass dein deine dem den denn der des dich die dir dies diese diesem diesen
+    dieser dieses doch dort du durch ein eine einem einen einer eines er es etwas euch euer eure fuer gegen gewesen hab
+    habe haben hat hatte hatten hier hin hinter ich ihm ihn ihnen ihr ihre im in indem ins ist jede jedem jeden jeder
+    jedes jene jetzt kann kein keine koennen man manche mehr mein meine mich mir mit muss nach nicht nichts noch nun nur
+    ob oder ohne schon sehr sei seien sein seine seit selbst sich sie sind so solche soll sondern sonst sowie ueber um
+    und uns unser unter viel vom von vor war waren warst was weg weil weiter welche wenn werde werden wie wieder will
+    wir wird wirst wo wollen worden wurde wurden zu zum zur zwar zwischen
+    """.split()
+)
+
+
+def normalize(word: str) -> str:
+    """
+    Normalises a single word: case folding, umlaut folding and removal of common German inflection suffixes.
+
+    :param word: the word
+    :type word: str
+    :return: the term
+    :rtype: str
+    """
+    return _stem(word.lower().translate(_folding))
+
+
+def _stem(word: str) -> str:
+    for suffix in _suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """
+    Splits a text into terms, dropping stop words.
+
+    :param text: the text
+    :type text: str
+    :return: the list of terms in the order they appear
+    :rtype: list
+    """
+    return [term for _, term in tokenize_positions(text)]
+
+
+def tokenize_positions(text: str) -> list:
+    """
+    Splits a text into terms with their positions, dropping stop words. Positions count all words, stop words included.
+
+    :param text: the text
+    :type text: str
+    :return: the list of (position, term) tuples in the order they appear
+    :rtype: list
+    """
+    terms = []
+    for position, word in enumerate(_word.findall(text or "")):
+        folded = word.lower().translate(_folding)
+        if folded not in stop_words:
+            terms.append((position, _stem(folded)))
+    return terms
+
+
+def encode_varints(numbers) -> bytes:
+    out = bytearray()
+    for number in numbers:
+        while number >= 0x80:
+            out.append((number & 0x7F) | 0x80)
+            number >>= 7
+        out.append(number)
+    return bytes(out)
+
+
+def decode_varint(data: bytes, position: int) -> tuple:
+    number = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+
+def encode_postings(postings: list) -> bytes:
+    """
+    Encodes a list of (document id, document length, positions) tuples, sorted by document id.
+
+    :param postings: the postings of one term
+    :type postings: list
+    :return: the compressed postings
+    :rtype: bytes
+    """
+    out = bytearray()
+    previous = 0
+    for doc, length, positions in postings:
+        encoded = encode_varints(
+            [p - q for p, q in zip(positions, [0] + positions[:-1])]
+        )
+        out += encode_varints([doc - previous, len(positions), length, len(encoded)])
+        out += encoded
+        previous = doc
+    return bytes(out)
+
+
+def decode_postings(data: bytes, with_positions=False):
+    """
+    Yields (document id, term frequency, document length, positions) tuples from encoded postings. Positions are None
+    unless requested.
+
+    :param data: the compressed postings
+    :type data: bytes
+    :param with_positions: whether the positions are decoded
+    :type with_positions: bool
+    :return: a generator of postings
+    """
+    position = doc = 0
+    end = len(data)
+    while position < end:
+        delta, position = decode_varint(data, position)
+        frequency, position = decode_varint(data, position)
+        length, position = decode_varint(data, position)
+        size, position = decode_varint(data, position)
+        doc += delta
+        positions = None
+        if with_positions:
+            positions, cursor, last = [], position, 0
+            while cursor < position + size:
+                gap, cursor = decode_varint(data, cursor)
+                last += gap
+                positions.append(last)
+        position += size
+        yield doc, frequency, length, positions
+
+
+class PostingCursor:
+    """
+    Walks the postings of one term over all its segments, in the order of the document ids, and skips the deleted
+    documents. The postings are decoded one document at a time, the positions only on request.
+
+    :param segments: the encoded postings of the term, in the order of the segments
+    :param deleted: the ids of the deleted documents
+    """
+
+    def __init__(self, segments, deleted):
+        self._segments = iter(segments)
+        self._deleted = deleted
+        self._data = b""
+        self._position = self._last = 0
+        self._positions = (0, 0)
+        self.doc = self.frequency = self.length = None
+        self.next()
+
+    def next(self):
+        """
+        Moves to the next live document.
+
+        :return: its id, or None once the postings are exhausted
+        :rtype: int
+        """
+        while True:
+            while self._position >= len(self._data):
+                self._data = next(self._segments, None)
+                if self._data is None:
+                    self.doc = None
+                    return None
+                self._position = self._last = 0
+            data = self._data
+            delta, position = decode_varint(data, self._position)
+            self.frequency, position = decode_varint(data, position)
+            self.length, position = decode_varint(data, position)
+            size, position = decode_varint(data, position)
+            self._last += delta
+            self._positions = (position, position + size)
+            self._position = position + size
+            if self._last not in self._deleted:
+                self.doc = self._last
+                return self.doc
+
+    def __iter__(self):
+        """
+        Yields the ids of the remaining live documents, moving to the next one after each.
+        """
+        while self.doc is not None:
+            yield self.doc
+            self.next()
+
+    def advance(self, target: int):
+        """
+        Moves to the first live document whose id is at least ``target``.
+
+        :return: its id, or None once the postings are exhausted
+        :rtype: int
+        """
+        while self.doc is not None and self.doc < target:
+            self.next()
+        return self.doc
+
+    def positions(self) -> list:
+        """
+        :return: the positions of the term in the current document
+        :rtype: list
+        """
+        cursor, end = self._positions
+        positions, last = [], 0
+        while cursor < end:
+            gap, cursor = decode_varint(self._data, cursor)
+            last += gap
+            positions.append(last)
+        return positions
+
+
+def parse_query(query: str) -> tuple:
+    """
+    Splits a query into phrases (text in double quotes) and single terms.
+
+    :param query: the query
+    :type query: str
+    :return: a tuple of the list of phrases (each a list of (offset, term) tuples, the offset counting the words from
+        the start of the phrase) and the list of single terms
+    :rtype: tuple
+    """
+    phrases = []
+    for phrase in re.findall(r'"([^"]*)"', query):
+        terms = tokenize_positions(phrase)
+        if terms:
+            phrases.append([(position - terms[0][0], term) for position, term in terms])
+    terms = tokenize(re.sub(r'"[^"]*"', " ", query))
+    return phrases, terms
+
+
+class SearchIndex:
+    """
+    An incremental, segment based inverted index in a SQLite file.
+
+    Example:
+        1 index = SearchIndex("search.db")
+        2 index.add(articles)
+        3 index.commit()
+        4 index.search('merkel "tag der arbeit"', section="politik")
+
+    :param path: the path of the SQLite file
+    :param k1: the BM25 term frequency saturation
+    :param b: the BM25 length normalisation
+    :param max_segments: the number of segments of a term after which they are merged on commit
+    :param field_gap: the number of positions between the headline, the text and the external references
+    """
+
+    def __init__(self, path="search.db", k1=1.2, b=0.75, max_segments=8, field_gap=100):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.field_gap = field_gap
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, link TEXT UNIQUE, section TEXT, day INTEGER, length INTEGER, headline TEXT
+            );
+            CREATE INDEX IF NOT EXISTS docs_day ON docs(day);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT, segment INTEGER, count INTEGER, data BLOB, PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS deleted (id INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            """
+        )
+        self.meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        if not self.meta:
+            self.meta["segment"] = (
+                self.db.execute("SELECT MAX(segment) FROM postings").fetchone()[0] or 0
+            )
+            self.meta["docs"], self.meta["length"] = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+            self._save_meta()
+            self.db.commit()
+        self.deleted = {row[0] for row in self.db.execute("SELECT id FROM deleted")}
+        self._pending = {}
+
+    def _save_meta(self) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", self.meta.items()
+        )
+
+    def add(self, articles: list) -> None:
+        """
+        Adds articles (``Article`` objects or dictionaries) to the index. They become searchable after ``commit``. An
+        article which is already indexed under the same link is replaced.
+
+        :param articles: the articles to add
+        :type articles: list
+        """
+        for article in articles:
+            record = article if isinstance(article, dict) else article.to_dict()
+            terms, offset = [], 0
+            for field in (
+                record.get("headline"),
+                record.get("text"),
+                " ".join(record.get("external_references") or []),
+            ):
+                field_terms = tokenize_positions(field)
+                terms += [(offset + position, term) for position, term in field_terms]
+                if field_terms:
+                    offset += field_terms[-1][0] + 1 + self.field_gap
+            old = self.db.execute(
+                "SELECT id, length FROM docs WHERE link = ?", (record.get("link"),)
+            ).fetchone()
+            if old is not None:
+                self.db.execute("DELETE FROM docs WHERE id = ?", (old[0],))
+                self.db.execute("INSERT INTO deleted (id) VALUES (?)", (old[0],))
+                self.deleted.add(old[0])
+                self.meta["docs"] -= 1
+                self.meta["length"] -= old[1]
+            doc = self.db.execute(
+                "INSERT INTO docs (link, section, day, length, headline) VALUES (?, ?, ?, ?, ?)",
+                (
+                    record.get("link"),
+                    record.get("section"),
+                    date.fromisoformat(record_date(record)).toordinal(),
+                    len(terms),
+                    record.get("headline"),
+                ),
+            ).lastrowid
+            self.meta["docs"] += 1
+            self.meta["length"] += len(terms)
+            positions = {}
+            for position, term in terms:
+                positions.setdefault(term, []).append(position)
+            for term, term_positions in positions.items():
+                self._pending.setdefault(term, []).append((doc, len(terms), term_positions))
+
+    def commit(self) -> None:
+        """
+        Writes the postings added since the last commit as a new segment and merges the segments of the terms which
+        are spread over more than ``max_segments`` segments.
+        """
+        if self._pending:
+            self.meta["segment"] += 1
+            segment = self.meta["segment"]
+            self.db.executemany(
+                "INSERT INTO postings (term, segment, count, data) VALUES (?, ?, ?, ?)",
+                (
+                    (term, segment, len(postings), encode_postings(postings))
+                    for term, postings in self._pending.items()
+                ),
+            )
+            for term in self._pending:
+                segments = self.db.execute(
+                    "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+                ).fetchone()[0]
+                if segments > self.max_segments:
+                    self._merge(term, segment)
+            self._pending = {}
+        self._save_meta()
+        self.db.commit()
+
+    def _merge(self, term: str, segment: int) -> None:
+        """
+        Merges the segments of a term into the given segment and drops the postings of deleted documents.
+        """
+        merged = sorted(
+            (doc, length, positions)
+            for data, in self.db.execute(
+                "SELECT data FROM postings WHERE term = ?", (term,)
+            )
+            for doc, _, length, positions in decode_postings(data, with_positions=True)
+            if doc not in self.deleted
+        )
+        self.db.execute("DELETE FROM postings WHERE term = ?", (term,))
+        if merged:
+            self.db.execute(
+                "INSERT INTO postings (term, segment, count, data) VALUES (?, ?, ?, ?)",
+                (term, segment, len(merged), encode_postings(merged)),
+            )
+
+    @Decorators.run_time
+    def optimize(self) -> None:
+        """
+        Merges all segments into a single one and drops the postings of replaced articles.
+        """
+        self.commit()
+        terms = [row[0] for row in self.db.execute("SELECT DISTINCT term FROM postings")]
+        for term in terms:
+            self._merge(term, self.meta["segment"])
+        self.db.execute("DELETE FROM deleted")
+        self.deleted = set()
+        self.db.commit()
+        self.db.execute("VACUUM")
+
+    def _cursor(self, term: str) -> PostingCursor:
+        return PostingCursor(
+            (
+                data
+                for data, in self.db.execute(
+                    "SELECT data FROM postings WHERE term = ? ORDER BY segment", (term,)
+                )
+            ),
+            self.deleted,
+        )
+
+    def _counts(self, terms) -> dict:
+        """
+        :return: a dictionary mapping the terms to their document frequency
+        :rtype: dict
+        """
+        terms = list(terms)
+        counts = dict.fromkeys(terms, 0)
+        counts.update(
+            self.db.execute(
+                "SELECT term, SUM(count) FROM postings WHERE term IN (%s) GROUP BY term"
+                % ",".join("?" * len(terms)),
+                terms,
+            )
+        )
+        return counts
+
+    @staticmethod
+    def _contains_phrase(offsets: list, positions: list) -> bool:
+        first, *rest = positions
+        following = [(offset - offsets[0], set(p)) for offset, p in zip(offsets[1:], rest)]
+        return any(
+            all(start + offset in p for offset, p in following) for start in first
+        )
+
+    def _match_phrases(self, phrases: list, counts: dict) -> list:
+        """
+        Intersects the postings of the phrase terms, starting with the rarest term, and checks the positions of the
+        documents holding all of them.
+
+        :return: the sorted ids of the documents holding all phrases
+        :rtype: list
+        """
+        terms = sorted({term for phrase in phrases for _, term in phrase}, key=counts.get)
+        if not counts[terms[0]]:
+            return []
+        cursors = {term: self._cursor(term) for term in terms}
+        rarest, *others = (cursors[term] for term in terms)
+        matches = []
+        while rarest.doc is not None:
+            doc = rarest.doc
+            for cursor in others:
+                if cursor.advance(doc) is None:
+                    return matches
+                if cursor.doc != doc:
+                    doc = cursor.doc
+                    break
+            else:
+                if all(
+                    self._contains_phrase(
+                        [offset for offset, _ in phrase], [cursors[term].positions() for _, term in phrase]
+                    )
+                    for phrase in phrases
+                ):
+                    matches.append(doc)
+                doc += 1
+            rarest.advance(doc)
+        return matches
+
+    def search(
+        self, query: str, section=None, start=None, end=None, limit=10
+    ) -> list:
+        """
+        Runs a query and returns the best matching articles.
+
+        :param query: the query. Words in double quotes form a phrase which must occur in the article
+        :type query: str
+        :param section: only return articles of this section
+        :type section: str
+        :param start: only return articles published on or after this date (YYYY-MM-DD)
+        :type start: str
+        :param end: only return articles published on or before this date (YYYY-MM-DD)
+        :type end: str
+        :param limit: the maximum number of results
+        :type limit: int
+        :return: a list of dictionaries holding the link, section, headline and score of each result
+        :rtype: list
+        """
+        phrases, terms = parse_query(query)
+        counts = self._counts(set(terms) | {term for phrase in phrases for _, term in phrase})
+        n_docs = self.meta["docs"]
+        if not n_docs or not counts:
+            return []
+        candidates = self._match_phrases(phrases, counts) if phrases else None
+        if candidates == []:
+            return []
+        average_length = self.meta["length"] / n_docs or 1
+        scores = {}
+        for term, count in counts.items():
+            if not count:
+                continue
+            idf = math.log(1 + (n_docs - count + 0.5) / (count + 0.5))
+            cursor = self._cursor(term)
+            for doc in candidates if candidates is not None else cursor:
+                if cursor.advance(doc) is None:
+                    break
+                if cursor.doc == doc:
+                    norm = self.k1 * (1 - self.b + self.b * cursor.length / average_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * cursor.frequency * (self.k1 + 1) / (
+                        cursor.frequency + norm
+                    )
+        return self._top(scores, section, start, end, limit)
+
+    def _top(self, scores: dict, section, start, end, limit) -> list:
+        """
+        Takes the documents from a heap in the order of their scores and looks them up in chunks, until ``limit`` of
+        them passed the filters.
+        """
+        filters, arguments = [], []
+        if section:
+            filters.append("section = ?")
+            arguments.append(section)
+        if start:
+            filters.append("day >= ?")
+            arguments.append(date.fromisoformat(start).toordinal())
+        if end:
+            filters.append("day <= ?")
+            arguments.append(date.fromisoformat(end).toordinal())
+        heap = [(-score, doc) for doc, score in scores.items()]
+        heapq.heapify(heap)
+        chunk_size = limit if not filters else max(4 * limit, 100)
+        results = []
+        while heap and len(results) < limit:
+            chunk = [heapq.heappop(heap) for _ in range(min(chunk_size, len(heap)))]
+            statement = (
+                "SELECT id, link, section, day, headline FROM docs WHERE "
+                + " AND ".join(filters + ["id IN (%s)" % ",".join("?" * len(chunk))])
+            )
+            rows = {
+                row[0]: row
+                for row in self.db.execute(statement, arguments + [doc for _, doc in chunk])
+            }
+            for score, doc in chunk:
+                if doc in rows and len(results) < limit:
+                    _, link, doc_section, day, headline = rows[doc]
+                    results.append(
+                        {
+                            "link": link,
+                            "section": doc_section,
+                            "date": date.fromordinal(day).isoformat(),
+                            "headline": headline,
+                            "score": round(-score, 4),
+                        }
+                    )
+        return results
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
+
+
+class SearchIndexSink(Sink):
+    """
+    Adds the written articles to a ``SearchIndex`` and commits a new segment with every write. The segments of a term
+    are merged once there are more than ``max_segments`` of them.
+    """
+
+    def __init__(self, path="search.db", max_segments=8):
+        self.index = SearchIndex(path, max_segments=max_segments)
+
+    def write(self, articles: list, topic: str = None) -> None:
+        self.index.add(articles)
+        self.index.commit()
+
+    def close(self) -> None:
+        self.index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or extend the full-text index.")
+    parser.add_argument("command", choices=["query", "add", "optimize"])
+    parser.add_argument(
+        "arguments", nargs="*", help="The query, or the output files to add to the index"
+    )
+    parser.add_argument("--index", "-i", default="search.db", help="The index file")
+    parser.add_argument("--section", help="Only return articles of this section")
+    parser.add_argument("--start", help="Only return articles published on or after this date")
+    parser.add_argument("--end", help="Only return articles published on or before this date")
+    parser.add_argument("--limit", default=10, type=int, help="The number of results")
+    args = parser.parse_args()
+    index = SearchIndex(args.index)
+    if args.command == "query":
+        for result in index.search(
+            " ".join(args.arguments), args.section, args.start, args.end, args.limit
+        ):
+            print(f'{result["score"]:8.3f}  {result["date"]}  {result["section"]}  {result["headline"]}  {result["link"]}')
+    elif args.command == "add":
+        Logger.configure()
+        for path in args.arguments:
+            batch = []
+            for record in iter_records(path):
+                batch.append(record)
+                if len(batch) >= 1000:
+                    index.add(batch)
+                    index.commit()
+                    batch = []
+            index.add(batch)
+            index.commit()
+            log.info(f'Indexed "{path}"')
+    else:
+        index.optimize()
+    index.close()
@@ -0,0 +1,240 @@
+"""
+This module remembers which article links were seen before without keeping all of them in memory.
+
+``SeenFilter`` answers membership queries in two levels:
+ - a Bloom filter held in a memory-mapped file. Most new links are recognised as new by it without any further lookup.
+   As the file is mapped, the filter is not rebuilt when the process starts and only the pages touched are loaded
+ - an exact SQLite set of the 64 bit hashes of all links, stored as ``INTEGER PRIMARY KEY`` (the rowid itself, so
+   without a separate index), which is queried only for the links the Bloom filter reports as seen, to weed out its
+   false positives. Two of a hundred million links share a hash with a probability below 0.1%
+
+The Bloom filter is scalable: once a filter holds ``capacity`` links, a new filter with twice the capacity and half the
+false positive rate is added in the next file (``seen.bloom``, ``seen.bloom.1``, ...), such that the overall false
+positive rate stays below ``error_rate`` however many links are added. A filter with false positive rate p needs
+-ln(p) / ln(2)^2 bits per link. As the first filter is sized for ``error_rate / 2``, the filters need about 1.4 MB per
+million links at an overall ``error_rate`` of 0.01; the memory per million links is logged when the filter is opened.
+
+Example:
+    1 seen = SeenFilter("seen.bloom", "seen.db", capacity=1000000, error_rate=0.01)
+    2 new_links = seen.filter_new(links)
+    3 seen.add(new_links)
+"""
+from __future__ import annotations
+from hashlib import blake2b
+import math
+import mmap
+from os.path import exists, getsize
+import sqlite3
+import struct
+from threading import Lock
+
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+_magic = b"FAZBLOOM"
+_header = struct.Struct("<8sQQQQd")
+_count_offset = 24
+
+
+def link_key(link: str) -> int:
+    """
+    :return: the signed 64 bit hash of a link, the key of the exact set
+    :rtype: int
+    """
+    return int.from_bytes(blake2b(link.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class BloomFilter:
+    """
+    A Bloom filter in a memory-mapped file. The file holds a header with the number of bits, the number of hash
+    functions, the number of links added, the capacity and the false positive rate, followed by the bit array.
+
+    :param path: the file of the filter. It is created if it does not exist
+    :param capacity: the number of links the filter is sized for
+    :param error_rate: the false positive rate at ``capacity`` links
+    """
+
+    def __init__(self, path: str, capacity=1000000, error_rate=0.01):
+        self.path = path
+        if not exists(path):
+            bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+            bits = (bits + 7) // 8 * 8
+            hashes = max(1, round(bits / capacity * math.log(2)))
+            with open(path, "wb") as fp:
+                fp.write(_header.pack(_magic, bits, hashes, 0, capacity, error_rate))
+                fp.truncate(_header.size + bits // 8)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), getsize(path))
+        (
+            magic,
+            self.bits,
+            self.hashes,
+            self.count,
+            self.capacity,
+            self.error_rate,
+        ) = _header.unpack_from(self._map)
+        if magic != _magic:
+            raise ValueError(f'"{path}" is not a Bloom filter file')
+
+    def _positions(self, link: str):
+        digest = blake2b(link.encode("utf-8"), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        second |= 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def __contains__(self, link: str) -> bool:
+        data, offset = self._map, _header.size
+        for position in self._positions(link):
+            if not data[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, link: str) -> None:
+        data, offset = self._map, _header.size
+        for position in self._positions(link):
+            data[offset + (position >> 3)] |= 1 << (position & 7)
+        self.count += 1
+        struct.pack_into("<Q", self._map, _count_offset, self.count)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def size(self) -> int:
+        """
+        :return: the size of the bit array in bytes
+        :rtype: int
+        """
+        return self.bits // 8
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+class SeenFilter:
+    """
+    A scalable Bloom filter backed by an exact SQLite set of the seen links. It can be used from several threads.
+
+    :param path: the file of the first Bloom filter. Further filters are stored in ``{path}.1``, ``{path}.2``, ...
+    :param db_path: the SQLite database holding the exact set of link hashes
+    :param capacity: the number of links the first filter is sized for
+    :param error_rate: the overall false positive rate of the Bloom filters
+    """
+
+    def __init__(
+        self, path="seen.bloom", db_path="seen.db", capacity=1000000, error_rate=0.01
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = Lock()
+        self.filters = []
+        while exists(self._filter_path(len(self.filters))):
+            self.filters.append(BloomFilter(self._filter_path(len(self.filters))))
+        if not self.filters:
+            self._grow()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY)")
+        self.db.commit()
+        log.info(
+            f"Seen filter holds {len(self)} links in {len(self.filters)} Bloom filters of "
+            f"{sum(f.size for f in self.filters) / 1e6:.1f} MB, "
+            f"{self.bytes_per_million() / 1e6:.2f} MB per million links"
+        )
+
+    def _filter_path(self, index: int) -> str:
+        return self.path if index == 0 else f"{self.path}.{index}"
+
+    def _grow(self) -> None:
+        index = len(self.filters)
+        # Tightening the rate by half per filter keeps the sum of all rates below error_rate
+        self.filters.append(
+            BloomFilter(
+                self._filter_path(index),
+                self.capacity * 2 ** index,
+                self.error_rate / 2 ** (index + 1),
+            )
+        )
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    def bytes_per_million(self) -> float:
+        """
+        :return: the size of the Bloom filters per million links they are sized for, in bytes
+        :rtype: float
+        """
+        return sum(f.size for f in self.filters) / sum(f.capacity for f in self.filters) * 1e6
+
+    def might_contain(self, link: str) -> bool:
+        return any(link in f for f in self.filters)
+
+    def filter_new(self, links: list) -> list:
+        """
+        Returns the links which were not seen before, in their order and without duplicates. Only the links the Bloom
+        filters report as seen are looked up in the exact set.
+
+        :param links: the links
+        :type links: list
+        :return: the new links
+        :rtype: list
+        """
+        links = list(dict.fromkeys(links))
+        with self._lock:
+            candidates = {
+                link_key(link): link for link in links if self.might_contain(link)
+            }
+            keys = list(candidates)
+            seen = set()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self.db.execute(
+                    f"SELECT hash FROM seen WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                seen.update(candidates[row[0]] for row in rows)
+        Metrics.increment("seen_filter.bloom_negatives", len(links) - len(candidates))
+        Metrics.increment("seen_filter.exact_lookups", len(candidates))
+        Metrics.increment("seen_filter.false_positives", len(candidates) - len(seen))
+        return [link for link in links if link not in seen]
+
+    def add(self, links: list) -> None:
+        """
+        Records links as seen.
+
+        :param links: the links
+        :type links: list
+        """
+        with self._lock:
+            for link in links:
+                if self.might_contain(link):
+                    continue
+                if self.filters[-1].full:
+                    self._grow()
+                    log.info(
+                        f"Added a Bloom filter for {self.filters[-1].capacity} links, "
+                        f"{self.bytes_per_million() / 1e6:.2f} MB per million links"
+                    )
+                self.filters[-1].add(link)
+            self.db.executemany(
+                "INSERT OR IGNORE INTO seen VALUES (?)", ((link_key(link),) for link in links)
+            )
+            self.db.commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            for f in self.filters:
+                f.flush()
+
+    def close(self) -> None:
+        for f in self.filters:
+            f.close()
+        self.db.close()
@@ -1,11 +1,12 @@
 import argparse
-from pymongo import MongoClient
 from utilities import Logger
 
-log = Logger.log
+log = Logger.get_logger(__name__)
 
 
 def setup(host, port, collection, database):
+    from pymongo import MongoClient
+
     try:
         log.info(
             f"Setting up a Mongo client data base with the followng arguments:\nHost:{host}\nPort:{port}\ncolletion:{collection}\ndatabase:{database}"
@@ -47,5 +48,6 @@ if __name__ == "__main__":
         type=str,
         required=False)
     args = parser.parse_args()
+    Logger.configure()
     setup(args.host, args.port, args.collection, args.database)
     print(args.port)
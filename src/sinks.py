@@ -0,0 +1,797 @@
+"""
+This module provides the outputs ("sinks") the parsed articles are written into.
+
+Every sink implements the same small interface:
+ - write: takes a list of ``Article`` records of one topic
+ - write_deltas: takes the changes of the volatile fields of already written articles (see ``refresh``)
+ - flush: makes everything written so far durable
+ - close: flushes and releases all resources
+
+The following sinks are provided:
+ - JsonSink: writes one JSON file per topic and batch, named ``{topic}_{YYYYmmddHHMMSS}_{pid}_{n}.json``
+ - MongoSink: inserts the articles into a MongoDB collection
+ - ParquetSink: buffers the articles into row groups and writes typed, compressed Parquet or Arrow files which are
+   partitioned by date and section
+ - RotatingFileSink: appends the articles as compressed JSON lines to files which are rotated by size and age, and
+   keeps a manifest of all files it has written
+
+``write_batch`` passes a batch of articles through the stages and into the sinks, ``iter_records`` reads the records
+back from any of the file outputs.
+"""
+from __future__ import annotations
+from datetime import datetime
+import gzip
+import io
+import json
+from os import fsync, getpid, listdir, makedirs, remove, replace
+from os.path import exists, isdir, join
+import re
+import time
+from time import gmtime, strftime
+
+from article import Article, parse_count, parse_time
+from utilities import FileLock, Logger
+
+log = Logger.get_logger(__name__)
+
+
+class Sink:
+    """
+    The base class of all sinks. Subclasses implement ``write`` and, if they buffer data, ``flush``.
+    """
+
+    def write(self, articles: list, topic: str = None) -> None:
+        raise NotImplementedError
+
+    def write_deltas(self, deltas: list) -> None:
+        """
+        Writes the changes of the volatile fields of already written articles. Each delta is a dictionary holding the
+        ``link``, the time of the refresh as ``refreshed`` and the changed fields. Sinks which do not store deltas
+        ignore them.
+
+        :param deltas: the deltas
+        :type deltas: list
+        """
+        log.debug(f"{type(self).__name__} does not store deltas")
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+def write_batch(articles: list, topic: str = None, stages=(), sinks=()) -> list:
+    """
+    Passes a batch of articles through the stages and writes the result into every sink. Once all sinks have written
+    the batch, the stages which define ``committed`` (e.g. ``HashStore``) are called with the written articles, such
+    that they only record what is actually stored. If a sink fails, the other sinks are still written, but no stage is
+    told and the first error is raised.
+
+    :param articles: the parsed articles
+    :type articles: list
+    :param topic: the topic of the articles
+    :type topic: str
+    :param stages: the stages applied before the sinks
+    :param sinks: the sinks
+    :return: the articles written, i.e. the output of the last stage
+    :rtype: list
+    """
+    for stage in stages:
+        articles = stage.process(articles)
+    error = None
+    for sink in sinks:
+        try:
+            sink.write(articles, topic)
+        except Exception as e:
+            log.error(f"{type(sink).__name__} could not write topic {topic}. Reason: {e}")
+            error = error or e
+    if error is not None:
+        raise error
+    for stage in stages:
+        committed = getattr(stage, "committed", None)
+        if committed is not None:
+            committed(articles)
+    return articles
+
+
+class JsonSink(Sink):
+    """
+    Writes each batch of articles into a separate JSON file ``{topic}_{YYYYmmddHHMMSS}_{pid}_{n}.json``. The process id
+    and the number of the write keep batches written within the same second from overwriting each other.
+    """
+
+    def __init__(self, directory="."):
+        self.directory = directory
+        self._sequence = 0
+
+    def write(self, articles: list, topic: str = None) -> None:
+        ts = strftime("%Y%m%d%H%M%S", gmtime())
+        self._sequence += 1
+        outfile = join(self.directory, f"{topic}_{ts}_{getpid()}_{self._sequence}.json")
+        log.info(f'Writing data to "{outfile}"')
+        with open(outfile, "x") as fp:
+            fp.write("[" + ", ".join(article.to_json() for article in articles) + "]")
+
+    def write_deltas(self, deltas: list) -> None:
+        """
+        Appends the deltas as JSON lines to ``deltas_{YYYYmmddHHMMSS}.jsonl``.
+        """
+        ts = strftime("%Y%m%d%H%M%S", gmtime())
+        outfile = join(self.directory, f"deltas_{ts}.jsonl")
+        log.info(f'Writing {len(deltas)} deltas to "{outfile}"')
+        with open(outfile, "a") as fp:
+            fp.write("".join(json.dumps(delta) + "\n" for delta in deltas))
+
+
+class MongoSink(Sink):
+    """
+    Inserts the articles into a MongoDB collection. pymongo is imported when the sink is created.
+    """
+
+    def __init__(self, host, port, collection, database):
+        from pymongo import MongoClient
+
+        self.client = MongoClient(host, port)
+        self.db = self.client[collection].get_collection(database)
+
+    def write(self, articles: list, topic: str = None) -> None:
+        from bson.raw_bson import RawBSONDocument
+
+        if not articles:
+            return
+        log.info(
+            f"Writing a total of {len(articles)} into db {self.db} for topic {topic}"
+        )
+        self.db.insert_many(
+            [RawBSONDocument(article.to_bson()) for article in articles]
+        )
+
+    def write_deltas(self, deltas: list) -> None:
+        """
+        Sets the changed fields of each article and appends them, with the time of the refresh, to its ``history``.
+        """
+        from pymongo import UpdateOne
+
+        if not deltas:
+            return
+        updates = []
+        for delta in deltas:
+            fields = {k: v for k, v in delta.items() if k not in ("link", "refreshed")}
+            updates.append(
+                UpdateOne(
+                    {"link": delta["link"]},
+                    {
+                        "$set": {**fields, "refreshed": delta["refreshed"]},
+                        "$push": {"history": {"time": delta["refreshed"], **fields}},
+                    },
+                )
+            )
+        result = self.db.bulk_write(updates, ordered=False)
+        log.info(f"Updated {result.modified_count} articles in db {self.db}")
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class ParquetSink(Sink):
+    """
+    Buffers the articles in memory and writes them in row groups of ``row_group_size`` rows into columnar files. The
+    files are partitioned by publication date and section:
+
+        {directory}/date=YYYY-MM-DD/section={section}/part-{YYYYmmddHHMMSS}-{pid}-{n}.parquet
+
+    Articles without a parsable publication time are partitioned by the date they were scraped. The columns are typed
+    (the publication time as timestamp, counters as integers and the external references as list of strings) such that
+    readers can push projections and filters down. Repeated strings can optionally be dictionary encoded.
+
+    A file stays open across flushes, which only write the buffered rows as row groups, and is closed once it holds
+    ``max_file_rows`` rows, is older than ``max_file_age`` seconds or the sink is closed. While it is open, it is named
+    ``_part-...`` and therefore ignored by pyarrow and pandas when they read the dataset; it is renamed to ``part-...``
+    when it is closed and its footer is written.
+
+    pyarrow is an optional dependency and only imported when this sink is used.
+
+    :param directory: the root directory of the partitioned dataset
+    :param row_group_size: the number of rows written at once into a partition
+    :param file_format: either "parquet" or "arrow" (Arrow IPC file)
+    :param compression: the compression codec, e.g. "zstd", "snappy" or "gzip"
+    :param dictionary_columns: the columns which are dictionary encoded
+    :param max_file_rows: the number of rows after which a file is closed
+    :param max_file_age: the number of seconds after which a file is closed
+    """
+
+    columns = (
+        "link",
+        "section",
+        "newspaper",
+        "published",
+        "time",
+        "headline",
+        "headline_emphasis",
+        "author",
+        "comments",
+        "recommendation",
+        "paragraphs",
+        "pages",
+        "external_references",
+        "nr_external_references",
+        "text",
+        "cluster_id",
+        "word_count",
+        "sentence_count",
+        "mean_sentence_length",
+        "max_sentence_length",
+        "readability",
+        "reference_density",
+        "content_hash",
+        "crawled",
+    )
+
+    def __init__(
+        self,
+        directory="parquet",
+        row_group_size=1000,
+        file_format="parquet",
+        compression="zstd",
+        dictionary_columns=("section", "newspaper", "author", "headline_emphasis"),
+        max_file_rows=1000000,
+        max_file_age=24 * 3600,
+    ):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError(
+                "The Parquet/Arrow output requires pyarrow. Install it via 'pip install pyarrow'"
+            ) from e
+        assert file_format in ["parquet", "arrow"]
+        self.pa = pyarrow
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.file_format = file_format
+        self.compression = compression
+        self.dictionary_columns = list(dictionary_columns or [])
+        self.max_file_rows = max_file_rows
+        self.max_file_age = max_file_age
+        self.schema = self._build_schema()
+        self._buffers = {}
+        self._writers = {}
+        self._sequence = 0
+
+    def _build_schema(self):
+        pa = self.pa
+        string = pa.string()
+        counter = pa.int32()
+        types = {
+            "published": pa.timestamp("s"),
+            "comments": counter,
+            "recommendation": counter,
+            "paragraphs": counter,
+            "pages": counter,
+            "nr_external_references": counter,
+            "external_references": pa.list_(string),
+            "cluster_id": pa.int64(),
+            "word_count": counter,
+            "sentence_count": counter,
+            "mean_sentence_length": pa.float32(),
+            "max_sentence_length": counter,
+            "readability": pa.float32(),
+            "reference_density": pa.float32(),
+        }
+        if self.file_format == "arrow":
+            for column in self.dictionary_columns:
+                types[column] = pa.dictionary(pa.int32(), string)
+        return pa.schema(
+            [(column, types.get(column, string)) for column in self.columns]
+        )
+
+    @staticmethod
+    def _row(article: Article) -> dict:
+        published = parse_time(article.time)
+        return {
+            "link": article.link,
+            "section": article.section,
+            "newspaper": article.newspaper,
+            "published": published,
+            "time": article.time if isinstance(article.time, str) else None,
+            "headline": article.headline,
+            "headline_emphasis": article.headline_emphasis,
+            "author": article.author if isinstance(article.author, str) else None,
+            "comments": parse_count(article.comments),
+            "recommendation": parse_count(article.recommendation),
+            "paragraphs": article.paragraphs,
+            "pages": article.pages,
+            "external_references": article.external_references,
+            "nr_external_references": article.nr_external_references,
+            "text": article.text,
+            "cluster_id": article.cluster_id,
+            "word_count": article.word_count,
+            "sentence_count": article.sentence_count,
+            "mean_sentence_length": article.mean_sentence_length,
+            "max_sentence_length": article.max_sentence_length,
+            "readability": article.readability,
+            "reference_density": article.reference_density,
+            "content_hash": article.content_hash,
+            "crawled": article.crawled,
+        }
+
+    def write(self, articles: list, topic: str = None) -> None:
+        today = datetime.utcnow().date().isoformat()
+        for article in articles:
+            row = self._row(article)
+            date = row["published"].date().isoformat() if row["published"] else today
+            partition = (date, row["section"] or topic or "unknown")
+            buffer = self._buffers.setdefault(partition, [])
+            buffer.append(row)
+            if len(buffer) >= self.row_group_size:
+                self._write_row_group(partition)
+
+    def _write_row_group(self, partition) -> None:
+        rows = self._buffers.pop(partition, None)
+        if not rows:
+            return
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        opened = self._writers.get(partition)
+        if opened is None:
+            opened = self._writers[partition] = self._open_writer(partition)
+        opened["writer"].write_table(table)
+        opened["rows"] += len(rows)
+        if (
+            opened["rows"] >= self.max_file_rows
+            or time.monotonic() - opened["opened"] >= self.max_file_age
+        ):
+            self._close_writer(partition)
+
+    def _open_writer(self, partition) -> dict:
+        date, section = partition
+        directory = join(self.directory, f"date={date}", f"section={section}")
+        if not isdir(directory):
+            makedirs(directory)
+        ts = strftime("%Y%m%d%H%M%S", gmtime())
+        self._sequence += 1
+        name = f"part-{ts}-{getpid()}-{self._sequence}.{self.file_format}"
+        path, tmp = join(directory, name), join(directory, f"_{name}")
+        log.info(f'Writing {self.file_format} data to "{path}"')
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(
+                tmp,
+                self.schema,
+                compression=self.compression,
+                use_dictionary=self.dictionary_columns or False,
+            )
+        else:
+            options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+            writer = self.pa.ipc.new_file(tmp, self.schema, options=options)
+        return {"writer": writer, "path": path, "tmp": tmp, "rows": 0, "opened": time.monotonic()}
+
+    def _close_writer(self, partition) -> None:
+        opened = self._writers.pop(partition)
+        opened["writer"].close()
+        replace(opened["tmp"], opened["path"])
+        log.info(f'Closed "{opened["path"]}" holding {opened["rows"]} rows')
+
+    def flush(self) -> None:
+        """
+        Writes all buffered rows as row groups into the open files. Files which reached ``max_file_rows`` or
+        ``max_file_age`` are closed.
+        """
+        for partition in list(self._buffers):
+            self._write_row_group(partition)
+        now = time.monotonic()
+        for partition, opened in list(self._writers.items()):
+            if now - opened["opened"] >= self.max_file_age:
+                self._close_writer(partition)
+
+    def close(self) -> None:
+        """
+        Writes all buffered rows and closes all files, such that they are complete and readable.
+        """
+        for partition in list(self._buffers):
+            self._write_row_group(partition)
+        for partition in list(self._writers):
+            self._close_writer(partition)
+
+
+_suffixes = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def compress_block(data: bytes, compression="gzip", level=6) -> bytes:
+    """
+    Compresses a block of data into a self-contained gzip member or zstd frame. Concatenated blocks form a valid
+    gzip/zstd file, and every block can also be decompressed on its own.
+
+    :param data: the data to compress
+    :type data: bytes
+    :param compression: one of "none", "gzip" or "zstd"
+    :type compression: str
+    :param level: the compression level
+    :type level: int
+    :return: the compressed block
+    :rtype: bytes
+    """
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=level)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return data
+
+
+def decompress_block(data: bytes, compression="gzip") -> bytes:
+    """
+    Reverses ``compress_block``.
+
+    :param data: a compressed block
+    :type data: bytes
+    :param compression: one of "none", "gzip" or "zstd"
+    :type compression: str
+    :return: the decompressed data
+    :rtype: bytes
+    """
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def compression_of(path: str) -> str:
+    """
+    Returns the compression of an output file based on its name.
+
+    :param path: the path of the file
+    :type path: str
+    :return: one of "none", "gzip" or "zstd"
+    :rtype: str
+    """
+    path = path[: -len(".open")] if path.endswith(".open") else path
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def iter_records(path: str):
+    """
+    Yields the records (as dictionaries) stored in an output file. JSON files as written by ``JsonSink`` are loaded one
+    file at a time, JSON lines files - compressed or not - are streamed line by line.
+
+    :param path: the path of the file
+    :type path: str
+    :return: a generator of records
+    """
+    name = path[: -len(".open")] if path.endswith(".open") else path
+    if name.endswith(".json"):
+        with open(path, "r") as fp:
+            yield from json.load(fp)
+        return
+    compression = compression_of(path)
+    if compression == "gzip":
+        stream = gzip.open(path, "rt", encoding="utf-8")
+    elif compression == "zstd":
+        import zstandard
+
+        raw = open(path, "rb")
+        stream = io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True),
+            encoding="utf-8",
+        )
+    else:
+        stream = open(path, "r", encoding="utf-8")
+    with stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def record_date(record, default: str = None) -> str:
+    """
+    Returns the publication date (YYYY-MM-DD) of an article or a record. If it is unknown, ``default`` is returned, or
+    the current date if no default is given.
+
+    :param record: an ``Article`` or a dictionary as returned by ``Article.to_dict``
+    :param default: the date of records without a publication date
+    :type default: str
+    :return: the date in ISO format
+    :rtype: str
+    """
+    value = record.time if isinstance(record, Article) else record.get("time")
+    published = parse_time(value)
+    if published is not None:
+        return published.date().isoformat()
+    return default or datetime.utcnow().date().isoformat()
+
+
+class Manifest:
+    """
+    Keeps track of the files in an output directory in ``manifest.json``. For every file, the range of publication
+    dates, the topics, the number of records and the size in bytes are stored, such that readers can select the files
+    they need without opening them. Updates are guarded by an inter-process lock, as the manifest is rewritten both by
+    the crawler and by maintenance jobs.
+    """
+
+    file_name = "manifest.json"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = join(directory, self.file_name)
+        self.lock = join(directory, "manifest.lock")
+
+    def load(self) -> dict:
+        """
+        :return: a dictionary mapping file names to their manifest entry
+        :rtype: dict
+        """
+        try:
+            with open(self.path, "r") as fp:
+                return json.load(fp)["files"]
+        except FileNotFoundError:
+            return {}
+
+    def update(self, added: dict = None, removed: list = None) -> None:
+        """
+        Adds and removes entries atomically.
+
+        :param added: a dictionary mapping file names to their new manifest entry
+        :type added: dict
+        :param removed: a list of file names whose entries are removed
+        :type removed: list
+        :return: None
+        """
+        with FileLock(self.lock):
+            files = self.load()
+            for name in removed or []:
+                files.pop(name, None)
+            files.update(added or {})
+            tmp = f"{self.path}.{getpid()}.tmp"
+            with open(tmp, "w") as fp:
+                json.dump({"files": files}, fp, indent=1, sort_keys=True)
+            replace(tmp, self.path)
+
+    def select(self, start: str = None, end: str = None, topic: str = None) -> list:
+        """
+        Returns the files which may contain records published between ``start`` and ``end`` (inclusive, YYYY-MM-DD)
+        of the given topic.
+
+        :param start: the first date of interest
+        :type start: str
+        :param end: the last date of interest
+        :type end: str
+        :param topic: the topic of interest
+        :type topic: str
+        :return: a sorted list of file names
+        :rtype: list
+        """
+        return sorted(
+            name
+            for name, entry in self.load().items()
+            if (start is None or entry["last_date"] >= start)
+            and (end is None or entry["first_date"] <= end)
+            and (topic is None or topic in entry["topics"])
+        )
+
+    @staticmethod
+    def entry(records, size, first_date, last_date, topics, compression) -> dict:
+        return {
+            "first_date": first_date,
+            "last_date": last_date,
+            "topics": sorted(topics),
+            "records": records,
+            "bytes": size,
+            "compression": compression,
+        }
+
+
+class RotatingFileSink(Sink):
+    """
+    Appends the articles as JSON lines to a compressed file. Every ``write`` is compressed as an independent gzip
+    member or zstd frame, such that the file is always a valid gzip/zstd stream up to the last completed write.
+    Files are named ``{prefix}_{YYYYmmddHHMMSS}_{pid}_{n}.jsonl[.gz|.zst]`` and carry an additional ``.open`` suffix while
+    they are being written. A file is closed and registered in the manifest once it exceeds ``max_bytes`` or is older
+    than ``max_age`` seconds. While a file is open, its process holds an advisory lock on ``{file}.open.lock``; files
+    whose lock is free were left open by a process which died and are recovered on start-up. Deltas are appended the
+    same way to files in the ``deltas`` subdirectory.
+
+    zstd compression requires the optional ``zstandard`` package.
+
+    :param directory: the directory the files are written into
+    :param compression: one of "none", "gzip" or "zstd"
+    :param level: the compression level
+    :param max_bytes: the size after which a file is rotated
+    :param max_age: the age in seconds after which a file is rotated
+    :param prefix: the prefix of the file names
+    """
+
+    _open_name = re.compile(r"_(\d+)_\d+\.jsonl(\.gz|\.zst)?\.open$")
+
+    def __init__(
+        self,
+        directory="archive",
+        compression="gzip",
+        level=6,
+        max_bytes=64 * 1024 ** 2,
+        max_age=24 * 3600,
+        prefix="faz",
+    ):
+        assert compression in _suffixes
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError(
+                    "zstd compression requires zstandard. Install it via 'pip install zstandard'"
+                ) from e
+        self.directory = directory
+        self.compression = compression
+        self.level = level
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prefix = prefix
+        self.manifest = Manifest(directory)
+        self._file = None
+        self._sequence = 0
+        self._deltas = None
+        if not isdir(directory):
+            makedirs(directory)
+        self._recover()
+
+    def _open(self) -> None:
+        ts = strftime("%Y%m%d%H%M%S", gmtime())
+        self._sequence += 1
+        self.name = f"{self.prefix}_{ts}_{getpid()}_{self._sequence}.jsonl{_suffixes[self.compression]}"
+        self.path = join(self.directory, self.name)
+        # Held while the file is open, such that other processes know that it is not orphaned
+        self._lock = FileLock(self.path + ".open.lock", blocking=False)
+        self._lock.acquire()
+        self._file = open(self.path + ".open", "ab")
+        self._opened = time.monotonic()
+        self._records = 0
+        self._topics = set()
+        self._first_date = self._last_date = None
+        log.info(f'Writing data to "{self.path}"')
+
+    def write(self, articles: list, topic: str = None) -> None:
+        if not articles:
+            return
+        if self._file is None:
+            self._open()
+        lines = [(article.to_json() + "\n").encode("utf-8") for article in articles]
+        block = compress_block(b"".join(lines), self.compression, self.level)
+        offset = self._file.tell()
+        self._file.write(block)
+        self._records += len(articles)
+        for article in articles:
+            self._topics.add(article.section or topic or "unknown")
+            date = record_date(article)
+            if self._first_date is None or date < self._first_date:
+                self._first_date = date
+            if self._last_date is None or date > self._last_date:
+                self._last_date = date
+        self._block_written(offset, len(block), articles, lines)
+        if (
+            offset + len(block) >= self.max_bytes
+            or time.monotonic() - self._opened >= self.max_age
+        ):
+            self.rotate()
+
+    def _block_written(
+        self, offset: int, length: int, articles: list, lines: list
+    ) -> None:
+        """
+        Called after each block has been appended to the current file. Subclasses can use it to maintain sidecar data.
+
+        :param offset: the position of the compressed block in the file
+        :param length: the length of the compressed block
+        :param articles: the articles in the block
+        :param lines: the encoded, uncompressed JSON line of each article
+        """
+
+    def write_deltas(self, deltas: list) -> None:
+        if self._deltas is None:
+            self._deltas = RotatingFileSink(
+                join(self.directory, "deltas"),
+                self.compression,
+                self.level,
+                self.max_bytes,
+                self.max_age,
+                self.prefix,
+            )
+        self._deltas.write([Article.from_dict(delta) for delta in deltas])
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            fsync(self._file.fileno())
+        if self._deltas is not None:
+            self._deltas.flush()
+
+    def rotate(self) -> None:
+        """
+        Closes the current file, removes its ``.open`` suffix and registers it in the manifest.
+        """
+        if self._file is None:
+            return
+        self.flush()
+        size = self._file.tell()
+        self._file.close()
+        self._file = None
+        replace(self.path + ".open", self.path)
+        self.manifest.update({self.name: self._manifest_entry(size)})
+        self._release_lock(self._lock, self.path + ".open.lock")
+        log.info(f'Closed "{self.path}" holding {self._records} records')
+
+    def _manifest_entry(self, size: int) -> dict:
+        """
+        Returns the manifest entry of the file being closed. Subclasses can add fields.
+
+        :param size: the size of the file in bytes
+        :type size: int
+        :return: the manifest entry
+        :rtype: dict
+        """
+        return Manifest.entry(
+            self._records,
+            size,
+            self._first_date,
+            self._last_date,
+            self._topics,
+            self.compression,
+        )
+
+    def close(self) -> None:
+        self.rotate()
+        if self._deltas is not None:
+            self._deltas.close()
+
+    @staticmethod
+    def _release_lock(lock: FileLock, path: str) -> None:
+        lock.release()
+        if exists(path):
+            remove(path)
+
+    def _recover(self) -> None:
+        """
+        Finalizes ``.open`` files whose writing process is no longer running, which is detected by the lock file it
+        held while writing: the advisory lock is released by the operating system when the process dies. The readable
+        records are rewritten into a new file, such that a block which was only partially written before the crash is
+        dropped. On platforms without ``fcntl`` the writing process cannot be detected and nothing is recovered.
+        """
+        try:
+            import fcntl  # noqa: F401
+        except ImportError:
+            orphans = [name for name in listdir(self.directory) if self._open_name.search(name)]
+            if orphans:
+                log.warning(
+                    f"Cannot tell whether {len(orphans)} open files are orphaned without fcntl, not recovering them"
+                )
+            return
+        for name in sorted(listdir(self.directory)):
+            if not self._open_name.search(name):
+                continue
+            path = join(self.directory, name)
+            lock = FileLock(f"{path}.lock", blocking=False)
+            if not lock.acquire():
+                continue
+            if not exists(path):
+                # closed by its process in the meantime
+                self._release_lock(lock, f"{path}.lock")
+                continue
+            records = []
+            try:
+                for record in iter_records(path):
+                    records.append(record)
+            except (EOFError, OSError, ValueError) as e:
+                log.warning(f'"{path}" is truncated, recovering {len(records)} records: {e}')
+            log.info(f'Recovering {len(records)} records from "{path}"')
+            self.write([Article.from_dict(record) for record in records])
+            self.rotate()
+            remove(path)
+            if exists(f"{path}.idx"):
+                remove(f"{path}.idx")
+            self._release_lock(lock, f"{path}.lock")
@@ -0,0 +1,296 @@
+"""
+This module computes text statistics of articles: the number of words and sentences, the mean and maximum sentence
+length, a readability score and the density of external references.
+
+The statistics are computed for a whole batch of articles at once. The texts of the batch are joined and converted into
+one array of code points, and words, syllables and sentence ends are found with NumPy operations on that array instead
+of per-article Python loops. The readability score is the Flesch reading ease adapted to German by Amstad:
+
+    180 - words per sentence - 58.5 * syllables per word
+
+Syllables are approximated by groups of consecutive vowels, sentence ends by groups of ".", "!" and "?" which are not
+followed by a lower case letter or digit. Points and commas between two digits are part of a number. The reference
+density is the number of external references per 1000 words.
+
+``TextStatistics`` can be used as a stage of the scraper (see ``-stats`` in ``app.py``) or as batch job over existing
+output files. numpy is an optional dependency and only imported when statistics are computed.
+
+Usage:
+    python src/text_stats.py --input daily --output enriched
+    python src/text_stats.py --input daily
+"""
+from __future__ import annotations
+import argparse
+from functools import lru_cache
+from os import listdir
+from os.path import isdir, isfile, join
+import time
+
+from article import Article
+from sinks import RotatingFileSink, iter_records
+from utilities import Logger
+
+log = Logger.get_logger(__name__)
+
+fields = (
+    "word_count",
+    "sentence_count",
+    "mean_sentence_length",
+    "max_sentence_length",
+    "readability",
+    "reference_density",
+)
+
+_table_size = 0x3000
+_vowels = "aeiouyäöüáàâéèêíìîóòôúùûAEIOUYÄÖÜÁÀÂÉÈÊÍÌÎÓÒÔÚÙÛ"
+_terminators = ".!?"
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "The text statistics require numpy. Install it via 'pip install numpy'"
+        ) from e
+    return numpy
+
+
+@lru_cache(maxsize=None)
+def _tables() -> tuple:
+    """
+    :return: lookup tables from code point to word character, upper case letter, digit, vowel and sentence terminator.
+        Code points beyond the tables are mapped to the last entry, which is False.
+    :rtype: tuple
+    """
+    np = _numpy()
+    chars = [chr(i) for i in range(_table_size - 1)] + [" "]
+    word = np.array([c.isalnum() for c in chars], dtype=bool)
+    upper = np.array([c.isupper() for c in chars], dtype=bool)
+    digit = np.zeros(_table_size, dtype=bool)
+    digit[[ord(c) for c in "0123456789"]] = True
+    vowel = np.zeros(_table_size, dtype=bool)
+    vowel[[ord(c) for c in _vowels]] = True
+    terminator = np.zeros(_table_size, dtype=bool)
+    terminator[[ord(c) for c in _terminators]] = True
+    return word, upper, digit, vowel, terminator
+
+
+def _starts(mask):
+    """
+    :return: a mask of the positions at which a run of True values starts
+    """
+    np = _numpy()
+    if not len(mask):
+        return mask
+    previous = np.empty_like(mask)
+    previous[0] = False
+    previous[1:] = mask[:-1]
+    return mask & ~previous
+
+
+def text_statistics(texts: list, references: list = None) -> dict:
+    """
+    Computes the statistics of a batch of texts.
+
+    :param texts: the texts. None is treated as an empty text
+    :type texts: list
+    :param references: the number of external references per text, used for the reference density
+    :type references: list
+    :return: a dictionary mapping each statistic to an array holding one value per text. Values which are undefined
+        for a text without words are NaN
+    :rtype: dict
+    """
+    np = _numpy()
+    n = len(texts)
+    if not n:
+        return {field: np.empty(0) for field in fields}
+    texts = [text or "" for text in texts]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+    joined = "\n".join(texts)
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    codes = np.minimum(codes, _table_size - 1)
+    doc = np.repeat(np.arange(n), lengths + 1)[: len(codes)]
+    word_table, upper_table, digit_table, vowel_table, terminator_table = _tables()
+    is_word = word_table[codes]
+    is_digit = digit_table[codes]
+    in_number = np.zeros(len(codes), dtype=bool)
+    in_number[1:-1] = (
+        ((codes[1:-1] == ord(".")) | (codes[1:-1] == ord(",")))
+        & is_digit[:-2]
+        & is_digit[2:]
+    )
+    is_word |= in_number
+    word_start = _starts(is_word)
+    words = np.bincount(doc[word_start], minlength=n)
+    syllables = np.bincount(doc[_starts(vowel_table[codes])], minlength=n)
+    syllables = np.maximum(syllables, words)
+
+    is_terminator = terminator_table[codes] & ~in_number
+    following = np.ones(len(codes), dtype=bool)
+    following[:-1] = ~is_terminator[1:] & (~is_word[1:] | upper_table[codes[1:]])
+    sentence_end = is_terminator & following
+    # the separators between two texts end the last sentence of a text
+    sentence_end[np.cumsum(lengths[:-1] + 1) - 1] = True
+    ends_before = np.cumsum(sentence_end) - sentence_end
+    sentence_of_word = ends_before[word_start]
+    sentence_lengths = np.bincount(sentence_of_word)
+    sentence_doc = np.zeros(len(sentence_lengths), dtype=np.int64)
+    sentence_doc[sentence_of_word] = doc[word_start]
+    non_empty = sentence_lengths > 0
+    sentences = np.bincount(sentence_doc[non_empty], minlength=n)
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, sentence_doc[non_empty], sentence_lengths[non_empty])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_sentence_length = np.where(sentences > 0, words / sentences, np.nan)
+        syllables_per_word = np.where(words > 0, syllables / words, np.nan)
+        readability = 180 - mean_sentence_length - 58.5 * syllables_per_word
+        if references is None:
+            reference_density = np.full(n, np.nan)
+        else:
+            counts = np.array([r or 0 for r in references], dtype=np.float64)
+            reference_density = np.where(words > 0, counts * 1000 / words, np.nan)
+    return {
+        "word_count": words,
+        "sentence_count": sentences,
+        "mean_sentence_length": mean_sentence_length,
+        "max_sentence_length": longest,
+        "readability": readability,
+        "reference_density": reference_density,
+    }
+
+
+class TextStatistics:
+    """
+    A pipeline stage which adds the text statistics to each article of a batch.
+
+    :param precision: the number of decimals the float statistics are rounded to
+    """
+
+    def __init__(self, precision=2):
+        _numpy()
+        self.precision = precision
+        self.processed = 0
+
+    def process(self, articles: list) -> list:
+        """
+        :param articles: the parsed articles
+        :type articles: list
+        :return: the same articles, holding the statistics
+        :rtype: list
+        """
+        np = _numpy()
+        statistics = text_statistics(
+            [article.text for article in articles],
+            [article.nr_external_references for article in articles],
+        )
+        for field, values in statistics.items():
+            if values.dtype.kind == "f":
+                values = np.round(values, self.precision)
+                values = [None if np.isnan(v) else v for v in values.tolist()]
+            else:
+                values = values.tolist()
+            for article, value in zip(articles, values):
+                setattr(article, field, value)
+        self.processed += len(articles)
+        return articles
+
+    def close(self) -> None:
+        log.info(f"Computed the text statistics of {self.processed} articles")
+
+
+def _input_files(paths: list) -> list:
+    """
+    :return: the given files and the article files found in the given directories, see ``compaction.is_article_file``
+    :rtype: list
+    """
+    from compaction import is_article_file
+
+    files = []
+    for path in paths:
+        if isdir(path):
+            files.extend(
+                join(path, name)
+                for name in sorted(listdir(path))
+                if is_article_file(name)
+            )
+        elif isfile(path):
+            files.append(path)
+    return files
+
+
+def run_batch(inputs: list, output: str = None, batch_size=1000, precision=2) -> float:
+    """
+    Computes the statistics of all articles stored in the input files. The enriched articles are written into a
+    ``RotatingFileSink`` in ``output``; without output only the throughput is measured.
+
+    :param inputs: the files or directories of output files to read
+    :type inputs: list
+    :param output: the directory the enriched articles are written into
+    :type output: str
+    :param batch_size: the number of articles processed at once
+    :type batch_size: int
+    :param precision: the number of decimals the float statistics are rounded to
+    :type precision: int
+    :return: the throughput in articles per second, excluding reading and writing
+    :rtype: float
+    """
+    stage = TextStatistics(precision)
+    sink = RotatingFileSink(directory=output) if output else None
+    elapsed = 0.0
+
+    def process(batch):
+        nonlocal elapsed
+        start = time.perf_counter()
+        stage.process(batch)
+        elapsed += time.perf_counter() - start
+        if sink is not None:
+            sink.write(batch)
+
+    try:
+        batch = []
+        for path in _input_files(inputs):
+            for record in iter_records(path):
+                batch.append(Article.from_dict(record))
+                if len(batch) >= batch_size:
+                    process(batch)
+                    batch = []
+        if batch:
+            process(batch)
+    finally:
+        if sink is not None:
+            sink.close()
+        stage.close()
+    throughput = stage.processed / elapsed if elapsed else 0.0
+    log.info(
+        f"Processed {stage.processed} articles in {elapsed:.3f}s ({throughput:.0f} articles/s)"
+    )
+    return throughput
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the text statistics of the articles in existing output files."
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        action="append",
+        help="An output file or a directory of output files. Can be given several times",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        default=None,
+        help="The directory the enriched articles are written into. Without, only the throughput is measured",
+    )
+    parser.add_argument(
+        "--batch_size", default=1000, type=int, help="The number of articles processed at once"
+    )
+    parser.add_argument(
+        "--precision", default=2, type=int, help="The number of decimals of the float statistics"
+    )
+    args = parser.parse_args()
+    Logger.configure()
+    run_batch(args.input or ["."], args.output, args.batch_size, args.precision)
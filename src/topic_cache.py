@@ -0,0 +1,135 @@
+"""
+This module keeps the topic map - the dictionary of topics and their section links built by ``get_topics`` - between
+runs, such that the home page, the heaviest page of a run, is not downloaded and parsed on every run.
+
+The map is stored in a JSON file together with the validators of the home page response (``ETag``, ``Last-Modified``)
+and a hash of the map. While the map is younger than ``ttl`` seconds, it is used without any request. Afterwards, the
+home page is requested conditionally: on ``304 Not Modified`` the cached map is used for another ``ttl`` seconds,
+otherwise the menu is parsed again and its hash compared with the cached one. Changes to the set of sections are logged
+as a diff. A menu without any topic, e.g. an error page or a changed menu class, is not stored: the cached map is kept
+and revalidated again by the next run.
+
+Example:
+    1 scraper.topic_cache = TopicCache("topics.json", ttl=86400)
+    2 scraper.get_topics()
+"""
+from __future__ import annotations
+from hashlib import blake2b
+import json
+from os import replace
+from os.path import exists
+import time
+
+from utilities import Logger, Metrics
+
+log = Logger.get_logger(__name__)
+
+
+def topics_hash(topics: dict) -> str:
+    """
+    :param topics: the topic map
+    :type topics: dict
+    :return: a hash of the map, independent of the order of the topics
+    :rtype: str
+    """
+    return blake2b(
+        json.dumps(topics, sort_keys=True).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+class TopicCache:
+    """
+    A JSON file holding the topic map and the validators of the home page.
+
+    :param path: the JSON file
+    :param ttl: the number of seconds the map is used without revalidating it
+    """
+
+    def __init__(self, path="topics.json", ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self.entry = {}
+        if exists(path):
+            with open(path, "r") as fp:
+                self.entry = json.load(fp)
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(self.entry, fp)
+        replace(tmp, self.path)
+
+    def fresh(self) -> dict:
+        """
+        :return: the cached topic map if it is younger than ``ttl`` seconds, else None
+        :rtype: dict
+        """
+        if self.entry and time.time() - self.entry["validated"] < self.ttl:
+            Metrics.increment("topic_cache.hits")
+            log.info(f"Using the {len(self.entry['topics'])} cached topics")
+            return dict(self.entry["topics"])
+        return None
+
+    def validators(self) -> dict:
+        """
+        :return: the headers of a conditional request of the home page
+        :rtype: dict
+        """
+        headers = {}
+        if self.entry.get("etag"):
+            headers["If-None-Match"] = self.entry["etag"]
+        if self.entry.get("last_modified"):
+            headers["If-Modified-Since"] = self.entry["last_modified"]
+        return headers
+
+    def revalidated(self) -> dict:
+        """
+        Records that the home page did not change and returns the cached topic map.
+
+        :return: the cached topic map
+        :rtype: dict
+        """
+        Metrics.increment("topic_cache.not_modified")
+        self.entry["validated"] = time.time()
+        self._save()
+        log.info("The home page did not change, using the cached topics")
+        return dict(self.entry["topics"])
+
+    def store(self, topics: dict, headers=None) -> dict:
+        """
+        Stores a freshly parsed topic map and logs how it differs from the cached one. An empty map is not stored.
+
+        :param topics: the topic map
+        :type topics: dict
+        :param headers: the headers of the home page response
+        :type headers: dict
+        :return: the topic map to use: the parsed one, or the cached one if the parsed one is empty
+        :rtype: dict
+        """
+        headers = headers or {}
+        old = self.entry.get("topics")
+        if not topics:
+            Metrics.increment("topic_cache.empty")
+            if old:
+                log.warning(
+                    f"The home page lists no topics, keeping the {len(old)} cached topics"
+                )
+                return dict(old)
+            log.warning("The home page lists no topics")
+            return topics
+        digest = topics_hash(topics)
+        if old is not None and digest != self.entry.get("hash"):
+            Metrics.increment("topic_cache.changed")
+            added = sorted(set(topics) - set(old))
+            removed = sorted(set(old) - set(topics))
+            moved = sorted(t for t in set(topics) & set(old) if topics[t] != old[t])
+            log.info(f"The topics changed: added {added}, removed {removed}, moved {moved}")
+        self.entry = {
+            "topics": topics,
+            "hash": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "validated": time.time(),
+        }
+        self._save()
+        return topics
@@ -4,19 +4,24 @@ This Module provides some Function which are considered util. They are not neces
 
 In total the following different Utilities classes are provided:
  - Logger: this class initializes a logging instance which can be used to log all activities.
+ - Metrics: this class holds process wide counters, e.g. how often a code path was taken.
  - ClassAttrHandler: this class provides some functionalities with respect to classes and their respective attributes.
  - Decorators: this class provides a set of different Decorators which can be used to add functionalities to functions
 
 """
-from os.path import isdir, join
+from os.path import isdir, isfile, join
 from os import makedirs, stat, environ, getcwd
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from collections import Counter
 from sys import stdout
 from random import random
 import time
 from datetime import datetime
 import json
-import yaml
 import re
 from shutil import rmtree
 from functools import wraps
@@ -25,6 +30,7 @@ from pathlib import Path
 """
 Contains:
 - Logger
+- Metrics
 - yml_reader
 - get_date
 - Dict_to_object
@@ -41,6 +47,7 @@ Contains:
     - container_non_empty
     - class_has_object
 - Size
+- FileLock
 - Project_structure Displayer
 - SubstringFinder
 - Date_Filterer
@@ -49,6 +56,8 @@ Contains:
 
 
 def read_config(conf, obj_notation=False):
+    import yaml
+
     with open(conf, "r") as stream:
         config = yaml.safe_load(stream)
     return config if not obj_notation else Dict_to_Obj(config)
@@ -59,38 +68,231 @@ class Logger:
     This class adds a logging instance which can be imported in other modules and used to track code and activities.
     All logs to are written to stdout and also in a logging file. The logging file is identified via a timestamp and written into ./logs/
 
+    Records are not written by the thread that emits them. Every record is put on a queue and a background listener
+    thread writes it to the file and the terminal, so that logging inside hot loops never blocks on disk or terminal I/O.
+    The log level can be set per module by passing a ``levels`` dictionary to ``configure``.
+
+    Importing this module has no side effects: neither the log directory nor the log file is created until an
+    entry point calls ``Logger.configure``. Until then, records are handled by the logging module's defaults.
+
     Usage: Import this class at the beginning of a module. You can then access the log attribute and use it as a logging instance
     Example:
         File: Costume_Module_py
 
         1 from Utilities import Logger
-        2 log = Logger.log
+        2 log = Logger.get_logger(__name__)
         ...
         10. log.info('Control is here')
         ...
         18 log.error('Function "foo()" did not return a valid value')
     """
 
-    if not isdir("logs"):
-        makedirs("logs")
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s,%(msecs)d - file: %(module)s  - func: %(funcName)s - line: %(lineno)d - %(levelname)s - msg: %(message)s",
-        datefmt="%H:%M:%S",
-        handlers=[
+    log_format = "%(asctime)s,%(msecs)d - file: %(module)s  - func: %(funcName)s - line: %(lineno)d - %(levelname)s - msg: %(message)s"
+    date_format = "%H:%M:%S"
+    log = logging.getLogger(__name__)
+    _listener = None
+    _queue_handler = None
+
+    @classmethod
+    def configure(cls, level="INFO", directory="logs", levels=None) -> None:
+        """
+        Installs a ``QueueHandler`` on the root logger and starts a ``QueueListener`` which writes all records to a
+        log file and to stdout in a background thread. Calling it again replaces the previous configuration.
+
+        :param level: the level of the root logger
+        :type level: str
+        :param directory: the directory the log file is written into
+        :type directory: str
+        :param levels: a dictionary mapping module names to their log level, e.g. {"Webscraper": "WARNING"}
+        :type levels: dict
+        :return: None
+        """
+        cls.shutdown()
+        if not isdir(directory):
+            makedirs(directory)
+        formatter = logging.Formatter(cls.log_format, datefmt=cls.date_format)
+        handlers = [
             logging.FileHandler(
                 join(
-                    "logs",
+                    directory,
                     "log_{0}_{1}".format(
                         __name__, time.strftime("%Y-%m-%d", time.gmtime())
                     ),
                 )
             ),
             logging.StreamHandler(stdout),
-        ],
-    )
-    log = logging.getLogger(__name__)
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = SimpleQueue()
+        root = logging.getLogger()
+        cls._queue_handler = QueueHandler(log_queue)
+        root.addHandler(cls._queue_handler)
+        root.setLevel(level)
+        for module, module_level in (levels or {}).items():
+            logging.getLogger(module).setLevel(module_level)
+        cls._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        cls._listener.start()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Stops the background listener after all queued records have been written and removes the queue handler.
+
+        :return: None
+        """
+        if cls._listener is not None:
+            cls._listener.stop()
+            for handler in cls._listener.handlers:
+                handler.close()
+            cls._listener = None
+        if cls._queue_handler is not None:
+            logging.getLogger().removeHandler(cls._queue_handler)
+            cls._queue_handler = None
+
+    @staticmethod
+    def get_logger(name: str) -> logging.Logger:
+        """
+        Returns the logger of a module. Its level can be set independently via the ``levels`` argument of ``configure``.
+
+        :param name: the name of the module, usually ``__name__``
+        :type name: str
+        :return: the logger of the module
+        :rtype: logging.Logger
+        """
+        return logging.getLogger(name)
+
+    @staticmethod
+    def sampled(logger: logging.Logger, every=100, interval=None) -> "SampledLogger":
+        """
+        Wraps a logger such that only every n-th message is emitted. Use it for per-article events.
+
+        :param logger: the logger to wrap
+        :type logger: logging.Logger
+        :param every: only every ``every``-th message is emitted
+        :type every: int
+        :param interval: optional minimum number of seconds between two emitted messages
+        :type interval: float
+        :return: the sampled logger
+        :rtype: SampledLogger
+        """
+        return SampledLogger(logger, every, interval)
+
+
+class SampledLogger:
+    """
+    A thin wrapper around a logger which emits only every n-th ``debug``/``info`` message and optionally at most one
+    message per ``interval`` seconds. The number of suppressed messages is appended to each emitted message.
+    """
+
+    def __init__(self, logger, every=100, interval=None):
+        self.logger = logger
+        self.every = max(int(every), 1)
+        self.interval = interval
+        self._calls = 0
+        self._suppressed = 0
+        self._last_emit = 0.0
+        self._lock = Lock()
+
+    def _should_emit(self):
+        """
+        :return: None if the message is suppressed, else the number of messages suppressed since the last one emitted
+        :rtype: int
+        """
+        with self._lock:
+            self._calls += 1
+            now = time.monotonic()
+            emit = (self._calls - 1) % self.every == 0 and (
+                not self.interval or now - self._last_emit >= self.interval
+            )
+            if not emit:
+                self._suppressed += 1
+                return None
+            self._last_emit = now
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def log(self, level, msg, *args) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._should_emit()
+        if suppressed is None:
+            return
+        if suppressed:
+            msg = f"{msg} ({suppressed} similar messages suppressed)"
+        self.logger.log(level, msg, *args, stacklevel=3)
+
+    def debug(self, msg, *args) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args) -> None:
+        self.log(logging.INFO, msg, *args)
+
+
+class Metrics:
+    """
+    Process wide counters, e.g. how often a fast path sufficed or how many bytes were downloaded. Counters are
+    identified by dotted names and are safe to increment from several threads.
+
+    Example:
+        1 Metrics.increment("metadata.fast_path")
+        2 Metrics.ratio("metadata.fast_path", "metadata.pages")
+        3 Metrics.log_summary()
+    """
+
+    _counters = Counter()
+    _lock = Lock()
+
+    @classmethod
+    def increment(cls, name: str, value=1) -> None:
+        with cls._lock:
+            cls._counters[name] += value
+
+    @classmethod
+    def get(cls, name: str):
+        return cls._counters.get(name, 0)
+
+    @classmethod
+    def ratio(cls, name: str, total: str) -> float:
+        """
+        :param name: the counter of the hits
+        :type name: str
+        :param total: the counter of all attempts
+        :type total: str
+        :return: the share of ``name`` in ``total`` or None if ``total`` is zero
+        :rtype: float
+        """
+        denominator = cls.get(total)
+        return cls.get(name) / denominator if denominator else None
+
+    @classmethod
+    def snapshot(cls, prefix: str = "") -> dict:
+        """
+        :param prefix: only counters starting with this prefix are returned
+        :type prefix: str
+        :return: a copy of the counters
+        :rtype: dict
+        """
+        with cls._lock:
+            return {
+                name: value
+                for name, value in sorted(cls._counters.items())
+                if name.startswith(prefix)
+            }
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._counters.clear()
 
+    @classmethod
+    def log_summary(cls, logger: logging.Logger = None) -> None:
+        logger = logger or log
+        for name, value in cls.snapshot().items():
+            logger.info(f"{name}: {value}")
+
+
+atexit.register(Logger.shutdown)
 
 # This module itself also uses a logging instance.
 log = Logger.log
@@ -331,12 +533,13 @@ class Decorators:
                 t = 1
                 while t <= times:
                     try:
-                        log.info(f'Trying to execute "{func.__name__}" ({t}/{times})')
+                        log.debug(f'Trying to execute "{func.__name__}" ({t}/{times})')
                         res = func(*args, **kwargs)
-                        log.info(f'Succesfully executed "{func.__name__}".')
+                        if t > 1:
+                            log.info(f'Succesfully executed "{func.__name__}".')
                         return res
                     except Exception as e:
-                        log.warning("Execution failed for the following reason:", e)
+                        log.warning(f"Execution failed for the following reason: {e}")
                         t += 1
                         if t <= times:
                             time.sleep(delay)
@@ -372,12 +575,13 @@ class Decorators:
                 t, delay = 1, 2 if not white_noise else 2 + random()
                 while t <= times:
                     try:
-                        log.info(f'Trying to execute "{func.__name__}" ({t}/{times})')
+                        log.debug(f'Trying to execute "{func.__name__}" ({t}/{times})')
                         res = func(*args, **kwargs)
-                        log.info(f'Succesfully executed "{func.__name__}".')
+                        if t > 1:
+                            log.info(f'Succesfully executed "{func.__name__}".')
                         return res
                     except Exception as e:
-                        log.warning("Execution failed for the following reason:", e)
+                        log.warning(f"Execution failed for the following reason: {e}")
                         t += 1
                         if t <= times:
                             log.info(
@@ -576,6 +780,60 @@ def file_size(file):
     return convert_bytes(file_info.st_size)
 
 
+class FileLock:
+    """
+    An advisory, inter-process lock on a lock file. It is used to guard files which are read and rewritten by several
+    processes at once, e.g. the manifest of the output files which is updated by the crawler and by the compaction job.
+    On platforms without ``fcntl`` the lock degrades to a no-op.
+
+    Example:
+        1 with FileLock("output/manifest.lock"):
+        2     ...
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """
+        Acquires the lock.
+
+        :return: True if the lock has been acquired, False if it is held by another process and ``blocking`` is False
+        :rtype: bool
+        """
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        self._fd = open(self.path, "a")
+        flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._fd, flags)
+            return True
+        except OSError:
+            self._fd.close()
+            self._fd = None
+            return False
+
+    def release(self) -> None:
+        if self._fd is not None:
+            import fcntl
+
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise BlockingIOError(f"The lock {self.path} is held by another process")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
 class DisplayablePath(object):
     display_filename_prefix_middle = "├──"
     display_filename_prefix_last = "└──"
@@ -662,31 +920,39 @@ def display_tree(directory):
 
 
 class Date_Filterer:
-    def __init__(self, items, delta_days):
+    """
+    Selects the files which are at least ``delta_days`` older than a reference date. The date of a file is taken from
+    its name, which may either start with a ``YYYY-MM-DD`` date or contain a ``_YYYYmmddHHMMSS`` timestamp as in the
+    ``{topic}_{YYYYmmddHHMMSS}_{pid}_{n}.json`` files written by the scraper. By default, the reference date is the most
+    recent write found among the files.
+    """
+
+    def __init__(self, items, delta_days, reference_date=None):
         self.items = items
         self.delta_days = delta_days
+        self.reference_date = reference_date
         self.unique_write_days = []
         self.days_to_delete = []
 
     @staticmethod
     def as_date_time(date_str):
-        return datetime.strptime(date_str, "%Y-%M-%d")
+        return datetime.strptime(date_str, "%Y-%m-%d")
 
     @staticmethod
     def extract_date_from_name(file: str) -> str:
         """
-        Function used to extract the datetime in a filename
+        Function used to extract the date in a filename
 
         :param file: string of the filename
         :type file: str
-        :return: a substring containing the datetime in YYYYMMDD_HHMM format
+        :return: a substring containing the date in YYYY-MM-DD format
         :rtype: str
         """
-        try:
-            date_time = re.search("^\d{4}[.-]\d{2}[.-]\d{2}\/?", file).group(0)
-            return date_time[:-1]
-        except AttributeError:
-            return ""
+        name = Path(file).name
+        date = re.search(r"^(\d{4})[.-](\d{2})[.-](\d{2})", name) or re.search(
+            r"_(\d{4})(\d{2})(\d{2})\d{6}(?!\d)", name
+        )
+        return "-".join(date.groups()) if date else ""
 
     def get_unique_write_days(self):
         self.unique_write_days = sorted(
@@ -707,23 +973,28 @@ class Date_Filterer:
 
     def get_days_to_delete(self):
         if self.unique_write_days:
-            newest_writes = self.unique_write_days[-1]
+            newest_writes = self.reference_date or self.unique_write_days[-1]
             log.info(f"Most recent write is from {newest_writes}")
-            older_writes = self.unique_write_days[:-1]
             log.info(f"Last recent write is from {self.unique_write_days[0]}")
+            candidates = (
+                self.unique_write_days
+                if self.reference_date
+                else self.unique_write_days[:-1]
+            )
             self.days_to_delete = [
                 day
-                for day in older_writes
+                for day in candidates
                 if (self.as_date_time(newest_writes) - self.as_date_time(day)).days
                 >= self.delta_days
             ]
-            return self
+        return self
 
     def get_files_to_delete(self):
+        days_to_delete = set(self.days_to_delete)
         files_to_delete = [
             file
             for file in self.items
-            if any([file.startswith(day) for day in self.days_to_delete])
+            if self.extract_date_from_name(file) in days_to_delete
         ]
         if files_to_delete:
             log.info(
@@ -812,7 +1083,7 @@ class Project_Initializer(Logger):
     # def create makefile
     def __init__(
         self,
-        user=environ["USERNAME"],
+        user=environ.get("USERNAME", ""),
         e_mail="John.Doe@ibm.com",
         python_version="3.7",
         main_file="app.py",
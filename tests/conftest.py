@@ -0,0 +1,29 @@
+from os.path import abspath, dirname, join
+import sys
+
+import pytest
+
+# The modules in src are imported as top level modules, as app.py does
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def make_article():
+    """
+    :return: a factory of articles with a link, section, publication time and text
+    """
+    from article import Article
+
+    def make(n, section="politik", day="2020-04-01", **fields):
+        fields.setdefault("headline", f"Headline {n}")
+        fields.setdefault("text", f"Text of article {n}")
+        fields.setdefault("crawled", "2020-04-02T00:00:00Z")
+        return Article(
+            link=f"https://www.faz.net/aktuell/{section}/artikel-{n}.html",
+            section=section,
+            newspaper="faz",
+            time=f"{day}T10:00:00+02:00",
+            **fields,
+        )
+
+    return make
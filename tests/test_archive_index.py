@@ -0,0 +1,103 @@
+"""
+Round trips through the offset index: records written by ``IndexedFileSink`` or the compaction must be found by
+``ArchiveIndex``, including the file which is still being written.
+"""
+import pytest
+
+from archive_index import ArchiveIndex, IndexedFileSink, filter_contains, key_filter, link_hash
+from compaction import Compactor
+from sinks import Manifest
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return str(tmp_path / "archive")
+
+
+def test_key_filter_contains_its_keys():
+    import base64
+
+    keys = [link_hash(f"https://www.faz.net/{n}") for n in range(1000)]
+    array = base64.b64decode(key_filter(keys))
+    assert all(filter_contains(array, key) for key in keys)
+    others = [link_hash(f"https://www.faz.net/other/{n}") for n in range(1000)]
+    assert sum(filter_contains(array, key) for key in others) < 50
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_get_and_scan_closed_files(archive, make_article, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    articles = [
+        make_article(n, section=section, day=day)
+        for n, (section, day) in enumerate(
+            [("politik", "2020-04-01"), ("sport", "2020-04-01"), ("politik", "2020-04-03")]
+        )
+    ]
+    sink = IndexedFileSink(archive, compression=compression, max_bytes=1)
+    for article in articles:
+        sink.write([article], article.section)
+    sink.close()
+    assert all(entry["keys"] for entry in Manifest(archive).load().values())
+    index = ArchiveIndex([archive])
+    try:
+        for article in articles:
+            assert index.get(article.link) == article.to_dict()
+        assert index.get("https://www.faz.net/missing.html") is None
+        assert [r["link"] for r in index.scan(start="2020-04-01", end="2020-04-02")] == [
+            articles[0].link,
+            articles[1].link,
+        ]
+        assert [r["link"] for r in index.scan(section="politik")] == [articles[0].link, articles[2].link]
+    finally:
+        index.close()
+
+
+def test_get_reads_the_open_file(archive, make_article):
+    sink = IndexedFileSink(archive)
+    index = ArchiveIndex([archive])
+    try:
+        sink.write([make_article(0)], "politik")
+        assert index.get(make_article(0).link) == make_article(0).to_dict()
+        sink.write([make_article(1)], "politik")
+        assert index.get(make_article(1).link) == make_article(1).to_dict()
+        assert [r["link"] for r in index.scan()] == [make_article(0).link, make_article(1).link]
+        sink.close()
+        assert index.get(make_article(1).link) == make_article(1).to_dict()
+    finally:
+        index.close()
+
+
+def test_get_returns_the_newest_crawl(archive, make_article):
+    sink = IndexedFileSink(archive, max_bytes=1)
+    newer = make_article(0, crawled="2020-04-05T00:00:00Z", headline="Newer")
+    older = make_article(0, crawled="2020-04-02T00:00:00Z", headline="Older")
+    # The newer crawl is written first, the order of the files must not matter
+    sink.write([newer], "politik")
+    sink.write([older], "politik")
+    sink.close()
+    index = ArchiveIndex([archive])
+    try:
+        assert index.get(newer.link)["headline"] == "Newer"
+    finally:
+        index.close()
+
+
+def test_compacted_partitions_are_indexed(tmp_path, archive, make_article):
+    sink = IndexedFileSink(archive, max_bytes=1)
+    articles = [make_article(n, day=f"2020-04-0{1 + n % 2}") for n in range(4)]
+    for article in articles:
+        sink.write([article], "politik")
+    sink.close()
+    target = str(tmp_path / "daily")
+    Compactor([archive], target, min_age=0).run()
+    manifest = Manifest(target).load()
+    assert sorted(manifest) == ["2020-04-01.jsonl.gz", "2020-04-02.jsonl.gz"]
+    assert all(entry["keys"] for entry in manifest.values())
+    index = ArchiveIndex([target])
+    try:
+        for article in articles:
+            assert index.get(article.link) == article.to_dict()
+        assert sorted(r["link"] for r in index.scan(start="2020-04-02")) == [articles[1].link, articles[3].link]
+    finally:
+        index.close()
@@ -0,0 +1,33 @@
+"""
+The slotted article record: conversions, unknown fields and the hash it is stored under in sets and dictionaries.
+"""
+import json
+
+from article import Article
+
+
+def test_dict_and_json_round_trip(make_article):
+    article = make_article(0, comments=3, topic_rank=7)
+    record = article.to_dict()
+    assert record["comments"] == 3 and record["topic_rank"] == 7
+    assert "cluster_id" not in record and "extra" not in record
+    assert Article.from_dict(record) == article
+    assert Article.from_dict(json.loads(article.to_json())) == article
+    assert Article.from_dict(dict(record, _id="mongo")).to_dict() == record
+
+
+def test_equal_articles_have_equal_hashes(make_article):
+    first, second = make_article(0), make_article(0)
+    assert first == second and hash(first) == hash(second)
+    assert len({first, second, make_article(1)}) == 2
+    # Articles are mutable: a changed field keeps the article in place in a set
+    articles = {first}
+    first.comments = 5
+    assert first in articles
+
+
+def test_digest_ignores_whitespace_and_engagement(make_article):
+    article = make_article(0, text="Ein  Satz.\n", comments=1)
+    same = make_article(0, text="Ein Satz.", comments=9)
+    changed = make_article(0, text="Ein anderer Satz.")
+    assert article.digest() == same.digest() != changed.digest()
@@ -0,0 +1,140 @@
+"""
+Backfilling archive pages in shards: an interrupted shard continues after its last written page and retries its failed
+links.
+"""
+from datetime import date
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from article import Article  # noqa: E402
+from backfill import Backfill, ShardProgress, make_shards, parse_shard, topic_of_link  # noqa: E402
+from sinks import Sink  # noqa: E402
+
+ARCHIVE = "https://www.faz.net/artikel-chronik/nachrichten-{date:%Y-%m-%d}/"
+DAYS = [date(2020, 4, 1), date(2020, 4, 2)]
+
+
+def article_link(day: date, page: int, n: int) -> str:
+    return f"https://www.faz.net/aktuell/politik/artikel-{day:%m%d}-{page}-{n}.html"
+
+
+def archive_page(day: date, page: int) -> bytes:
+    link = ARCHIVE.format(date=day)
+    anchors = [f'<a class="paginator" href="{link}2/">2</a>']
+    # A paginator link to another day is not followed
+    anchors.append(f'<a class="paginator" href="{ARCHIVE.format(date=date(2020, 3, 31))}">gestern</a>')
+    anchors += [f'<a class="article" href="{article_link(day, page, n)}">Artikel</a>' for n in range(2)]
+    return f"<html><body>{''.join(anchors)}</body></html>".encode()
+
+
+PAGES = {
+    f"{ARCHIVE.format(date=day)}{'' if page == 1 else f'{page}/'}": archive_page(day, page)
+    for day in DAYS
+    for page in (1, 2)
+}
+
+
+class StubScraper:
+    """
+    Serves the archive pages of ``PAGES`` and fails to download the links in ``failing``.
+    """
+
+    root_link = "https://www.faz.net"
+    paginator_class = "paginator"
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.fetched = []
+        self.curr_failed_links = []
+
+    def fetch(self, link):
+        self.fetched.append(link)
+        return PAGES[link]
+
+    def get_article_links(self, soup):
+        return [anchor.attrs["href"] for anchor in soup.find_all("a", class_="article")]
+
+    def download_all_articles_from_curr_topic(self):
+        self.curr_failed_links = [link for link in self.curr_article_all_links if link in self.failing]
+        return [
+            Article(link=link, section=self.curr_topic)
+            for link in self.curr_article_all_links
+            if link not in self.failing
+        ]
+
+    def close(self):
+        pass
+
+
+class RecordingSink(Sink):
+    def __init__(self, on_write=None):
+        self.links = []
+        self.on_write = on_write
+
+    def write(self, articles, topic=None):
+        self.links += [article.link for article in articles]
+        if self.on_write is not None:
+            self.on_write()
+
+
+def all_links() -> list:
+    return [article_link(day, page, n) for day in DAYS for page in (1, 2) for n in range(2)]
+
+
+def test_shards_are_split_among_processes():
+    assert parse_shard("1/3") == (1, 3)
+    with pytest.raises(ValueError):
+        parse_shard("3/3")
+    shards = make_shards(date(2020, 4, 1), date(2020, 4, 10), shard_days=3, index=1, count=2)
+    assert [shard.name for shard in shards] == ["2020-04-04_2020-04-06", "2020-04-10_2020-04-10"]
+    assert topic_of_link("https://www.faz.net/aktuell/politik/inland/artikel.html", "https://www.faz.net") == "politik"
+
+
+def test_progress_never_moves_back(tmp_path):
+    path = str(tmp_path / "shard.json")
+    progress = ShardProgress(path)
+    progress.written(DAYS[1], 2, 5, ["https://www.faz.net/a.html"])
+    progress.written(DAYS[0], 3, 1)
+    progress = ShardProgress(path)
+    assert (progress.day, progress.page, progress.articles) == (DAYS[1], 2, 6)
+    assert progress.failed_links == {"https://www.faz.net/a.html": 1}
+
+
+def test_interrupted_shard_continues_after_its_last_page(tmp_path):
+    (shard,) = make_shards(DAYS[0], DAYS[1], shard_days=2)
+    progress_dir = str(tmp_path / "backfill")
+    sink = RecordingSink()
+    backfill = Backfill(StubScraper(), [sink], [shard], ARCHIVE, progress_dir=progress_dir)
+    # Stops after the first archive page was written
+    sink.on_write = backfill.stop
+    backfill.run_shard(shard)
+    assert sink.links == all_links()[:2]
+    scraper = StubScraper()
+    sink = RecordingSink()
+    Backfill(scraper, [sink], [shard], ARCHIVE, progress_dir=progress_dir).run_shard(shard)
+    assert sink.links == all_links()[2:]
+    assert ShardProgress(f"{progress_dir}/{shard.name}.json").done
+    assert ARCHIVE.format(date=date(2020, 3, 31)) not in scraper.fetched
+
+
+def test_failed_links_are_retried_until_max_attempts(tmp_path):
+    (shard,) = make_shards(DAYS[0], DAYS[1], shard_days=2)
+    progress_dir = str(tmp_path / "backfill")
+    failing = all_links()[0]
+    sink = RecordingSink()
+    Backfill(StubScraper([failing]), [sink], [shard], ARCHIVE, progress_dir=progress_dir, max_attempts=2).run_shard(
+        shard
+    )
+    assert failing not in sink.links and len(sink.links) == 7
+    progress = ShardProgress(f"{progress_dir}/{shard.name}.json")
+    assert not progress.done and progress.failed_links == {failing: 1}
+    # The second attempt fails as well, the third run gives the link up
+    for _ in range(2):
+        sink = RecordingSink()
+        Backfill(StubScraper([failing]), [sink], [shard], ARCHIVE, progress_dir=progress_dir, max_attempts=2).run_shard(
+            shard
+        )
+        assert sink.links == []
+    assert ShardProgress(f"{progress_dir}/{shard.name}.json").done
@@ -0,0 +1,42 @@
+"""
+Splitting the crawl budget across topics with the averages measured so far.
+"""
+from budget import CrawlBudget
+
+
+def test_unlimited_budget_scrapes_everything():
+    budget = CrawlBudget()
+    assert budget.allocate("politik", 120, remaining_topics=3) == 120
+    assert not budget.exhausted()
+
+
+def test_quotas_cap_the_topics():
+    budget = CrawlBudget(topic_quotas={"politik": 10}, default_quota=3)
+    assert budget.allocate("politik", 50) == 10
+    assert budget.allocate("sport", 50) == 3
+    assert budget.allocate("sport", 2) == 2
+
+
+def test_remaining_budget_is_shared_by_the_remaining_topics():
+    budget = CrawlBudget(max_requests=30, requests_per_article=1.5)
+    # 20 articles are assumed to fit, shared by 4 topics
+    assert budget.allocate("politik", 50, remaining_topics=4) == 5
+    for _ in range(10):
+        budget.record(1000)
+    budget.record_articles(5)
+    # 2 requests per article were measured, the 20 requests left suffice for 10 articles
+    assert budget.allocate("sport", 50, remaining_topics=2) == 5
+    # A topic which needs less than its share leaves the rest to the following topics
+    assert budget.allocate("sport", 2, remaining_topics=2) == 2
+    assert budget.allocate("wirtschaft", 50, remaining_topics=1) == 10
+
+
+def test_exhausted_budget():
+    budget = CrawlBudget(max_bytes=1000)
+    budget.record(300)
+    budget.record_articles(1)
+    assert not budget.exhausted()
+    # 100 bytes are left, less than the 450 bytes of an average article
+    budget.record(600)
+    budget.record_articles(1)
+    assert budget.exhausted()
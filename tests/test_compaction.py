@@ -0,0 +1,82 @@
+"""
+Merging the output files into daily partitions: every article is kept once, in its newest crawl.
+"""
+from datetime import date, timedelta
+import json
+from os import listdir
+from os.path import join
+
+from archive_index import ArchiveIndex
+from compaction import Compactor
+from sinks import JsonSink, Manifest, RotatingFileSink, iter_records
+
+
+def partition(target, day) -> list:
+    return list(iter_records(join(target, f"{day}.jsonl.gz")))
+
+
+def test_compact_merges_by_day_and_keeps_the_newest_crawl(tmp_path, make_article):
+    source, target = str(tmp_path / "archive"), str(tmp_path / "daily")
+    sink = RotatingFileSink(source, max_bytes=1)
+    sink.write([make_article(0, crawled="2020-04-05T00:00:00Z", headline="Newer")], "politik")
+    sink.write([make_article(0, crawled="2020-04-02T00:00:00Z", headline="Older")], "politik")
+    sink.write([make_article(1, day="2020-04-02")], "politik")
+    sink.close()
+    JsonSink(source).write([make_article(2, day="2020-04-02", section="sport")], "sport")
+    Compactor([source], target, min_age=0).run()
+    assert [record["headline"] for record in partition(target, "2020-04-01")] == ["Newer"]
+    assert [record["link"] for record in partition(target, "2020-04-02")] == [
+        make_article(1).link,
+        make_article(2, section="sport").link,
+    ]
+    manifest = Manifest(target).load()
+    assert manifest["2020-04-02.jsonl.gz"]["topics"] == ["politik", "sport"]
+    assert Manifest(source).load() == {}
+    assert sorted(listdir(source)) == ["manifest.json", "manifest.lock"]
+
+
+def test_compact_merges_into_existing_partitions(tmp_path, make_article):
+    source, target = str(tmp_path / "archive"), str(tmp_path / "daily")
+    for crawled in ("2020-04-02T00:00:00Z", "2020-04-03T00:00:00Z"):
+        sink = RotatingFileSink(source)
+        sink.write([make_article(0, crawled=crawled), make_article(1, crawled=crawled)], "politik")
+        sink.close()
+        Compactor([source], target, min_age=0).run()
+    records = partition(target, "2020-04-01")
+    assert [record["crawled"] for record in records] == ["2020-04-03T00:00:00Z"] * 2
+    assert Manifest(target).load()["2020-04-01.jsonl.gz"]["records"] == 2
+
+
+def test_retention_deletes_old_partitions(tmp_path, make_article):
+    source, target = str(tmp_path / "archive"), str(tmp_path / "daily")
+    recent = (date.today() - timedelta(days=1)).isoformat()
+    sink = RotatingFileSink(source)
+    sink.write([make_article(0, day="2020-04-01"), make_article(1, day=recent)], "politik")
+    sink.close()
+    Compactor([source], target, min_age=0, retention_days=30).run()
+    assert sorted(Manifest(target).load()) == [f"{recent}.jsonl.gz"]
+    assert not [name for name in listdir(target) if name.startswith("2020-04-01")]
+
+
+def test_sources_of_the_same_day_are_read_in_order_of_creation(tmp_path, make_article):
+    source, target = tmp_path / "archive", str(tmp_path / "daily")
+    source.mkdir()
+    # Without a crawl time, the record of the newest source wins; the names sort against the order of creation
+    for name, headline in [("b_20200401235959.json", "Newer"), ("a_20200401000000.json", "Older")]:
+        (source / name).write_text(json.dumps([dict(make_article(0).to_dict(), crawled=None, headline=headline)]))
+    Compactor([str(source)], target, min_age=0).run()
+    assert [record["headline"] for record in partition(target, "2020-04-01")] == ["Newer"]
+
+
+def test_undated_records_go_to_the_day_of_their_source(tmp_path, make_article):
+    source, target = tmp_path / "archive", str(tmp_path / "daily")
+    source.mkdir()
+    record = dict(make_article(0).to_dict(), time=None)
+    (source / "politik_20200403120000.json").write_text(json.dumps([record]))
+    Compactor([str(source)], target, min_age=0).run()
+    assert partition(target, "2020-04-03") == [record]
+    index = ArchiveIndex([target])
+    try:
+        assert [r["link"] for r in index.scan(start="2020-04-03", end="2020-04-03")] == [record["link"]]
+    finally:
+        index.close()
@@ -0,0 +1,61 @@
+"""
+The shared work queue: links are queued once, leases expire and links are given up after ``max_attempts`` attempts.
+"""
+import pytest
+
+from coordination import SqliteWorkQueue
+
+ITEMS = [(f"https://www.faz.net/aktuell/politik/artikel-{n}.html", "politik") for n in range(3)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SqliteWorkQueue(str(tmp_path / "crawl_queue.db"), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_links_are_queued_once(queue):
+    assert queue.push(ITEMS) == 3
+    assert queue.push(ITEMS[:1] + [("https://www.faz.net/aktuell/sport/artikel-0.html", "sport")]) == 1
+    assert queue.stats() == {"queued": 4}
+
+
+def test_leased_links_are_acknowledged(queue):
+    queue.push(ITEMS)
+    assert queue.lease("a", 2, 300) == ITEMS[:2]
+    assert queue.lease("b", 5, 300) == ITEMS[2:]
+    # Only the worker holding the lease acknowledges a link
+    queue.ack("b", [ITEMS[0][0]])
+    queue.ack("a", [ITEMS[0][0]], [ITEMS[1][0]])
+    assert queue.stats() == {"done": 1, "queued": 1, "leased": 1}
+    assert queue.lease("b", 5, 300) == [ITEMS[1]]
+
+
+def test_expired_leases_are_leased_again_until_max_attempts(queue):
+    queue.push(ITEMS[:1])
+    assert queue.lease("a", 1, -1) == ITEMS[:1]
+    assert queue.lease("b", 1, -1) == ITEMS[:1]
+    # The second lease expired as well, the link is not leased a third time
+    assert queue.lease("c", 1, 300) == []
+    assert queue.requeue_expired() == 1
+    assert queue.stats() == {"failed": 1}
+
+
+def test_failed_links_are_queued_again_until_max_attempts(queue):
+    queue.push(ITEMS[:1])
+    link = ITEMS[0][0]
+    queue.lease("a", 1, 300)
+    queue.ack("a", [], [link])
+    assert queue.stats() == {"queued": 1}
+    queue.lease("a", 1, 300)
+    queue.ack("a", [], [link])
+    assert queue.stats() == {"failed": 1}
+    assert queue.lease("a", 1, 300) == []
+
+
+def test_take_tokens_from_the_bucket(queue):
+    assert queue.take_tokens(rate=1.0, burst=5.0, count=3) == (3, 0.0)
+    assert queue.take_tokens(rate=1.0, burst=5.0, count=3)[0] == 2
+    taken, wait = queue.take_tokens(rate=1.0, burst=5.0, count=3)
+    assert taken == 0 and 2.0 < wait <= 3.0
@@ -0,0 +1,127 @@
+"""
+Polling topics in the daemon: only new links are downloaded, and links whose articles were not written are polled again.
+"""
+import pytest
+
+from article import Article
+from daemon import Daemon, TopicSchedule
+from sinks import Sink
+
+
+class StubScraper:
+    """
+    Lists the links of ``listed`` per topic and fails to download the links in ``failing``.
+    """
+
+    def __init__(self):
+        self.topics = None
+        self.listed = {"politik": [], "sport": []}
+        self.failing = set()
+        self.downloaded = []
+        self.discovery = None
+        self.curr_failed_links = []
+
+    def get_topics(self):
+        self.topics = {topic: f"https://www.faz.net/aktuell/{topic}/" for topic in self.listed}
+
+    def set_topic(self, topic):
+        self.curr_topic = topic
+        return self
+
+    def get_articles_of_topic(self):
+        self.curr_article_all_links = list(self.listed[self.curr_topic])
+        return self
+
+    def download_all_articles_from_curr_topic(self):
+        links = self.curr_article_all_links
+        self.downloaded += links
+        self.curr_failed_links = [link for link in links if link in self.failing]
+        return [Article(link=link, section=self.curr_topic) for link in links if link not in self.failing]
+
+    def close(self):
+        pass
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.links = []
+        self.fail = False
+
+    def write(self, articles, topic=None):
+        if self.fail:
+            raise OSError("disk full")
+        self.links += [article.link for article in articles]
+
+
+class RecordingDiscovery:
+    def __init__(self):
+        self.consumed_links = []
+
+    def consumed(self, topic, links):
+        self.consumed_links += links
+
+
+def link(n) -> str:
+    return f"https://www.faz.net/aktuell/politik/artikel-{n}.html"
+
+
+@pytest.fixture
+def daemon():
+    scraper = StubScraper()
+    daemon = Daemon(scraper, [RecordingSink()], max_seen=3)
+    daemon.refresh_topics()
+    return daemon
+
+
+def test_schedule_adapts_to_the_rate_of_new_links():
+    schedule = TopicSchedule("politik", "", interval=300, min_interval=15, max_interval=1800, smoothing=0.5)
+    # The first poll only sets the baseline
+    assert schedule.update(50, now=0) == 300
+    assert schedule.update(10, now=100) == 15
+    assert schedule.update(0, now=200) == 20
+    assert schedule.update(0, now=300) == 40
+    schedule.backoff(now=300)
+    assert schedule.interval == 80 and schedule.next_poll == 380
+
+
+def test_only_new_links_are_downloaded(daemon):
+    scraper, sink = daemon.scraper, daemon.sinks[0]
+    scraper.listed["politik"] = [link(0), link(1)]
+    assert daemon.poll(daemon.schedules["politik"]) == 2
+    scraper.listed["politik"] = [link(0), link(1), link(2)]
+    assert daemon.poll(daemon.schedules["politik"]) == 1
+    assert scraper.downloaded == [link(0), link(1), link(2)]
+    assert sink.links == [link(0), link(1), link(2)]
+    # Only the newest max_seen links are remembered
+    assert list(daemon.seen) == [link(0), link(1), link(2)]
+    scraper.listed["politik"] = [link(3)]
+    daemon.poll(daemon.schedules["politik"])
+    assert list(daemon.seen) == [link(1), link(2), link(3)]
+
+
+def test_links_which_were_not_written_are_polled_again(daemon):
+    scraper, sink = daemon.scraper, daemon.sinks[0]
+    scraper.discovery = RecordingDiscovery()
+    scraper.listed["politik"] = [link(0), link(1)]
+    scraper.failing = {link(1)}
+    daemon.poll(daemon.schedules["politik"])
+    assert scraper.discovery.consumed_links == [link(0)]
+    scraper.failing = set()
+    sink.fail = True
+    with pytest.raises(OSError):
+        daemon.poll(daemon.schedules["politik"])
+    sink.fail = False
+    assert daemon.poll(daemon.schedules["politik"]) == 1
+    assert sink.links == [link(0), link(1)]
+    assert scraper.discovery.consumed_links == [link(0), link(0), link(1)]
+
+
+def test_removed_topics_are_dropped_from_the_queue(daemon):
+    scraper = daemon.scraper
+    del scraper.listed["sport"]
+    daemon.refresh_topics()
+    assert set(daemon.schedules) == {"politik"}
+    assert [topic for _, topic in daemon._queue] == ["politik"]
+    scraper.listed["sport"] = []
+    daemon.refresh_topics()
+    assert sorted(topic for _, topic in daemon._queue) == ["politik", "sport"]
@@ -0,0 +1,64 @@
+"""
+Near-duplicate tagging, including the articles without text, the batches which were never written and the fingerprints
+saved on flush.
+"""
+from dedup import NearDuplicateDetector
+
+TEXT = " ".join(f"Satz {n} über den Haushalt des Bundes." for n in range(40))
+
+
+def test_near_duplicates_share_a_cluster(make_article):
+    detector = NearDuplicateDetector()
+    original = make_article(0, text=TEXT)
+    edited = make_article(1, text=TEXT.replace("Satz 39", "Absatz 39"))
+    other = make_article(2, text="Ein ganz anderer Bericht über das Wetter am Wochenende in Hessen.")
+    assert detector.process([original, edited, other]) == [original, edited, other]
+    assert original.cluster_id == edited.cluster_id != other.cluster_id
+
+
+def test_duplicates_are_skipped(make_article):
+    detector = NearDuplicateDetector(skip_duplicates=True)
+    original, copy = make_article(0, text=TEXT), make_article(1, text=TEXT.upper())
+    assert detector.process([original, copy]) == [original]
+    assert detector.skipped == 1
+    detector.committed([original])
+    # The same article crawled again is not a duplicate
+    recrawled = make_article(0, text=TEXT)
+    assert detector.process([recrawled]) == [recrawled]
+    assert recrawled.cluster_id == original.cluster_id
+
+
+def test_articles_without_text_are_kept_untagged(make_article):
+    detector = NearDuplicateDetector(skip_duplicates=True)
+    empty = [make_article(n, text=text) for n, text in enumerate([None, "", "  ", "…"])]
+    assert detector.process(empty) == empty
+    assert [article.cluster_id for article in empty] == [None] * 4
+    assert len(detector.fingerprints) == 0
+    assert detector.skipped == 0
+
+
+def test_flush_saves_new_fingerprints(tmp_path, make_article):
+    path = str(tmp_path / "near_duplicates.bin")
+    detector = NearDuplicateDetector(path=path)
+    detector.flush()
+    assert not (tmp_path / "near_duplicates.bin").exists()
+    original = make_article(0, text=TEXT)
+    detector.committed(detector.process([original]))
+    detector.flush()
+    reloaded = NearDuplicateDetector(path=path)
+    edited = make_article(1, text=TEXT.replace("Satz 39", "Absatz 39"))
+    reloaded.process([edited])
+    assert edited.cluster_id == original.cluster_id
+
+
+def test_fingerprints_are_only_added_once_written(make_article):
+    detector = NearDuplicateDetector(skip_duplicates=True)
+    original = make_article(0, text=TEXT)
+    detector.process([original])
+    assert len(detector.fingerprints) == 0
+    # The sinks failed, so the copy in the next batch is the first one written
+    copy = make_article(1, text=TEXT)
+    assert detector.process([copy]) == [copy]
+    detector.committed([copy])
+    assert len(detector.fingerprints) == 1
+    assert detector.process([make_article(2, text=TEXT)]) == []
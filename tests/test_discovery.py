@@ -0,0 +1,109 @@
+"""
+Discovering links from feeds and sitemaps: conditional requests, and links pending until they are written.
+"""
+from io import BytesIO
+
+import pytest
+
+from discovery import FeedDiscovery, iter_entries
+
+FEED = "https://www.faz.net/rss/aktuell/{topic}/"
+SITEMAP = "https://www.faz.net/sitemap-news.xml"
+TOPICS = {"politik": "https://www.faz.net/aktuell/politik/", "sport": "https://www.faz.net/aktuell/sport/"}
+
+
+def link(n) -> str:
+    return f"https://www.faz.net/aktuell/politik/artikel-{n}.html"
+
+
+def rss(*items) -> bytes:
+    entries = "".join(
+        f"<item><link>{link(n)}</link>"
+        + (f"<pubDate>Wed, 0{n} Apr 2020 10:00:00 +0200</pubDate>" if n else "")
+        + "</item>"
+        for n in items
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel>{entries}</channel></rss>'.encode()
+
+
+class StubResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class StubScraper:
+    """
+    Serves the documents of ``pages`` and answers 304 to a request with the current ETag.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+
+    def fetch_response(self, url, headers=None):
+        self.requests.append((url, headers))
+        if url not in self.pages:
+            return StubResponse(404)
+        content, etag = self.pages[url]
+        if headers.get("If-None-Match") == etag:
+            return StubResponse(304)
+        return StubResponse(200, content, {"ETag": etag})
+
+
+@pytest.fixture
+def scraper():
+    return StubScraper()
+
+
+def test_iter_entries_reads_rss_and_atom():
+    atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><entry><link href="https://www.faz.net/a.html"/>
+        <updated>2020-04-08T16:00:00+02:00</updated></entry></feed>"""
+    assert list(iter_entries(BytesIO(atom))) == [("https://www.faz.net/a.html", 1586354400.0)]
+    assert [entry for entry, _ in iter_entries(BytesIO(rss(1, 2)))] == [link(1), link(2)]
+
+
+def test_links_stay_pending_until_consumed(tmp_path, scraper):
+    scraper.pages[FEED.format(topic="politik")] = (rss(1, 2), '"1"')
+    discovery = FeedDiscovery(scraper, feed=FEED, state_path=str(tmp_path / "discovery.json"))
+    assert discovery.links_of_topic("politik", TOPICS) == [link(1), link(2)]
+    # The feed did not change: the request is conditional and the links are still pending
+    assert discovery.links_of_topic("politik", TOPICS) == [link(1), link(2)]
+    assert scraper.requests[-1][1] == {"If-None-Match": '"1"'}
+    discovery.consumed("politik", [link(1)])
+    # The pending links survive a restart
+    discovery = FeedDiscovery(scraper, feed=FEED, state_path=str(tmp_path / "discovery.json"))
+    assert discovery.links_of_topic("politik", TOPICS) == [link(2)]
+    discovery.consumed("politik", [link(2)])
+    assert discovery.links_of_topic("politik", TOPICS) == []
+
+
+def test_only_new_entries_are_returned(tmp_path, scraper):
+    url = FEED.format(topic="politik")
+    scraper.pages[url] = (rss(1, 2), '"1"')
+    discovery = FeedDiscovery(scraper, feed=FEED, state_path=str(tmp_path / "discovery.json"))
+    discovery.consumed("politik", discovery.links_of_topic("politik", TOPICS))
+    scraper.pages[url] = (rss(0, 1, 2, 3), '"2"')
+    # The undated entry is returned once, the entries not newer than the newest one seen are dropped
+    assert discovery.links_of_topic("politik", TOPICS) == [link(0), link(3)]
+    discovery.consumed("politik", [link(0), link(3)])
+    scraper.pages[url] = (rss(0, 3), '"3"')
+    assert discovery.links_of_topic("politik", TOPICS) == []
+
+
+def test_missing_feed_falls_back_to_the_section_page(scraper):
+    discovery = FeedDiscovery(scraper, feed=FEED, state_path=None)
+    assert discovery.links_of_topic("politik", TOPICS) is None
+
+
+def test_sitemap_entries_are_assigned_by_link(scraper):
+    sitemap = f"""<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+        <url><loc>{link(1)}</loc><lastmod>2020-04-01T10:00:00+02:00</lastmod></url>
+        <url><loc>https://www.faz.net/aktuell/sport/artikel-2.html</loc></url>
+        <url><loc>https://www.faz.net/impressum/</loc></url></urlset>"""
+    scraper.pages[SITEMAP] = (sitemap.encode(), '"1"')
+    discovery = FeedDiscovery(scraper, sitemaps=[SITEMAP], state_path=None)
+    assert discovery.links_of_topic("politik", TOPICS) == [link(1)]
+    assert discovery.links_of_topic("sport", TOPICS) == ["https://www.faz.net/aktuell/sport/artikel-2.html"]
+    assert len(scraper.requests) == 1
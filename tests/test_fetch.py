@@ -0,0 +1,97 @@
+"""
+Streaming response bodies: the size limit aborts large bodies early, and the bytes in flight are always released.
+"""
+from threading import Thread
+
+import pytest
+
+from budget import CrawlBudget
+from Webscraper import BodyTooLarge, ByteLimiter, WebScraper
+
+LINK = "https://www.faz.net/aktuell/politik/artikel.html"
+
+
+class StubResponse:
+    """
+    Serves a body in chunks and counts how many of them were read.
+    """
+
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.read = 0
+
+    @property
+    def content(self):
+        return self._content
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+@pytest.fixture
+def scraper():
+    scraper = WebScraper("https://www.faz.net", "topic", "article")
+    scraper.max_body_size = 100
+    scraper.in_flight = ByteLimiter(1000, expected_size=10)
+    yield scraper
+    scraper.close()
+
+
+def serve(scraper, response) -> StubResponse:
+    scraper.session.get = lambda link, headers=None, timeout=None, stream=False: response
+    return response
+
+
+def test_body_is_read_and_recorded(scraper):
+    scraper.budget = CrawlBudget()
+    serve(scraper, StubResponse([b"a" * 40, b"b" * 40]))
+    assert scraper.fetch(LINK) == b"a" * 40 + b"b" * 40
+    assert scraper.budget.requests == 1 and scraper.budget.bytes == 80
+    assert scraper.in_flight.in_flight == 0
+
+
+def test_content_length_over_the_limit_is_not_read(scraper):
+    response = serve(scraper, StubResponse([b"a" * 200], {"Content-Length": "200"}))
+    with pytest.raises(BodyTooLarge):
+        scraper.fetch(LINK)
+    assert response.read == 0
+    assert scraper.in_flight.in_flight == 0
+
+
+def test_streamed_body_over_the_limit_is_aborted(scraper):
+    response = serve(scraper, StubResponse([b"a" * 60] * 5))
+    with pytest.raises(BodyTooLarge):
+        scraper.fetch(LINK)
+    assert response.read == 2
+    assert scraper.in_flight.in_flight == 0
+
+
+def test_reading_stops_once_until_is_true(scraper):
+    response = serve(scraper, StubResponse([b"a", b"</head>", b"b"]))
+    assert scraper.fetch_response(LINK, until=lambda chunk: b"</head>" in chunk).content == b"a</head>"
+    assert response.read == 2
+
+
+def test_byte_limiter_waits_until_the_reservation_fits():
+    limiter = ByteLimiter(100, expected_size=60)
+    # A request is always admitted if nothing is in flight
+    first = limiter.wait()
+    waiter = Thread(target=limiter.wait)
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    limiter.release(first)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert limiter.in_flight == 60
+    limiter.observe(160)
+    assert limiter.expected_size == pytest.approx(80)
@@ -0,0 +1,39 @@
+"""
+The order in which the frontier hands out links, including links pushed again or moved to the front.
+"""
+from frontier import Frontier
+
+
+def test_topics_are_interleaved_by_weight():
+    frontier = Frontier(weights={"politik": 2})
+    for n in range(6):
+        frontier.push(f"https://www.faz.net/politik/{n}", "politik", position=n)
+        frontier.push(f"https://www.faz.net/sport/{n}", "sport", position=n)
+    topics = [topic for _, topic in frontier.pop_batch(6)]
+    assert topics.count("politik") == 4 and topics.count("sport") == 2
+    assert [link for link, _ in frontier.pop_batch(20) if "politik" in link] == [
+        "https://www.faz.net/politik/4",
+        "https://www.faz.net/politik/5",
+    ]
+    assert len(frontier) == 0 and frontier.pop() is None
+
+
+def test_urgent_links_are_taken_once():
+    frontier = Frontier()
+    frontier.push("https://www.faz.net/a", "politik")
+    frontier.push("https://www.faz.net/b", "politik", position=1)
+    frontier.push_urgent("https://www.faz.net/b", "politik")
+    assert frontier.pop_batch(10) == [("https://www.faz.net/b", "politik"), ("https://www.faz.net/a", "politik")]
+    assert frontier.pending("politik") == 0
+
+
+def test_stale_entries_of_a_link_pushed_again_are_skipped():
+    frontier = Frontier()
+    frontier.push_urgent("https://www.faz.net/a", "politik")
+    assert frontier.pop() == ("https://www.faz.net/a", "politik")
+    # Pushed again after it was taken: the old urgent entry must not hand it out a second time
+    frontier.push("https://www.faz.net/a", "politik")
+    frontier.push_urgent("https://www.faz.net/b", "politik")
+    frontier.push_urgent("https://www.faz.net/a", "politik")
+    assert frontier.pop_batch(10) == [("https://www.faz.net/b", "politik"), ("https://www.faz.net/a", "politik")]
+    assert len(frontier) == 0
@@ -0,0 +1,55 @@
+"""
+Skipping unchanged articles: hashes are only stored once all sinks wrote the article.
+"""
+import pytest
+
+from hash_store import HashStore
+from sinks import Sink, write_batch
+
+
+def links(articles) -> list:
+    return [article.link for article in articles]
+
+
+class FailingSink(Sink):
+    def write(self, articles: list, topic: str = None) -> None:
+        raise OSError("disk full")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HashStore(str(tmp_path / "hashes.db"), skip_unchanged_bodies=True)
+    yield store
+    store.close()
+
+
+def test_unchanged_articles_are_skipped_once_written(store, make_article):
+    articles = [make_article(n) for n in range(2)]
+    assert store.process(articles) == articles
+    # Nothing was written yet, so nothing is unchanged
+    assert links(store.process([make_article(0)])) == [make_article(0).link]
+    store.committed(articles)
+    changed = make_article(1, text="Ein neuer Absatz")
+    assert store.process([make_article(0), changed]) == [changed]
+    assert store.unchanged == 1
+
+
+def test_hashes_are_not_stored_when_a_sink_fails(store, make_article):
+    with pytest.raises(OSError):
+        write_batch([make_article(0)], "politik", [store], [FailingSink()])
+    assert links(store.process([make_article(0)])) == [make_article(0).link]
+    write_batch([make_article(0)], "politik", [store], [])
+    assert store.process([make_article(0)]) == []
+
+
+def test_unchanged_bodies(store, make_article):
+    link = make_article(0).link
+    assert not store.body_unchanged(link, b"<html>1</html>")
+    # The body hash is kept until the article is written
+    assert not store.body_unchanged(link, b"<html>1</html>")
+    store.committed(store.process([make_article(0)]))
+    assert store.body_unchanged(link, b"<html>1</html>")
+    assert not store.body_unchanged(link, b"<html>2</html>")
+    # The content did not change with the body, only the body hash is updated
+    assert store.process([make_article(0)]) == []
+    assert store.body_unchanged(link, b"<html>2</html>")
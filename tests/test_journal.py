@@ -0,0 +1,127 @@
+"""
+Resuming a run from its journal: a run which dies after writing some batches must not write their articles again.
+"""
+import json
+
+import pytest
+
+from app import run_scraper
+from article import Article
+from frontier import Frontier
+from journal import RunJournal
+from sinks import Sink
+
+TOPICS = {"politik": "https://www.faz.net/aktuell/politik/", "sport": "https://www.faz.net/aktuell/sport/"}
+
+
+class StubScraper:
+    """
+    Serves three article links per topic without the network.
+    """
+
+    def __init__(self):
+        self.topics = None
+        self.discovery = None
+        self.curr_failed_links = []
+        self.curr_article_all_links = []
+        self.downloaded = []
+
+    def get_topics(self):
+        self.topics = dict(TOPICS)
+
+    def links(self, topic) -> list:
+        return [f"https://www.faz.net/aktuell/{topic}/artikel-{n}.html" for n in range(3)]
+
+    def iter_article_links(self, topics):
+        for topic in topics:
+            yield topic, self.links(topic)
+
+    def download_articles(self, items, on_article=None):
+        articles = []
+        for link, topic in items:
+            article = Article(link=link, section=topic, text=f"Text of {link}")
+            article.content_hash = article.digest()
+            self.downloaded.append(link)
+            if on_article is not None:
+                on_article(article)
+            articles.append(article)
+        return articles
+
+    def set_topic(self, topic):
+        self.curr_topic = topic
+
+    def get_articles_of_topic(self):
+        self.curr_article_all_links = self.links(self.curr_topic)
+        return self
+
+    def download_all_articles_from_curr_topic(self, on_article=None):
+        return self.download_articles([(link, self.curr_topic) for link in self.curr_article_all_links], on_article)
+
+    def close(self):
+        pass
+
+
+class Killed(BaseException):
+    pass
+
+
+class RecordingSink(Sink):
+    """
+    Records the written links and dies, like a killed process, on the write number ``die_on``.
+    """
+
+    def __init__(self, die_on=None):
+        self.links = []
+        self.writes = 0
+        self.die_on = die_on
+
+    def write(self, articles, topic=None):
+        self.writes += 1
+        if self.writes == self.die_on:
+            raise Killed()
+        self.links.extend(article.link for article in articles)
+
+
+@pytest.mark.parametrize("use_frontier", [True, False])
+def test_resume_after_a_killed_run_writes_every_article_once(tmp_path, use_frontier):
+    path = str(tmp_path / "journal.jsonl")
+    frontier = (lambda: Frontier()) if use_frontier else (lambda: None)
+    first = RecordingSink(die_on=2)
+    with pytest.raises(Killed):
+        run_scraper(StubScraper(), [first], journal=RunJournal(path), frontier=frontier(), batch_size=2)
+    assert first.links
+    second = RecordingSink()
+    scraper = StubScraper()
+    run_scraper(scraper, [second], journal=RunJournal(path), resume=True, frontier=frontier(), batch_size=2)
+    written = first.links + second.links
+    assert sorted(written) == sorted(link for topic in TOPICS for link in scraper.links(topic))
+    assert not set(first.links) & set(scraper.downloaded)
+    assert RunJournal(path).load() is None
+
+
+def test_journal_keeps_only_links_and_digests(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    run_scraper(StubScraper(), [RecordingSink()], journal=RunJournal(path), frontier=Frontier(), batch_size=2)
+    events = [json.loads(line) for line in open(path)]
+    articles = [event for event in events if event["event"] == "article"]
+    assert len(articles) == 6
+    assert all(set(event) == {"event", "topic", "link", "digest"} for event in articles)
+    assert sorted(link for event in events if event["event"] == "written" for link in event["links"]) == sorted(
+        event["link"] for event in articles
+    )
+    assert [event["event"] for event in events][-1] == "finished"
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.start(TOPICS)
+    journal.plan("politik", ["a", "b"])
+    journal.written("politik", ["a"])
+    journal.close()
+    with open(path, "a") as fp:
+        fp.write('{"event": "writ')
+    state = RunJournal(path).load()
+    assert state.plans == {"politik": ["a", "b"]}
+    assert state.written_links("politik") == {"a"}
+    assert state.completed == set()
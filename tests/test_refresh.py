@@ -0,0 +1,152 @@
+"""
+Refreshing the engagement counters: the windowed search over the streamed page, the schedule and its retries, and the
+deltas written into the sinks.
+"""
+from datetime import datetime, timezone
+from os import listdir
+
+import pytest
+
+from refresh import RefreshScheduler, extract_engagement, fetch_engagement
+from sinks import Manifest, MongoSink, RotatingFileSink, Sink, iter_records
+
+PAGE = b'<ul data-comment-value="12" data-empfehlen-value="3"></ul>'
+
+
+class StubResponse:
+    def raise_for_status(self):
+        pass
+
+
+class StubScraper:
+    """
+    Serves the pages in ``pages`` in chunks of ``chunk_size`` bytes; links mapped to an exception raise it.
+    """
+
+    def __init__(self, pages, chunk_size=7):
+        self.pages = pages
+        self.chunk_size = chunk_size
+        self.read = {}
+
+    def fetch_response(self, link, headers=None, throttle=True, until=None):
+        page = self.pages[link]
+        if isinstance(page, Exception):
+            raise page
+        self.read[link] = 0
+        for start in range(0, len(page), self.chunk_size):
+            self.read[link] += 1
+            if until(page[start:start + self.chunk_size]):
+                break
+        return StubResponse()
+
+
+class RecordingSink(Sink):
+    def __init__(self, fail=False):
+        self.deltas = []
+        self.fail = fail
+
+    def write(self, articles, topic=None):
+        pass
+
+    def write_deltas(self, deltas):
+        if self.fail:
+            raise ConnectionError("The database is down")
+        self.deltas.extend(deltas)
+
+
+def test_extract_engagement_keeps_the_first_values():
+    assert extract_engagement(PAGE) == {"comments": 12, "recommendation": 3}
+    assert extract_engagement(b'data-comment-value="5"', {"comments": 1}) == {"comments": 1}
+    assert extract_engagement(b'data-comment-value=""') == {}
+
+
+def test_fetch_engagement_finds_values_split_between_chunks_and_stops_early():
+    scraper = StubScraper({"a": PAGE + b"<p>" * 1000}, chunk_size=5)
+    assert fetch_engagement(scraper, "a") == {"comments": 12, "recommendation": 3}
+    assert scraper.read["a"] * 5 < len(PAGE) + 5
+
+
+def published_now(article):
+    article.time = datetime.now(timezone.utc).isoformat()
+    return article
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = RefreshScheduler(str(tmp_path / "refresh.db"), schedule=[60, 3600], retry_delay=60, max_failures=2)
+    yield scheduler
+    scheduler.close()
+
+
+def make_due(scheduler) -> None:
+    scheduler.db.execute("UPDATE articles SET due = 0")
+    scheduler.db.commit()
+
+
+def due(scheduler) -> dict:
+    return {row[0]: row[1:] for row in scheduler.db.execute("SELECT link, step, failures FROM articles")}
+
+
+def test_refresh_writes_deltas_and_advances_the_schedule(scheduler, make_article):
+    article = published_now(make_article(0, comments="10", recommendation="3"))
+    scheduler.process([article])
+    make_due(scheduler)
+    sink = RecordingSink()
+    assert scheduler.refresh_due(StubScraper({article.link: PAGE}), [sink]) == 1
+    assert [{k: v for k, v in delta.items() if k != "refreshed"} for delta in sink.deltas] == [
+        {"link": article.link, "comments": 12}
+    ]
+    assert due(scheduler) == {article.link: (1, 0)}
+    assert scheduler.refresh_due(StubScraper({}), [sink]) == 0
+
+
+def test_failed_refresh_keeps_its_step(scheduler, make_article):
+    article = published_now(make_article(0))
+    scheduler.process([article])
+    make_due(scheduler)
+    failing = StubScraper({article.link: ConnectionError("timeout")})
+    scheduler.refresh_due(failing, [RecordingSink()])
+    assert due(scheduler) == {article.link: (0, 1)}
+    # The retry waits for retry_delay seconds
+    assert scheduler.refresh_due(failing, [RecordingSink()]) == 0
+    make_due(scheduler)
+    scheduler.refresh_due(failing, [RecordingSink()])
+    assert due(scheduler) == {article.link: (1, 0)}
+
+
+def test_failing_sink_leaves_the_schedule_unchanged(scheduler, make_article):
+    article = published_now(make_article(0, comments="10"))
+    scheduler.process([article])
+    make_due(scheduler)
+    with pytest.raises(ConnectionError):
+        scheduler.refresh_due(StubScraper({article.link: PAGE}), [RecordingSink(fail=True)])
+    assert due(scheduler) == {article.link: (0, 0)}
+    sink = RecordingSink()
+    scheduler.refresh_due(StubScraper({article.link: PAGE}), [sink])
+    assert [delta["comments"] for delta in sink.deltas] == [12]
+
+
+def test_mongo_sink_raises_when_deltas_cannot_be_written():
+    pytest.importorskip("pymongo")
+
+    class FailingCollection:
+        def bulk_write(self, updates, ordered=True):
+            raise ConnectionError("The database is down")
+
+    sink = MongoSink.__new__(MongoSink)
+    sink.db = FailingCollection()
+    with pytest.raises(ConnectionError):
+        sink.write_deltas([{"link": "a", "refreshed": "2020-04-01T00:00:00", "comments": 3}])
+    sink.write_deltas([])
+
+
+def test_rotating_file_sink_deltas(tmp_path):
+    sink = RotatingFileSink(str(tmp_path))
+    deltas = [{"link": "a", "comments": 3}, {"link": "b", "recommendation": 1}]
+    sink.write_deltas(deltas)
+    sink.close()
+    directory = tmp_path / "deltas"
+    (name,) = Manifest(str(directory)).load()
+    assert name in listdir(directory)
+    records = list(iter_records(str(directory / name)))
+    assert [{key: record[key] for key in delta} for record, delta in zip(records, deltas)] == deltas
@@ -0,0 +1,79 @@
+"""
+Round trips through the full-text index, also across reopening it and merging its segments.
+"""
+import pytest
+
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"), max_segments=2)
+    yield index
+    index.close()
+
+
+def links(results) -> list:
+    return [result["link"] for result in results]
+
+
+def test_search_finds_committed_articles(index, make_article):
+    articles = [
+        make_article(0, text="Die Kanzlerin sprach am Tag der Arbeit"),
+        make_article(1, text="Der Tag begann mit Arbeit an der Grenze", section="wirtschaft"),
+        make_article(2, text="Fußball am Wochenende", section="sport", day="2020-04-05"),
+    ]
+    index.add(articles)
+    assert index.search("arbeit") == []
+    index.commit()
+    assert sorted(links(index.search("arbeit"))) == [articles[0].link, articles[1].link]
+    assert links(index.search('"tag der arbeit"')) == [articles[0].link]
+    assert links(index.search("arbeit", section="wirtschaft")) == [articles[1].link]
+    assert links(index.search("fußball", start="2020-04-02")) == [articles[2].link]
+    assert links(index.search("fußball", end="2020-04-02")) == []
+
+
+def test_readding_an_article_replaces_it(index, make_article):
+    index.add([make_article(0, text="Wahl in Thüringen")])
+    index.commit()
+    index.add([make_article(0, text="Streik der Lokführer")])
+    index.commit()
+    assert links(index.search("thüringen")) == []
+    assert links(index.search("lokführer")) == [make_article(0).link]
+
+
+def test_segments_survive_merging_and_reopening(tmp_path, make_article):
+    path = str(tmp_path / "search.db")
+    index = SearchIndex(path, max_segments=2)
+    for n in range(5):
+        index.add([make_article(n, text=f"Haushalt Debatte Nummer{n}")])
+        index.commit()
+    index.close()
+    index = SearchIndex(path, max_segments=2)
+    try:
+        assert sorted(links(index.search("haushalt", limit=10))) == sorted(make_article(n).link for n in range(5))
+        assert links(index.search("nummer3")) == [make_article(3).link]
+        index.optimize()
+        assert len(index.search("debatte", limit=3)) == 3
+    finally:
+        index.close()
+
+
+def test_phrase_does_not_cross_fields(index, make_article):
+    index.add([make_article(0, headline="Streit um den Haushalt", text="Debatte im Bundestag")])
+    index.commit()
+    assert links(index.search('"haushalt debatte"')) == []
+    assert links(index.search('"debatte im bundestag"')) == [make_article(0).link]
+
+
+def test_phrases_are_intersected_over_segments(index, make_article):
+    for n in range(6):
+        text = "Robert Koch Institut meldet Zahlen" if n % 2 else "Robert Koch war Arzt, das Institut meldet nichts"
+        index.add([make_article(n, text=text + (" Impfstoff" if n in (3, 4) else ""))])
+        index.commit()
+    index.add([make_article(1, text="Ein anderer Text")])
+    index.commit()
+    expected = [make_article(n).link for n in (3, 5)]
+    assert sorted(links(index.search('"robert koch institut"'))) == expected
+    assert links(index.search('"robert koch institut" "zahlen impfstoff"')) == [make_article(3).link]
+    assert links(index.search('"robert koch" impfstoff "arzt das institut"', limit=1)) == [make_article(4).link]
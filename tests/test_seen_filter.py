@@ -0,0 +1,31 @@
+"""
+The seen filter must never report a link as new once it was added, also after growing and reopening it.
+"""
+from seen_filter import SeenFilter
+
+
+def test_filter_new_after_add(tmp_path):
+    seen = SeenFilter(str(tmp_path / "seen.bloom"), str(tmp_path / "seen.db"), capacity=100)
+    try:
+        links = [f"https://www.faz.net/{n}" for n in range(10)]
+        assert seen.filter_new(links + links[:3]) == links
+        seen.add(links[:5])
+        assert seen.filter_new(links) == links[5:]
+    finally:
+        seen.close()
+
+
+def test_grows_and_persists(tmp_path):
+    paths = str(tmp_path / "seen.bloom"), str(tmp_path / "seen.db")
+    links = [f"https://www.faz.net/{n}" for n in range(1000)]
+    seen = SeenFilter(*paths, capacity=100)
+    seen.add(links)
+    assert len(seen.filters) > 1
+    seen.close()
+    seen = SeenFilter(*paths, capacity=100)
+    try:
+        assert seen.db.execute("SELECT COUNT(*) FROM seen").fetchone()[0] == len(links)
+        assert seen.filter_new(links + ["https://www.faz.net/new"]) == ["https://www.faz.net/new"]
+    finally:
+        seen.close()
+
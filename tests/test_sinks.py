@@ -0,0 +1,128 @@
+"""
+Round trips through the file sinks: what a sink wrote must read back as the same records.
+"""
+import json
+from os import getpid, listdir, rename
+from os.path import join
+
+import pytest
+
+from sinks import JsonSink, Manifest, ParquetSink, RotatingFileSink, compress_block, decompress_block, iter_records
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_compress_block_round_trip(compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    data = b'{"link": "a"}\n' * 100
+    block = compress_block(data, compression)
+    assert decompress_block(block, compression) == data
+
+
+def test_json_sink_round_trip(tmp_path, make_article):
+    articles = [make_article(n) for n in range(3)]
+    JsonSink(str(tmp_path)).write(articles, "politik")
+    (name,) = listdir(tmp_path)
+    assert name.startswith("politik_") and name.endswith(".json")
+    assert list(iter_records(str(tmp_path / name))) == [article.to_dict() for article in articles]
+
+
+def test_json_sink_keeps_batches_written_within_a_second(tmp_path, make_article):
+    sink = JsonSink(str(tmp_path))
+    for n in range(3):
+        sink.write([make_article(n)], "politik")
+    records = [record for name in sorted(listdir(tmp_path)) for record in iter_records(str(tmp_path / name))]
+    assert sorted(record["link"] for record in records) == sorted(make_article(n).link for n in range(3))
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_rotating_file_sink_round_trip(tmp_path, make_article, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    articles = [make_article(n, day=f"2020-04-0{1 + n % 2}") for n in range(5)]
+    sink = RotatingFileSink(str(tmp_path), compression=compression)
+    sink.write(articles[:2], "politik")
+    sink.write(articles[2:], "politik")
+    sink.close()
+    files = Manifest(str(tmp_path)).load()
+    assert len(files) == 1
+    (name, entry) = files.popitem()
+    assert entry["records"] == 5
+    assert (entry["first_date"], entry["last_date"]) == ("2020-04-01", "2020-04-02")
+    assert entry["topics"] == ["politik"]
+    assert not [name for name in listdir(tmp_path) if ".open" in name]
+    assert list(iter_records(join(str(tmp_path), name))) == [article.to_dict() for article in articles]
+
+
+def test_rotating_file_sink_rotates_by_size(tmp_path, make_article):
+    sink = RotatingFileSink(str(tmp_path), max_bytes=1)
+    for n in range(3):
+        sink.write([make_article(n)], "politik")
+    sink.close()
+    files = Manifest(str(tmp_path)).load()
+    assert len(files) == 3
+    records = [record for name in sorted(files) for record in iter_records(join(str(tmp_path), name))]
+    assert sorted(record["link"] for record in records) == sorted(make_article(n).link for n in range(3))
+
+
+def test_rotating_file_sink_recovers_orphaned_file(tmp_path, make_article):
+    sink = RotatingFileSink(str(tmp_path))
+    sink.write([make_article(0)], "politik")
+    # Simulates a process which died: the file stays open, its lock is released with the process
+    sink._file.close()
+    sink._lock.release()
+    orphan = sink.path.replace(f"_{getpid()}_", "_1_")
+    rename(sink.path + ".open", orphan + ".open")
+    rename(sink.path + ".open.lock", orphan + ".open.lock")
+    RotatingFileSink(str(tmp_path)).close()
+    files = Manifest(str(tmp_path)).load()
+    assert len(files) == 1
+    assert not [name for name in listdir(tmp_path) if ".open" in name]
+    (name,) = files
+    assert [record["link"] for record in iter_records(join(str(tmp_path), name))] == [make_article(0).link]
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_parquet_sink_round_trip(tmp_path, make_article, file_format):
+    dataset = pytest.importorskip("pyarrow.dataset")
+    articles = [make_article(n, section=section) for n in range(4) for section in ("politik", "wirtschaft")]
+    sink = ParquetSink(str(tmp_path), row_group_size=3, file_format=file_format)
+    sink.write(articles[:5])
+    sink.flush()
+    sink.write(articles[5:])
+    sink.close()
+    names = [path.name for path in tmp_path.glob("date=*/section=*/*")]
+    assert len(names) == 2 and not [name for name in names if name.startswith("_")]
+    table = dataset.dataset(str(tmp_path), format="ipc" if file_format == "arrow" else "parquet").to_table()
+    assert sorted(table.column("link").to_pylist()) == sorted(article.link for article in articles)
+    headlines = dict(zip(table.column("link").to_pylist(), table.column("headline").to_pylist()))
+    assert headlines == {article.link: article.headline for article in articles}
+
+
+def test_parquet_sink_keeps_files_open_across_flushes(tmp_path, make_article):
+    pytest.importorskip("pyarrow")
+    sink = ParquetSink(str(tmp_path), row_group_size=1000, max_file_rows=3)
+    for n in range(2):
+        sink.write([make_article(n)])
+        sink.flush()
+    assert [path.name[0] for path in tmp_path.glob("date=*/section=*/*")] == ["_"]
+    sink.write([make_article(2)])
+    sink.flush()
+    sink.write([make_article(3)])
+    sink.close()
+    assert sorted(path.name[0] for path in tmp_path.glob("date=*/section=*/*")) == ["p", "p"]
+
+
+def test_manifest_select(tmp_path):
+    manifest = Manifest(str(tmp_path))
+    manifest.update(
+        {
+            "a": Manifest.entry(1, 10, "2020-04-01", "2020-04-02", ["politik"], "gzip"),
+            "b": Manifest.entry(1, 10, "2020-04-05", "2020-04-06", ["sport"], "gzip"),
+        }
+    )
+    assert manifest.select(start="2020-04-03") == ["b"]
+    assert manifest.select(end="2020-04-01") == ["a"]
+    assert manifest.select(topic="sport") == ["b"]
+    manifest.update(removed=["a"])
+    assert list(json.loads((tmp_path / Manifest.file_name).read_text())["files"]) == ["b"]
@@ -0,0 +1,51 @@
+"""
+The scraper is spawned frequently from cron and by worker processes, so importing it must stay cheap and must not pull
+in the dependencies of optional features.
+"""
+from os.path import abspath, dirname, join
+import subprocess
+import sys
+
+import pytest
+
+SRC = join(dirname(dirname(abspath(__file__))), "src")
+# in microseconds, for the cumulative import time of the module including its dependencies
+IMPORT_BUDGET = {"Webscraper": 500000, "app": 600000}
+HEAVY_MODULES = ("bs4", "lxml", "pymongo", "yaml", "tqdm", "numpy", "pyarrow", "zstandard")
+
+
+def import_times(module: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET))
+def test_import_time_budget(module):
+    times = import_times(module)
+    assert times[module] <= IMPORT_BUDGET[module], f"importing {module} took {times[module] / 1000:.0f} ms"
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET))
+def test_optional_dependencies_are_not_imported(module):
+    times = import_times(module)
+    loaded = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert not loaded, f"importing {module} loaded {loaded}"
+
+
+def test_import_has_no_side_effects(tmp_path):
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {SRC!r}); import app"], cwd=tmp_path, check=True
+    )
+    assert list(tmp_path.iterdir()) == []
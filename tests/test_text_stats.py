@@ -0,0 +1,57 @@
+"""
+The text statistics batch job over the output directories of the sinks.
+"""
+from os.path import join
+
+import pytest
+
+from compaction import is_article_file
+from sinks import JsonSink, Manifest, RotatingFileSink, iter_records
+
+pytest.importorskip("numpy")
+
+from text_stats import _input_files, run_batch  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("faz_20200401120000_42_1.jsonl.gz", True),
+        ("faz_20200401120000_42_1.jsonl.zst", True),
+        ("politik_20200401120000_42_1.json", True),
+        ("politik_20200401120000.json", True),
+        ("2020-04-01.jsonl.gz", True),
+        ("manifest.json", False),
+        ("manifest.lock", False),
+        ("faz_20200401120000_42_1.jsonl.gz.open", False),
+        ("faz_20200401120000_42_1.jsonl.gz.idx", False),
+    ],
+)
+def test_is_article_file(name, expected):
+    assert is_article_file(name) is expected
+
+
+def test_input_files_skip_the_manifest(tmp_path, make_article):
+    RotatingFileSink(str(tmp_path)).close()
+    sink = RotatingFileSink(str(tmp_path))
+    sink.write([make_article(0)], "politik")
+    sink.close()
+    JsonSink(str(tmp_path)).write([make_article(1)], "politik")
+    assert (tmp_path / Manifest.file_name).exists()
+    files = _input_files([str(tmp_path)])
+    assert len(files) == 2
+    assert Manifest.file_name not in [name.rsplit("/", 1)[-1] for name in files]
+
+
+def test_run_batch_round_trip(tmp_path, make_article):
+    source, output = str(tmp_path / "archive"), str(tmp_path / "stats")
+    sink = RotatingFileSink(source)
+    articles = [make_article(n, text="Ein kurzer Satz. Und noch ein Satz mit mehr Wörtern.") for n in range(3)]
+    sink.write(articles, "politik")
+    sink.close()
+    assert run_batch([source], output, batch_size=2) > 0
+    (name,) = Manifest(output).load()
+    records = list(iter_records(join(output, name)))
+    assert [record["link"] for record in records] == [article.link for article in articles]
+    assert [record["sentence_count"] for record in records] == [2, 2, 2]
+    assert [record["word_count"] for record in records] == [10, 10, 10]
@@ -0,0 +1,50 @@
+"""
+The cached topic map: used while fresh, revalidated with the home page validators and never replaced by an empty map.
+"""
+import json
+import logging
+
+from topic_cache import TopicCache
+
+TOPICS = {"politik": "https://www.faz.net/aktuell/politik/", "sport": "https://www.faz.net/aktuell/sport/"}
+HEADERS = {"ETag": '"abc"', "Last-Modified": "Wed, 08 Apr 2020 14:00:00 GMT"}
+
+
+def test_fresh_map_is_used_without_a_request(tmp_path):
+    path = str(tmp_path / "topics.json")
+    cache = TopicCache(path, ttl=60)
+    assert cache.fresh() is None
+    assert cache.store(TOPICS, HEADERS) == TOPICS
+    assert TopicCache(path, ttl=60).fresh() == TOPICS
+    assert TopicCache(path, ttl=0).fresh() is None
+
+
+def test_stale_map_is_revalidated(tmp_path):
+    path = str(tmp_path / "topics.json")
+    TopicCache(path).store(TOPICS, HEADERS)
+    cache = TopicCache(path, ttl=0)
+    assert cache.validators() == {"If-None-Match": '"abc"', "If-Modified-Since": HEADERS["Last-Modified"]}
+    before = cache.entry["validated"]
+    assert cache.revalidated() == TOPICS
+    assert json.loads((tmp_path / "topics.json").read_text())["validated"] >= before
+
+
+def test_empty_map_is_not_stored(tmp_path):
+    path = str(tmp_path / "topics.json")
+    cache = TopicCache(path)
+    assert cache.store({}) == {}
+    assert not (tmp_path / "topics.json").exists()
+    cache.store(TOPICS, HEADERS)
+    assert cache.store({}) == TOPICS
+    assert TopicCache(path).entry["topics"] == TOPICS
+
+
+def test_changed_sections_are_stored(tmp_path, caplog):
+    path = str(tmp_path / "topics.json")
+    cache = TopicCache(path)
+    cache.store(TOPICS, HEADERS)
+    caplog.set_level(logging.INFO, logger="topic_cache")
+    changed = {"politik": TOPICS["politik"], "wirtschaft": "https://www.faz.net/aktuell/wirtschaft/"}
+    assert cache.store(changed) == changed
+    assert "added ['wirtschaft'], removed ['sport']" in caplog.text
+    assert TopicCache(path).validators() == {}
@@ -0,0 +1,60 @@
+"""
+Parsing an article page with and without the metadata fast path. The page is served by a stub instead of the network.
+"""
+import pytest
+
+pytest.importorskip("bs4")
+
+from Webscraper import FAZ_Scraper  # noqa: E402
+
+PARSER = {
+    "time": {"id": "time", "keyword": "atc-MetaTime", "parse_attr": False},
+    "headline": {"id": "span", "keyword": "atc-HeadlineText", "parse_attr": False},
+    "author": {"id": "a", "keyword": "atc-MetaAuthorLink", "parse_attr": False},
+}
+PAGE = b"""<html><head>
+<script type="application/ld+json">
+{"@type": "NewsArticle", "headline": "Headline from JSON-LD", "datePublished": "2020-04-08T16:00:00+02:00",
+ "author": {"@type": "Person", "name": "Author from JSON-LD"}}
+</script>
+</head><body>
+<span class="atc-HeadlineText">Headline from the page</span>
+<time class="atc-MetaTime">08.04.2020-16:00</time>
+<a class="atc-MetaAuthorLink">Author from the page</a>
+<p class="atc-TextParagraph">Der erste Absatz.</p>
+<p class="atc-TextParagraph">Der zweite Absatz.</p>
+</body></html>"""
+
+
+@pytest.fixture
+def scraper():
+    def make(fast_path):
+        scraper = FAZ_Scraper("https://www.faz.net", "topic", "article", PARSER, fast_path=fast_path)
+        scraper.fetch = lambda link, throttle=True: PAGE
+        scrapers.append(scraper)
+        return scraper
+
+    scrapers = []
+    yield make
+    for scraper in scrapers:
+        scraper.close()
+
+
+def test_fast_path_reads_the_metadata(scraper):
+    article = scraper(True).scrape_article("https://www.faz.net/aktuell/politik/artikel.html", "politik")
+    assert article.headline == "Headline from JSON-LD"
+    assert article.author == "Author from JSON-LD"
+    assert article.time == "08.04.2020-16:00"
+    assert article.text == "Der erste Absatz.Der zweite Absatz."
+    assert article.paragraphs == 2
+    assert article.pages == 1
+
+
+def test_without_fast_path_the_page_is_parsed_as_a_whole(scraper):
+    article = scraper(False).scrape_article("https://www.faz.net/aktuell/politik/artikel.html", "politik")
+    assert article.headline == "Headline from the page"
+    assert article.author == "Author from the page"
+    assert article.time == "08.04.2020-16:00"
+    assert article.text == "Der erste Absatz.Der zweite Absatz."
+    assert article.paragraphs == 2
+    assert article.pages == 1